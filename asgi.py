@@ -0,0 +1,127 @@
+"""
+ASGI entry point for production deployment.
+
+POST /api/process and POST /api/process/stream are served by the async
+pipeline (async_pipeline.py) so a single worker can hold many in-flight
+documents, streamed or not, while the LLM calls are pending. Every other
+route is delegated to the Flask app from server.py, on a pool of
+ASGI_WSGI_THREADS threads (wsgi_bridge.py).
+
+Run with:
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+or under gunicorn:
+    gunicorn asgi:application -k uvicorn.workers.UvicornWorker
+"""
+import asyncio
+import json
+
+from server import app, config, job_queue, result_cache, result_cache_key
+from async_pipeline import run_pipeline_async, stream_pipeline_async, aclose_clients
+from wsgi_bridge import ThreadedWsgi
+
+flask_application = ThreadedWsgi(app, max_workers=config.ASGI_WSGI_THREADS)
+
+async def read_body(receive):
+    """Collect the full HTTP request body"""
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    return body
+
+async def send_json(send, payload, status=200, headers=None):
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("ascii")),
+        ] + [(name.encode("latin-1"), value.encode("latin-1")) for name, value in (headers or {}).items()],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+async def send_event_stream(receive, send, events):
+    """Send SSE frames from an async generator as they come; stop generating once the client disconnects"""
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ],
+    })
+
+    async def pump():
+        async for frame in events:
+            await send({"type": "http.response.body", "body": frame.encode("utf-8"), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def disconnected():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    streaming = asyncio.ensure_future(pump())
+    watcher = asyncio.ensure_future(disconnected())
+    try:
+        await asyncio.wait({streaming, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        # A client that went away cancels the model stream instead of letting it run to the end
+        for task in (streaming, watcher):
+            task.cancel()
+        await asyncio.gather(streaming, watcher, return_exceptions=True)
+        await events.aclose()
+
+async def process_cached(data):
+    """Async pipeline behind the shared result cache; returns (payload, status, headers)"""
+    key = result_cache_key(data)
+    bypass = bool(data.get("noCache"))
+    if not bypass:
+        # The disk tier does file I/O, so the cache is used from a thread rather than the event loop
+        cached = await asyncio.to_thread(result_cache.get, key)
+        if cached is not None:
+            return cached, 200, {"x-cache": "HIT", "x-cache-key": key}
+
+    result = await run_pipeline_async(data)
+    if "error" not in result:
+        await asyncio.to_thread(result_cache.set, key, result)
+    return result, 200, {"x-cache": "BYPASS" if bypass else "MISS", "x-cache-key": key}
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            job_queue.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await aclose_clients()
+            flask_application.shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+
+    if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in ("/api/process", "/api/process/stream"):
+        try:
+            data = json.loads(await read_body(receive) or b"{}")
+        except ValueError:
+            await send_json(send, {"error": "Request body must be JSON."}, status=400)
+            return
+        if not isinstance(data, dict):
+            await send_json(send, {"error": "Request body must be a JSON object."}, status=400)
+            return
+        if b"no-cache" in dict(scope["headers"]).get(b"cache-control", b""):
+            data["noCache"] = True
+        if scope["path"] == "/api/process/stream":
+            await send_event_stream(receive, send, stream_pipeline_async(data))
+        else:
+            await send_json(send, *await process_cached(data))
+        return
+
+    await flask_application(scope, receive, send)
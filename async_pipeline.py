@@ -0,0 +1,524 @@
+"""
+Async version of the /api/process pipeline for the ASGI entry point (asgi.py).
+
+Mirrors server.run_pipeline stage for stage, but awaits the OpenAI, Gemini and
+HTTP calls so a single worker process can keep hundreds of documents in flight
+while the models are generating. Prompts, parsing and post-processing are shared
+with server.py; only the network I/O differs.
+"""
+import asyncio
+import collections
+import contextlib
+import time
+from urllib.parse import urlparse
+
+import httpx
+import openai
+import google.generativeai as genai
+from openai import OpenAIError
+
+from http_client import (
+    FetchedPage, BodyTooLarge, DeadlineExceeded, TooManyRedirects,
+    check_html_headers, redirect_target, count_fetch, get_scheduler, retry_after, error_kind, sniff_due
+)
+
+from server import (
+    config, API_TIMEOUT, MAX_RETRIES, MAX_TOKENS_CONFIG, BRAVE_API_KEY, BRAVE_SEARCH_URL,
+    THEME_COLORS, THEME_SYSTEM_PROMPT, DOCUMENT_SYSTEM_PROMPT,
+    brave_search_request, parse_brave_results, search_cache, search_cache_key, search_flight, ARTICLE_HEADERS,
+    article_cache, article_cache_stats, fresh_article, conditional_headers, revalidated_article, remember_article,
+    known_failure, remember_failure, extraction_error, canonicalizer, canonical_target,
+    parse_page, usable_variant, variant_sniffer, variant_stats, find_light_variant,
+    build_theme_prompt, normalize_theme, build_search_query_prompt, validate_search_query,
+    fallback_search_query, local_theme, prepare_request, article_input, unique_articles,
+    build_processing_content, build_prompt, resolve_model, gemini_usage, openai_usage, finish_document,
+    result_cache, result_cache_key, document_shell, sse_event, FenceStripper
+)
+
+_openai_client = None
+_http_client = None
+
+def get_openai_client():
+    """Shared AsyncOpenAI client (created lazily inside the running event loop)"""
+    global _openai_client
+    if _openai_client is None:
+        _openai_client = openai.AsyncOpenAI(api_key=config.OPENAI_API_KEY)
+    return _openai_client
+
+def get_http_client():
+    """Shared keep-alive httpx client for Brave search and article fetches"""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(follow_redirects=True, timeout=10)
+    return _http_client
+
+async def aclose_clients():
+    """Close the shared clients (called on ASGI lifespan shutdown)"""
+    global _openai_client, _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    if _openai_client is not None:
+        await _openai_client.close()
+        _openai_client = None
+
+async def fetch_brave_results_async(query, num_results):
+    """One upstream Brave Search call; raises on failure so errors are never cached"""
+    headers, params = brave_search_request(query, num_results)
+    response = await get_http_client().get(BRAVE_SEARCH_URL, headers=headers, params=params, timeout=5)
+    if response.status_code != 200:
+        raise RuntimeError(f"Brave search returned HTTP {response.status_code}")
+    return parse_brave_results(response.json(), num_results)
+
+async def web_search_async(query, num_results=3):
+    """Search the web using Brave Search API (shares the sync search cache; concurrent identical
+    queries share one call)"""
+    if not BRAVE_API_KEY:
+        return []
+
+    key = search_cache_key(query, num_results)
+    results = search_cache.get(key)
+    if results is not None:
+        return results
+
+    try:
+        results = await search_flight.do_async(key, lambda: fetch_brave_results_async(query, num_results))
+    except Exception as e:
+        print(f"Web search error: {e}")
+        return []
+
+    search_cache.set(key, results)
+    return results
+
+class _HostSlot:
+    __slots__ = ("semaphore", "users")
+
+    def __init__(self, max_concurrency):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.users = 0  # Coroutines holding or waiting for the semaphore
+
+_host_slots = collections.OrderedDict()
+
+@contextlib.asynccontextmanager
+async def host_slot(host):
+    """asyncio counterpart of the scheduler's per-host concurrency cap. Like the scheduler it
+    remembers its max_hosts most recently used hosts, forgetting only ones nobody holds or awaits."""
+    slot = _host_slots.get(host)
+    if slot is None:
+        scheduler = get_scheduler()
+        slot = _host_slots[host] = _HostSlot(scheduler.max_concurrency)
+        for idle in [name for name, other in _host_slots.items() if other.users == 0 and name != host]:
+            if len(_host_slots) <= scheduler.max_hosts:
+                break
+            del _host_slots[idle]
+    else:
+        _host_slots.move_to_end(host)
+    slot.users += 1
+    try:
+        async with slot.semaphore:
+            yield
+    finally:
+        slot.users -= 1
+
+async def stream_html(url, headers, start, head_sniffer=None):
+    client = get_http_client()
+    scheduler = get_scheduler()
+    timeout = httpx.Timeout(config.FETCH_DEADLINE, connect=config.FETCH_CONNECT_TIMEOUT)
+    for _ in range(config.FETCH_MAX_REDIRECTS + 1):
+        host = urlparse(url).netloc
+        async with host_slot(host):
+            wait = scheduler.reserve(host)
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            sent = time.monotonic()
+            async with client.stream("GET", url, headers=headers, follow_redirects=False, timeout=timeout) as response:
+                final_url = str(response.url)
+                target = redirect_target(final_url, response.status_code, response.headers)
+                if target:
+                    count_fetch(redirects=1)
+                    url = target
+                    continue
+
+                if response.status_code == 304:
+                    scheduler.observe(host, time.monotonic() - sent)
+                    return FetchedPage(final_url, 304, response.headers, b"", time.monotonic() - start)
+                if response.status_code in (429, 503):
+                    scheduler.back_off(host, retry_after(response.headers))
+                response.raise_for_status()
+                check_html_headers(final_url, response.headers, config.FETCH_MAX_BYTES)
+
+                body = bytearray()
+                sniffing = head_sniffer is not None
+                async for chunk in response.aiter_bytes():
+                    body += chunk
+                    if sniffing and sniff_due(body, len(chunk)):
+                        sniffing = False
+                        alternate = head_sniffer(bytes(body), final_url)
+                        if alternate:
+                            count_fetch(diverted=1, bytes=len(body))
+                            return FetchedPage(final_url, response.status_code, response.headers, bytes(body),
+                                               time.monotonic() - start, alternate=alternate)
+                    if len(body) > config.FETCH_MAX_BYTES:
+                        count_fetch(too_large=1)
+                        raise BodyTooLarge(f"{url}: body exceeds {config.FETCH_MAX_BYTES} bytes")
+
+                scheduler.observe(host, time.monotonic() - sent)
+                count_fetch(fetched=1, bytes=len(body))
+                return FetchedPage(final_url, response.status_code, response.headers, bytes(body),
+                                   time.monotonic() - start)
+
+    raise TooManyRedirects(f"{url}: more than {config.FETCH_MAX_REDIRECTS} redirects")
+
+async def fetch_article_async(url, headers, sniff=False):
+    """Async twin of server.fetch_article: streamed, size-capped, per-host paced, one adaptive deadline"""
+    deadline = get_scheduler().timeout(urlparse(url).netloc, config.FETCH_DEADLINE)
+    head_sniffer = variant_sniffer if sniff and config.PREFER_LIGHT_VARIANTS else None
+    try:
+        return await asyncio.wait_for(stream_html(url, headers, time.monotonic(), head_sniffer), timeout=deadline)
+    except asyncio.TimeoutError:
+        count_fetch(deadline=1)
+        raise DeadlineExceeded(f"{url}: not fetched within {deadline:.1f}s")
+
+async def fetch_variant_async(page):
+    """Async twin of server.fetch_variant"""
+    kind, url = find_light_variant(page.content, page.url)
+    variant_stats["diverted"] += 1
+    try:
+        response = await fetch_article_async(url, ARTICLE_HEADERS)
+        article_data = await asyncio.to_thread(
+            parse_page, response.url, response.content, kind, response.headers.get("Content-Type")
+        )
+    except Exception as e:
+        print(f"DEBUG: {kind} variant {url} failed: {e}")
+        response, article_data = None, None
+
+    if response is not None and usable_variant(response, article_data):
+        variant_stats["used"] += 1
+        return response, article_data
+    variant_stats["rejected"] += 1
+    print(f"DEBUG: {kind} variant {url} rejected, fetching the full page")
+    return None
+
+async def extract_article_content_async(url):
+    """Fetch the page asynchronously, then parse it off the event loop (shares the sync article and URL caches)"""
+    fetch_url, key = canonicalizer.resolve(url)
+    entry = article_cache.get(key)
+    article_data = fresh_article(entry)
+    if article_data:
+        return article_data
+    if known_failure(key):
+        return None
+
+    start = time.monotonic()
+    try:
+        response = await fetch_article_async(fetch_url, conditional_headers(entry), sniff=entry is None)
+        if response.status_code == 304 and entry is not None:
+            return revalidated_article(key, entry)
+
+        article_data = None
+        if response.alternate:
+            variant = await fetch_variant_async(response)
+            if variant:
+                response, article_data = variant
+            else:
+                response = await fetch_article_async(fetch_url, ARTICLE_HEADERS)
+
+        key, cached = canonical_target(key, fetch_url, response)
+        if cached:
+            return cached
+        article_cache_stats["misses"] += 1
+
+        if article_data is None:
+            # HTML parsing is CPU-bound, keep it off the event loop
+            article_data = await asyncio.to_thread(
+                parse_page, response.url, response.content, None, response.headers.get("Content-Type")
+            )
+        if article_data:
+            remember_article(key, article_data, response.headers)
+        else:
+            remember_failure(key, "no_content", time.monotonic() - start)
+        return article_data
+
+    except Exception as e:
+        print(f"Article extraction error for {url}: {e}")
+        remember_failure(key, async_error_kind(e), time.monotonic() - start, str(e))
+        return None
+
+def async_error_kind(exc):
+    """error_kind for httpx exceptions too"""
+    if isinstance(exc, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(exc, httpx.ConnectError):
+        return "unreachable"
+    return error_kind(exc)
+
+async def extract_articles_async(urls):
+    """Extract several URLs concurrently: per-host concurrency cap, one time budget for the set"""
+    host_slots = {urlparse(url).netloc: asyncio.Semaphore(config.MULTI_URL_PER_HOST) for url in urls}
+
+    async def extract(url):
+        async with host_slots[urlparse(url).netloc]:
+            return await extract_article_content_async(url)
+
+    tasks = [asyncio.ensure_future(extract(url)) for url in urls]
+    done, pending = await asyncio.wait(tasks, timeout=config.MULTI_URL_BUDGET)
+    for task in pending:
+        task.cancel()
+    if pending:
+        print(f"DEBUG: {len(pending)} of {len(urls)} URLs missed the {config.MULTI_URL_BUDGET}s budget")
+    return unique_articles(urls, [task.result() if task in done else None for task in tasks])
+
+async def extract_theme_async(text: str) -> str:
+    """Local classifier first, AI-powered theme detection only on low confidence (async)"""
+    theme = local_theme(text)
+    if theme:
+        return theme
+
+    try:
+        response = await get_openai_client().chat.completions.create(
+            model="gpt-4o",
+            messages=[
+                {"role": "system", "content": THEME_SYSTEM_PROMPT},
+                {"role": "user", "content": build_theme_prompt(text)}
+            ],
+            max_tokens=20,
+            temperature=0,
+            timeout=30
+        )
+
+        return normalize_theme(response.choices[0].message.content, text)
+
+    except Exception as e:
+        print(f"DEBUG: Theme detection failed: {e}, using default for content: {text[:100]}...")
+        return "default"
+
+async def generate_search_query_async(text: str, theme: str) -> str:
+    """AI-powered search query generation with robust fallback (async)"""
+    try:
+        response = await get_openai_client().chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": build_search_query_prompt(text, theme)}],
+            max_tokens=25,
+            temperature=0.2,
+            timeout=15
+        )
+
+        return validate_search_query(response.choices[0].message.content, text, theme)
+
+    except Exception as e:
+        print(f"DEBUG: AI query generation failed ({e}), using fallback")
+        return fallback_search_query(text, theme)
+
+async def generate_document_async(prompt, actual_model, max_tokens):
+    """Run the main completion with retries; returns (raw_html, token_usage)"""
+    client = get_openai_client()
+    for attempt in range(MAX_RETRIES):
+        try:
+            if actual_model.startswith("gemini-"):
+                try:
+                    model = genai.GenerativeModel(actual_model)
+                    gemini_response = await model.generate_content_async(
+                        DOCUMENT_SYSTEM_PROMPT + "\n\n" + prompt,
+                        generation_config=genai.types.GenerationConfig(
+                            max_output_tokens=max_tokens,
+                        )
+                    )
+                    ai_html = gemini_response.text
+                    return ai_html, gemini_usage(prompt, ai_html)
+                except Exception as e:
+                    print(f"DEBUG: Gemini API failed ({str(e)}), falling back to OpenAI GPT-4o")
+                    actual_model = "gpt-4o"
+
+            response = await client.chat.completions.create(
+                model=actual_model,
+                messages=[
+                    {"role": "system", "content": DOCUMENT_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=max_tokens,
+                timeout=API_TIMEOUT
+            )
+            return response.choices[0].message.content, openai_usage(response)
+        except Exception as e:
+            print(f"DEBUG: Attempt {attempt + 1} failed: {str(e)}")
+            if attempt == MAX_RETRIES - 1:
+                raise e
+            await asyncio.sleep(2)
+
+async def stream_openai_async(prompt, actual_model, max_tokens, usage, **kwargs):
+    """Yield completion text deltas; fills usage from the final stream chunk (async)"""
+    stream = await get_openai_client().chat.completions.create(
+        model=actual_model,
+        messages=[
+            {"role": "system", "content": DOCUMENT_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=max_tokens,
+        stream=True,
+        stream_options={"include_usage": True},
+        **kwargs
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+        if chunk.usage:
+            usage.update(openai_usage(chunk))
+
+async def stream_document_async(prompt, actual_model, max_tokens, usage):
+    """Async twin of server.stream_document: retries only before the first delta is sent"""
+    for attempt in range(MAX_RETRIES):
+        emitted = []
+        try:
+            if actual_model.startswith("gemini-"):
+                try:
+                    model = genai.GenerativeModel(actual_model)
+                    gemini_stream = await model.generate_content_async(
+                        DOCUMENT_SYSTEM_PROMPT + "\n\n" + prompt,
+                        generation_config=genai.types.GenerationConfig(
+                            max_output_tokens=max_tokens,
+                        ),
+                        stream=True
+                    )
+                    async for chunk in gemini_stream:
+                        if chunk.text:
+                            emitted.append(chunk.text)
+                            yield chunk.text
+                    usage.update(gemini_usage(prompt, "".join(emitted)))
+                    return
+                except Exception as e:
+                    if emitted:
+                        raise
+                    print(f"DEBUG: Gemini API failed ({str(e)}), falling back to OpenAI GPT-4o")
+                    actual_model = "gpt-4o"
+                    async for delta in stream_openai_async(prompt, actual_model, max_tokens, usage, temperature=0.7):
+                        emitted.append(delta)
+                        yield delta
+                    return
+
+            async for delta in stream_openai_async(prompt, actual_model, max_tokens, usage, timeout=API_TIMEOUT):
+                emitted.append(delta)
+                yield delta
+            return
+        except Exception as e:
+            print(f"DEBUG: Streaming attempt {attempt + 1} failed: {str(e)}")
+            if emitted or attempt == MAX_RETRIES - 1:
+                raise e
+            await asyncio.sleep(2)
+
+async def prepare_theme_async(data):
+    """Async twin of server.prepare_theme: extract -> theme, enough for the document shell"""
+    req = prepare_request(data)
+    input_text = req["input_text"]
+    ai_topic = req["ai_topic"]
+    urls = req["article_urls"]
+    extras = {}
+
+    if not input_text and not ai_topic and not urls:
+        return {"error": "No input text, AI topic, or URL provided."}
+
+    if urls:
+        articles = await extract_articles_async(urls)
+        if not articles:
+            return extraction_error(urls)
+        input_text, extras = article_input(articles)
+
+    is_ai_research = bool(ai_topic and not input_text)
+    processing_text = ai_topic if is_ai_research else input_text
+
+    theme = await extract_theme_async(processing_text)
+    return {
+        "input_text": input_text,
+        "ai_topic": ai_topic,
+        "is_ai_research": is_ai_research,
+        "model": req["model"],
+        "verbosity": req["verbosity"],
+        "theme": theme,
+        "theme_color": THEME_COLORS.get(theme, THEME_COLORS["default"]),
+        "extras": extras
+    }
+
+async def prepare_prompt_async(job):
+    """Async twin of server.prepare_prompt: search, then add the generation prompt"""
+    input_text = job["input_text"]
+    ai_topic = job["ai_topic"]
+    is_ai_research = job["is_ai_research"]
+
+    if is_ai_research:
+        search_results = await web_search_async(ai_topic, num_results=5)
+    else:
+        search_query = await generate_search_query_async(input_text, job["theme"])
+        search_results = await web_search_async(search_query, num_results=2)
+
+    processing_content = build_processing_content(input_text, ai_topic, is_ai_research, search_results)
+    return dict(job, prompt=build_prompt(processing_content, is_ai_research, ai_topic, job["verbosity"]))
+
+async def run_pipeline_async(data):
+    """Async extract -> theme -> search -> generate; same payload as server.run_pipeline"""
+    job = await prepare_theme_async(data)
+    if "error" in job:
+        return job
+    job = await prepare_prompt_async(job)
+
+    try:
+        actual_model = resolve_model(job["model"])
+        max_tokens = MAX_TOKENS_CONFIG.get(job["verbosity"], MAX_TOKENS_CONFIG["Detailed"])
+
+        raw_html, usage = await generate_document_async(job["prompt"], actual_model, max_tokens)
+        return finish_document(raw_html, usage, job["model"], job["theme"], job["theme_color"], job["extras"])
+
+    except OpenAIError as e:
+        return {"error": f"OpenAI API error: {str(e)}"}
+    except Exception as e:
+        return {"error": f"Unexpected server error: {str(e)}"}
+
+async def stream_pipeline_async(data):
+    """Async twin of server.stream_pipeline: yields SSE frames (shell, deltas, done)"""
+    key = result_cache_key(data)
+    if not data.get("noCache"):
+        # The disk tier does file I/O, keep it off the event loop
+        cached = await asyncio.to_thread(result_cache.get, key)
+        if cached is not None:
+            shell_open, shell_close = document_shell(cached["theme_color"])
+            yield sse_event("shell", {"open": shell_open, "close": shell_close, "theme": cached["theme"],
+                                      "theme_color": cached["theme_color"], "model": cached["model"]})
+            yield sse_event("done", dict(cached, cache="HIT"))
+            return
+
+    job = await prepare_theme_async(data)
+    if "error" in job:
+        yield sse_event("error", job)
+        return
+
+    shell_open, shell_close = document_shell(job["theme_color"])
+    yield sse_event("shell", {
+        "open": shell_open,
+        "close": shell_close,
+        "theme": job["theme"],
+        "theme_color": job["theme_color"],
+        "model": job["model"]
+    })
+
+    try:
+        job = await prepare_prompt_async(job)
+        actual_model = resolve_model(job["model"])
+        max_tokens = MAX_TOKENS_CONFIG.get(job["verbosity"], MAX_TOKENS_CONFIG["Detailed"])
+
+        usage = {}
+        chunks = []
+        fence = FenceStripper()
+        async for chunk in stream_document_async(job["prompt"], actual_model, max_tokens, usage):
+            chunks.append(chunk)
+            delta = fence.feed(chunk)
+            if delta:
+                yield sse_event("delta", {"html": delta})
+
+        result = finish_document("".join(chunks), usage, job["model"], job["theme"], job["theme_color"], job["extras"])
+        if "error" not in result:
+            await asyncio.to_thread(result_cache.set, key, result)
+        yield sse_event("done", result)
+
+    except OpenAIError as e:
+        yield sse_event("error", {"error": f"OpenAI API error: {str(e)}"})
+    except Exception as e:
+        yield sse_event("error", {"error": f"Unexpected server error: {str(e)}"})
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Encoding resolution before parsing vs. BeautifulSoup's own charset sniffing.
+
+For each page, this script times three ways of getting to the same tree:
+- sniffed: prepare_soup(bytes), where UnicodeDammit sniffs the whole document;
+- decoded: decode_html + prepare_soup(text), the header/BOM/<meta> encoding
+  with the page decoded to str up front;
+- declared: resolve_encoding + prepare_soup(bytes, from_encoding=...), the same
+  encoding handed to the parser with the bytes, which extract_article_html uses.
+
+It also shows where the encoding came from and whether both routes produced
+the same extracted text.
+
+    python benchmarks/bench_charset.py                       # synthetic page in several encodings
+    python benchmarks/bench_charset.py saved/page1.html ...   # saved pages
+    python benchmarks/bench_charset.py benchmarks/corpus/*.html
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark-placeholder")
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import server
+from bench_parsers import synthetic_page
+from charset import decode_html, resolve_encoding
+
+# (label, codec, Content-Type header, declare in <meta>)
+VARIANTS = [
+    ("utf-8, header", "utf-8", "text/html; charset=utf-8", False),
+    ("utf-8, undeclared", "utf-8", "text/html", False),
+    ("windows-1252, meta", "windows-1252", "text/html", True),
+    ("windows-1252, header", "windows-1252", "text/html; charset=ISO-8859-1", False),
+    ("shift_jis, meta", "shift_jis", "text/html", True),
+    ("windows-1252, undeclared", "windows-1252", "text/html", False),
+]
+
+def synthetic_pages(target_bytes):
+    """The bench_parsers news page re-encoded, with non-ASCII text spread through it"""
+    base = synthetic_page(target_bytes).decode("utf-8")
+    pages = []
+    for label, codec, content_type, meta in VARIANTS:
+        sample = "日本語のニュース" if codec == "shift_jis" else "Café crème brûlée – naïve façade"
+        page = base.replace("Paragraph", sample + " paragraph")
+        if meta:
+            page = page.replace("<head>", f'<head><meta charset="{codec}">', 1)
+        pages.append((label, page.encode(codec), content_type))
+    return pages
+
+def median_time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+def via_bytes(content):
+    return server.extract_from_soup(server.prepare_soup(content))
+
+def via_decode(content, content_type):
+    text = decode_html(content, content_type)[0]
+    return server.extract_from_soup(server.prepare_soup(text if text is not None else content))
+
+def via_declared(content, content_type):
+    encoding = resolve_encoding(content, content_type)[0]
+    return server.extract_from_soup(server.prepare_soup(content, from_encoding=encoding))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pages", nargs="*", help="saved HTML files (default: synthetic page in several encodings)")
+    parser.add_argument("--size", type=int, default=2_000_000, help="synthetic page size in bytes")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.pages:
+        pages = [(os.path.basename(path), open(path, "rb").read(), None) for path in args.pages]
+    else:
+        pages = synthetic_pages(args.size)
+
+    # speedup = sniffed / declared; "same" compares the declared route's text with the sniffed one
+    print(f"{'page':<28} {'bytes':>9} {'source':<9} {'encoding':<13} {'sniffed':>10} {'decoded':>10} "
+          f"{'declared':>10} {'speedup':>8} same")
+    for name, content, content_type in pages:
+        with contextlib.redirect_stdout(io.StringIO()):
+            bytes_s, sniffed = median_time(lambda: via_bytes(content), args.repeat)
+            decode_s, _ = median_time(lambda: via_decode(content, content_type), args.repeat)
+            declared_s, declared = median_time(lambda: via_declared(content, content_type), args.repeat)
+        encoding, source = resolve_encoding(content, content_type)
+        same = (sniffed or {}).get("text") == (declared or {}).get("text")
+        print(f"{name[:28]:<28} {len(content):>9} {source:<9} {encoding or '-':<13} {bytes_s * 1000:8.1f}ms "
+              f"{decode_s * 1000:8.1f}ms {declared_s * 1000:8.1f}ms {bytes_s / declared_s:7.2f}x {'yes' if same else 'NO'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Per-page cost of finding the content containers.
+
+Compares the previous lookups (a class-lambda soup.find for each WPRM marker,
+up to nine soup.select scans, and separate finds for <title> and <body>) with
+one ContainerIndex pass. It checks that both pick the same elements and reports
+the time saved per page.
+
+    python benchmarks/bench_container_index.py                 # synthetic news page
+    python benchmarks/bench_container_index.py page1.html ...  # saved pages
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark-placeholder")
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import server
+
+from bench_parsers import synthetic_page
+
+def legacy_lookup(soup):
+    """What extract_article_html used to do across methods 1 and 3"""
+    wprm = {
+        marker: soup.find('div', class_=lambda x, marker=marker: x and marker in str(x))
+        for marker in server.WPRM_MARKERS
+    }
+    matched = []
+    for selector in server.CONTENT_SELECTORS:
+        elements = soup.select(selector)
+        if elements:
+            matched = elements
+            break
+    # Method 3 repeated the selector scan on the same tree
+    for selector in server.CONTENT_SELECTORS:
+        if soup.select(selector):
+            break
+    return wprm, matched, soup.find('title'), soup.find('body')
+
+def indexed_lookup(soup):
+    index = server.ContainerIndex(soup)
+    return index.wprm, index.first_match(), index.title, index.body
+
+def median_time(fn, soup, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(soup)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pages", nargs="*", help="saved HTML files (default: synthetic page)")
+    parser.add_argument("--size", type=int, default=500_000, help="synthetic page size in bytes")
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    pages = [(path, open(path, "rb").read()) for path in args.pages] or [("synthetic", synthetic_page(args.size))]
+
+    print(f"{'page':<30} {'tags':>7} {'legacy':>10} {'index':>10} {'saved':>10}  same")
+    for name, content in pages:
+        soup = server.prepare_soup(content)
+        tags = len(soup.find_all(True))
+        legacy_s, legacy = median_time(legacy_lookup, soup, args.repeat)
+        index_s, indexed = median_time(indexed_lookup, soup, args.repeat)
+        same = all(a is b for a, b in zip(legacy[0].values(), indexed[0].values())) and \
+            [id(e) for e in legacy[1]] == [id(e) for e in indexed[1]] and \
+            legacy[2] is indexed[2] and legacy[3] is indexed[3]
+        print(f"{os.path.basename(name)[:30]:<30} {tags:>7} {legacy_s * 1000:8.2f}ms {index_s * 1000:8.2f}ms "
+              f"{(legacy_s - index_s) * 1000:8.2f}ms  {'yes' if same else 'NO'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""Extraction benchmark and regression check over the saved-page corpus.
+
+Runs the extraction that extract_article_content applies to a downloaded
+page (extract_article_html) on every file in benchmarks/corpus/. For each
+page it reports:
+- parse time (prepare_soup on the page bytes with the resolved encoding);
+- walk time (extract_from_soup on that tree);
+- full extraction time;
+- peak RSS growth of one full extraction, measured in a fresh interpreter so that
+  lxml/libxml2 allocations count (not available on Windows);
+- output characters and estimated tokens.
+
+The output is then compared with the golden file in benchmarks/corpus/golden/.
+Any difference in title, method or text fails the run, so a speedup can't
+silently change what gets extracted. Per-domain strategy memory is switched
+off so that results don't depend on past runs.
+
+    python benchmarks/bench_extraction.py                 # whole corpus, diff against goldens
+    python benchmarks/bench_extraction.py --update        # accept current output as the new goldens
+    python benchmarks/bench_extraction.py corpus/x.html   # selected pages
+"""
+
+import argparse
+import contextlib
+import difflib
+import glob
+import io
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark-placeholder")
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import server
+from charset import resolve_encoding
+from compaction import estimate_tokens
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), "corpus")
+GOLDEN_DIR = os.path.join(CORPUS_DIR, "golden")
+
+def median_time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+def max_rss():
+    """This process's peak resident set size in bytes (ru_maxrss is KiB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def proc_status_bytes(field):
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) * 1024 for line in f if line.startswith(field + ":"))
+
+def reset_peak_rss():
+    """Restart the kernel's RSS high-water mark at the current RSS (Linux >= 4.0); False elsewhere"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def page_url(page):
+    return f"https://corpus.test/{os.path.basename(page)}"
+
+def rss_probe(page):
+    """Child side of peak_rss: one extraction, then how far it pushed the RSS high-water mark"""
+    content = open(page, "rb").read()
+    # Importing server peaks higher than most extractions, so start the mark over where possible;
+    # otherwise only a peak above the import's shows up
+    if reset_peak_rss():
+        before, peak = proc_status_bytes("VmRSS"), lambda: proc_status_bytes("VmHWM")
+    else:
+        before, peak = max_rss(), max_rss
+    with contextlib.redirect_stdout(io.StringIO()):
+        server.extract_article_html(page_url(page), content)
+    print(max(0, peak() - before))
+
+def peak_rss(page):
+    """Peak RSS added by one extraction of the page, C allocations included. Each page runs in a
+    fresh interpreter, because the high-water mark never comes back down; None without resource."""
+    if resource is None:
+        return None
+    probe = subprocess.run([sys.executable, os.path.abspath(__file__), "--rss-probe", page],
+                           capture_output=True, text=True, check=True)
+    return int(probe.stdout.split()[-1])
+
+def render(article_data):
+    """Golden-file form of an extraction result"""
+    if not article_data:
+        return "(no content)\n"
+    return f"title: {article_data['title']}\nmethod: {article_data['method']}\n\n{article_data['text']}\n"
+
+def golden_path(page):
+    return os.path.join(GOLDEN_DIR, os.path.splitext(os.path.basename(page))[0] + ".txt")
+
+def compare(page, output, update):
+    """'ok', 'new', 'updated', 'missing' or the unified diff against the golden file"""
+    path = golden_path(page)
+    expected = open(path, encoding="utf-8").read() if os.path.exists(path) else None
+    if update and expected != output:
+        os.makedirs(GOLDEN_DIR, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(output)
+        return "new" if expected is None else "updated"
+    if expected is None:
+        return "missing"
+    if expected == output:
+        return "ok"
+    return "".join(difflib.unified_diff(
+        expected.splitlines(keepends=True), output.splitlines(keepends=True), "golden", "current"
+    ))
+
+def measure(page, repeat):
+    content = open(page, "rb").read()
+    url = page_url(page)
+    encoding = resolve_encoding(content)[0]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        parse_s, _ = median_time(lambda: server.prepare_soup(content, from_encoding=encoding), repeat)
+        walk_times = []
+        for _ in range(repeat):
+            soup = server.prepare_soup(content, from_encoding=encoding)  # Fresh tree each time, extraction may modify it
+            start = time.perf_counter()
+            server.extract_from_soup(soup)
+            walk_times.append(time.perf_counter() - start)
+        walk_s = statistics.median(walk_times)
+        full_s, article_data = median_time(lambda: server.extract_article_html(url, content), repeat)
+
+    peak = peak_rss(page)
+    chars = len(article_data["text"]) if article_data else 0
+    return {
+        "bytes": len(content),
+        "parse_ms": parse_s * 1000,
+        "walk_ms": walk_s * 1000,
+        "full_ms": full_s * 1000,
+        "peak_mb": None if peak is None else peak / (1024 * 1024),
+        "method": article_data["method"] if article_data else "-",
+        "chars": chars,
+        "tokens": estimate_tokens(article_data["text"]) if article_data else 0,
+        "output": render(article_data)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pages", nargs="*", help="HTML files (default: every page in benchmarks/corpus)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--update", action="store_true", help="write the current output as the golden files")
+    parser.add_argument("--rss-probe", metavar="PAGE", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    server.strategy_memory = None
+    if args.rss_probe:
+        rss_probe(args.rss_probe)
+        return
+    pages = args.pages or sorted(glob.glob(os.path.join(CORPUS_DIR, "*.html")))
+
+    print(f"{'page':<26} {'bytes':>9} {'parse':>9} {'walk':>9} {'full':>9} {'peak rss':>8} "
+          f"{'method':<14} {'chars':>6} {'tokens':>6} golden")
+    failures = []
+    for page in pages:
+        result = measure(page, args.repeat)
+        status = compare(page, result["output"], args.update)
+        label = status if status in ("ok", "new", "updated", "missing") else "CHANGED"
+        peak = "-" if result["peak_mb"] is None else f"{result['peak_mb']:.1f}MB"
+        name = os.path.basename(page)
+        print(f"{name[:26]:<26} {result['bytes']:>9} {result['parse_ms']:7.2f}ms {result['walk_ms']:7.2f}ms "
+              f"{result['full_ms']:7.2f}ms {peak:>8} {result['method']:<14} "
+              f"{result['chars']:>6} {result['tokens']:>6} {label}")
+        if status not in ("ok", "new", "updated"):
+            failures.append((name, status))
+
+    for name, status in failures:
+        print(f"\n{name}: " + ("no golden file (run with --update)" if status == "missing" else "output changed"))
+        if status != "missing":
+            print(status, end="")
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
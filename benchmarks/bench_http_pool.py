@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Latency of bare requests.get vs the pooled keep-alive session against a local HTTPS server.
+
+Generates a throwaway self-signed certificate with the openssl CLI, serves a small
+page over TLS on localhost and times sequential and concurrent fetches.
+
+    python benchmarks/bench_http_pool.py --requests 200 --threads 8
+"""
+
+import argparse
+import os
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import http_client
+
+BODY = b"<html><head><title>Stand-in</title></head><body>" + b"<p>Article text.</p>" * 200 + b"</body></html>"
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+def start_https_server(workdir):
+    cert = os.path.join(workdir, "cert.pem")
+    key = os.path.join(workdir, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-keyout", key, "-out", cert, "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost"],
+        check=True, capture_output=True
+    )
+    server = ThreadingHTTPServer(("localhost", 0), Handler)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, cert, f"https://localhost:{server.server_address[1]}/article"
+
+def measure(fetch, url, cert, num_requests, threads):
+    def one(_):
+        start = time.perf_counter()
+        response = fetch(url, verify=cert, timeout=10)
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    if threads == 1:
+        samples = [one(i) for i in range(num_requests)]
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            samples = list(pool.map(one, range(num_requests)))
+    total = time.perf_counter() - start
+    samples.sort()
+    return {
+        "total_s": total,
+        "p50_ms": statistics.median(samples) * 1000,
+        "p95_ms": samples[int(len(samples) * 0.95) - 1] * 1000
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        server, cert, url = start_https_server(workdir)
+        http_client.configure(pool_maxsize=args.threads)
+        try:
+            for threads in (1, args.threads):
+                bare = measure(requests.get, url, cert, args.requests, threads)
+                pooled = measure(http_client.get, url, cert, args.requests, threads)
+                print(f"\n{args.requests} requests, {threads} thread(s)")
+                print(f"  {'':8} {'total':>9} {'p50':>9} {'p95':>9}")
+                for name, result in (("bare", bare), ("pooled", pooled)):
+                    print(f"  {name:8} {result['total_s']:8.2f}s {result['p50_ms']:7.2f}ms {result['p95_ms']:7.2f}ms")
+                print(f"  speedup: {bare['total_s'] / pooled['total_s']:.1f}x")
+
+            print("\nPool metrics:", http_client.pool_metrics()["hosts"])
+        finally:
+            server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""JSON-LD fast path vs. the DOM extraction on recipe/article pages.
+
+For each page, this script times three things:
+- extract_from_json_ld, the raw-bytes scan with no parse;
+- the DOM route it replaces, prepare_soup + extract_from_soup;
+- the full extract_article_html.
+
+It also shows which method extract_article_html picked and how much text each
+route produced.
+
+    python benchmarks/bench_json_ld.py                       # synthetic WPRM recipe page
+    python benchmarks/bench_json_ld.py saved/recipe1.html ... # saved recipe pages
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark-placeholder")
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import server
+
+def synthetic_recipe_page():
+    """WPRM-style recipe page that also ships schema.org Recipe JSON-LD, padded with the usual page chrome"""
+    ingredients = [f"{i} cups ingredient number {i}" for i in range(1, 16)]
+    steps = [f"Step {i}: combine, stir and cook for {i * 2} minutes until done." for i in range(1, 13)]
+    recipe = {
+        "@context": "https://schema.org",
+        "@type": "Recipe",
+        "name": "Synthetic Weeknight Chili",
+        "author": {"@type": "Person", "name": "Test Cook"},
+        "datePublished": "2024-03-01",
+        "description": "A hearty chili used to benchmark extraction.",
+        "recipeYield": ["6", "6 servings"],
+        "prepTime": "PT20M",
+        "cookTime": "PT1H10M",
+        "recipeIngredient": ingredients,
+        "recipeInstructions": [{"@type": "HowToStep", "text": step} for step in steps],
+    }
+    wprm = (
+        "<div class='wprm-recipe-container'><div class='wprm-recipe wp-recipe-maker'>"
+        "<h2>Synthetic Weeknight Chili</h2><ul>" + "".join(f"<li>{i}</li>" for i in ingredients) + "</ul>"
+        "<ol>" + "".join(f"<li>{s}</li>" for s in steps) + "</ol></div></div>"
+    )
+    story = "".join(f"<p>Paragraph {i} of the life story that precedes every recipe online.</p>" for i in range(80))
+    chrome = "<script>var ads = '" + "x" * 50000 + "';</script>" + "<nav>" + "<a href='#'>link</a>" * 300 + "</nav>"
+    return (
+        "<html><head><title>Synthetic Weeknight Chili</title>"
+        f"<script type='application/ld+json'>{json.dumps(recipe)}</script>{chrome}</head>"
+        f"<body><article>{story}{wprm}</article></body></html>"
+    ).encode("utf-8")
+
+def median_time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pages", nargs="*", help="saved HTML files (default: synthetic recipe page)")
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    pages = [(path, open(path, "rb").read()) for path in args.pages] or [("synthetic", synthetic_recipe_page())]
+
+    print(f"{'page':<28} {'json-ld':>9} {'dom':>9} {'full':>9} {'method':<14} {'ld chars':>9} {'dom chars':>9}")
+    with contextlib.redirect_stdout(io.StringIO()):
+        rows = []
+        for name, content in pages:
+            ld_s, ld = median_time(lambda: server.extract_from_json_ld(content), args.repeat)
+            dom_s, dom = median_time(lambda: server.extract_from_soup(server.prepare_soup(content)), args.repeat)
+            full_s, full = median_time(lambda: server.extract_article_html(name, content), args.repeat)
+            rows.append((name, ld_s, dom_s, full_s, full, ld, dom))
+    for name, ld_s, dom_s, full_s, full, ld, dom in rows:
+        print(f"{os.path.basename(name)[:28]:<28} {ld_s * 1000:7.2f}ms {dom_s * 1000:7.2f}ms {full_s * 1000:7.2f}ms "
+              f"{(full or {}).get('method', '-'):<14} {len(ld['text']) if ld else 0:>9} {len(dom['text']) if dom else 0:>9}")
+
+if __name__ == "__main__":
+    main()
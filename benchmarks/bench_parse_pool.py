@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Request-thread latency while large pages are parsed, in-thread vs. the parse pool.
+
+A "request" thread wakes every millisecond and records how late it woke. This
+stands in for the other requests a worker is serving. Meanwhile several
+threads extract large pages, either by calling extract_article_html directly
+(holding the GIL) or through parse_pool. The script reports the latency
+percentiles and the total parse wall time for both modes.
+
+    python benchmarks/bench_parse_pool.py                     # synthetic ~4 MB news pages
+    python benchmarks/bench_parse_pool.py saved/page1.html ... # saved pages
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark-placeholder")
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import server
+from bench_parsers import synthetic_page
+from parse_pool import ParsePool
+
+def heartbeat(stop, lags, interval=0.001):
+    while not stop.is_set():
+        start = time.perf_counter()
+        time.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+def measure(extract, pages, threads):
+    stop, lags = threading.Event(), []
+    beat = threading.Thread(target=heartbeat, args=(stop, lags), daemon=True)
+    beat.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(lambda item: extract(*item), pages))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    beat.join()
+    return elapsed, lags, results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pages", nargs="*", help="saved HTML files (default: synthetic pages)")
+    parser.add_argument("--count", type=int, default=8, help="synthetic pages to parse")
+    parser.add_argument("--size", type=int, default=4_000_000, help="synthetic page size in bytes")
+    parser.add_argument("--threads", type=int, default=4, help="concurrent request threads parsing")
+    parser.add_argument("--workers", type=int, default=2, help="parse pool processes")
+    args = parser.parse_args()
+
+    if args.pages:
+        pages = [(path, open(path, "rb").read()) for path in args.pages]
+    else:
+        pages = [(f"synthetic-{i}", synthetic_page(args.size)) for i in range(args.count)]
+
+    pool = ParsePool(workers=args.workers, cpu_seconds=60, timeout=300)
+    pool.extract("warmup", pages[0][1])  # Start the workers outside the measurement
+
+    modes = [
+        ("in-thread", lambda url, content: server.extract_article_html(url, content)),
+        (f"pool ({args.workers} procs)", lambda url, content: pool.extract(url, content)[0]),
+    ]
+    print(f"{len(pages)} pages, {args.threads} request threads")
+    print(f"{'mode':<18} {'parse wall':>10} {'lag p50':>9} {'lag p99':>9} {'lag max':>9}")
+    for name, extract in modes:
+        elapsed, lags, _ = measure(extract, pages, args.threads)
+        print(f"{name:<18} {elapsed:9.2f}s {statistics.median(lags) * 1000:7.2f}ms "
+              f"{percentile(lags, 99) * 1000:7.2f}ms {max(lags) * 1000:7.2f}ms")
+    pool.shutdown()
+
+if __name__ == "__main__":
+    main()
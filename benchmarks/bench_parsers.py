@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Parse-time benchmark for the article extraction parser backends.
+
+Times prepare_soup (parse + pruning) and extract_from_soup for each backend,
+with and without the pre-parse <script>/<style> strip, and checks the extracted
+text against the html.parser baseline. lxml repairs malformed nesting differently
+(benchmarks/corpus/malformed_nesting.html), which is why html.parser stays the default.
+
+    python benchmarks/bench_parsers.py                 # synthetic ~2 MB news page
+    python benchmarks/bench_parsers.py page1.html ...  # saved pages
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark-placeholder")
+
+import server
+
+BACKENDS = [("html.parser", False), ("html.parser", True), ("lxml", False), ("lxml", True)]
+
+def synthetic_page(target_bytes):
+    """News-style page: large inline bundles and trackers around a structured article"""
+    script = "<script>window.__STATE__ = " + '{"k": "' + "x" * 20000 + '"};</script>\n'
+    style = "<style>" + ".c{color:red}" * 2000 + "</style>\n"
+    nav = "<nav><ul>" + "".join(f"<li><a href='/s{i}'>Section {i}</a></li>" for i in range(60)) + "</ul></nav>\n"
+    article = "<article><h1>Markets rally as inflation cools</h1>" + "".join(
+        f"<h2>Part {i}</h2><p>Paragraph {i} of the story, with enough words to count as real content here.</p>"
+        f"<ul><li>Point {i}.1 about prices</li><li>Point {i}.2 about rates</li></ul>"
+        f"<table><tr><th>Year</th><th>Rate</th></tr><tr><td>20{i:02d}</td><td>{i}%</td></tr></table>"
+        for i in range(40)
+    ) + "</article>\n"
+    head = "<html><head><title>Synthetic news page</title>" + style + "</head><body>" + nav
+    parts = [head, article]
+    size = len(head) + len(article)
+    while size < target_bytes:
+        parts.append(script)
+        size += len(script)
+    parts.append("<footer>Footer links</footer></body></html>")
+    return "".join(parts).encode("utf-8")
+
+def run(content, parser, prestrip, repeat):
+    server.config.HTML_PRESTRIP = prestrip
+    parse_times, extract_times = [], []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            soup = server.prepare_soup(content, parser)
+            parsed = time.perf_counter()
+            result = server.extract_from_soup(soup)
+            parse_times.append(parsed - start)
+            extract_times.append(time.perf_counter() - parsed)
+    return statistics.median(parse_times), statistics.median(extract_times), result["text"] if result else ""
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pages", nargs="*", help="saved HTML files (default: synthetic page)")
+    parser.add_argument("--size", type=int, default=2_000_000, help="synthetic page size in bytes")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    pages = [(path, open(path, "rb").read()) for path in args.pages] or [("synthetic", synthetic_page(args.size))]
+
+    for name, content in pages:
+        print(f"\n{name} ({len(content) / 1e6:.2f} MB)")
+        print(f"  {'backend':<12} {'prestrip':<9} {'parse':>9} {'extract':>9}  output")
+        baseline = None
+        for backend, prestrip in BACKENDS:
+            parse_s, extract_s, text = run(content, backend, prestrip, args.repeat)
+            if baseline is None:
+                baseline = text
+            same = "identical" if text == baseline else f"DIFFERS ({len(text)} vs {len(baseline)} chars)"
+            print(f"  {backend:<12} {str(prestrip):<9} {parse_s * 1000:7.1f}ms {extract_s * 1000:7.1f}ms  {same}")
+
+if __name__ == "__main__":
+    main()
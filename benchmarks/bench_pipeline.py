@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Throughput comparison: sync /api/process pipeline vs the async (ASGI) pipeline.
+
+The network-bound stages (theme detection, query generation, Brave search and the
+main completion) are replaced with fixed-latency stand-ins so the comparison
+measures how many documents each execution model keeps in flight, not API speed.
+
+It also sends concurrent requests to a route that asgi.py delegates to Flask
+(/api/process/batch), to check that those run side by side on the bridge's
+thread pool instead of queueing on one thread.
+
+    python benchmarks/bench_pipeline.py --requests 200 --sync-workers 4
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark-placeholder")
+
+import server
+import async_pipeline
+
+# Seconds per stage, roughly what production logs show (scaled by --scale)
+STAGE_LATENCY = {
+    "theme": 1.2,
+    "query": 0.6,
+    "search": 0.4,
+    "generate": 8.0,
+}
+
+USAGE = {"prompt": 1200, "completion": 3000, "total": 4200}
+HTML = "<h1>Benchmark</h1><p>Generated document.</p>"
+
+def patch_stages(scale):
+    """Swap the network-bound stages for sleeps of the configured latency"""
+    latency = {stage: seconds * scale for stage, seconds in STAGE_LATENCY.items()}
+
+    server.extract_theme = lambda text: (time.sleep(latency["theme"]), "tech")[1]
+    server.generate_search_query = lambda text, theme: (time.sleep(latency["query"]), "benchmark query")[1]
+    server.web_search = lambda query, num_results=3: (time.sleep(latency["search"]), [])[1]
+    server.generate_document = lambda prompt, model, max_tokens: (time.sleep(latency["generate"]), (HTML, USAGE))[1]
+
+    async def theme(text):
+        await asyncio.sleep(latency["theme"])
+        return "tech"
+
+    async def query(text, theme):
+        await asyncio.sleep(latency["query"])
+        return "benchmark query"
+
+    async def search(query, num_results=3):
+        await asyncio.sleep(latency["search"])
+        return []
+
+    async def generate(prompt, model, max_tokens):
+        await asyncio.sleep(latency["generate"])
+        return HTML, USAGE
+
+    async_pipeline.extract_theme_async = theme
+    async_pipeline.generate_search_query_async = query
+    async_pipeline.web_search_async = search
+    async_pipeline.generate_document_async = generate
+
+def payload(i):
+    return {"text": f"Benchmark document {i} about cloud platforms and software.", "model": "GPT-4o-mini", "verbosity": "Concise"}
+
+def run_sync(num_requests, workers):
+    """Sync path: each gunicorn sync worker handles one request at a time"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda i: server.run_pipeline(payload(i)), range(num_requests)))
+    elapsed = time.perf_counter() - start
+    assert all("html" in r for r in results)
+    return elapsed
+
+def run_async(num_requests):
+    """Async path: one event loop holds every request in flight"""
+    async def main():
+        return await asyncio.gather(*(async_pipeline.run_pipeline_async(payload(i)) for i in range(num_requests)))
+
+    start = time.perf_counter()
+    results = asyncio.run(main())
+    elapsed = time.perf_counter() - start
+    assert all("html" in r for r in results)
+    return elapsed
+
+async def asgi_post(application, path, payload):
+    """One in-process ASGI POST; returns (status, decoded JSON body)"""
+    body = json.dumps(payload).encode("utf-8")
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "POST", "scheme": "http", "path": path,
+        "root_path": "", "query_string": b"", "server": ("bench", 80), "client": ("127.0.0.1", 0),
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode("ascii"))]
+    }
+    received = [{"type": "http.request", "body": body, "more_body": False}]
+    messages = []
+
+    async def receive():
+        return received.pop() if received else {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+    return messages[0]["status"], json.loads(b"".join(m.get("body", b"") for m in messages[1:]))
+
+def run_delegated(num_requests):
+    """ASGI entry point, delegated Flask route: each request carries a one-item batch"""
+    import asgi
+
+    async def main():
+        return await asyncio.gather(*(
+            asgi_post(asgi.application, "/api/process/batch", {"items": [dict(payload(i), noCache=True)]})
+            for i in range(num_requests)
+        ))
+
+    start = time.perf_counter()
+    results = asyncio.run(main())
+    elapsed = time.perf_counter() - start
+    assert all(status == 200 and body["summary"]["succeeded"] == 1 for status, body in results)
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--sync-workers", type=int, default=4, help="gunicorn sync workers to emulate")
+    parser.add_argument("--scale", type=float, default=0.05, help="multiplier applied to stage latencies")
+    parser.add_argument("--delegated", type=int, default=4, help="concurrent requests to a Flask route behind asgi.py")
+    args = parser.parse_args()
+
+    patch_stages(args.scale)
+    per_request = sum(STAGE_LATENCY.values()) * args.scale
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        sync_elapsed = run_sync(args.requests, args.sync_workers)
+        async_elapsed = run_async(args.requests)
+        delegated_elapsed = run_delegated(args.delegated)
+
+    print(f"Requests: {args.requests}, simulated latency per request: {per_request:.2f}s")
+    print(f"Sync  ({args.sync_workers} workers): {sync_elapsed:7.2f}s  {args.requests / sync_elapsed:8.1f} req/s")
+    print(f"Async (1 process):   {async_elapsed:7.2f}s  {args.requests / async_elapsed:8.1f} req/s")
+    print(f"Speedup: {sync_elapsed / async_elapsed:.1f}x")
+    # Serialized on one thread, the delegated requests would take delegated x per_request
+    print(f"Delegated Flask route ({args.delegated} concurrent via asgi.py): {delegated_elapsed:.2f}s "
+          f"(serialized: ~{args.delegated * per_request:.2f}s, overlap {args.delegated * per_request / delegated_elapsed:.1f}x)")
+
+if __name__ == "__main__":
+    main()
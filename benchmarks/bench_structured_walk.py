@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Scaling benchmark for extract_structured_content.
+
+Builds synthetic DOMs of increasing nesting depth and width and times the
+single-pass walker in server.py against the previous find_all/get_text
+implementation (kept below as legacy_extract_structured_content). The legacy
+version re-reads the text of every enclosing <div>, so its time grows with
+depth x size; the walker should grow linearly with the node count.
+
+    python benchmarks/bench_structured_walk.py
+    python benchmarks/bench_structured_walk.py --depths 50 100 200 --widths 200 800
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark-placeholder")
+
+from bs4 import BeautifulSoup
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import server
+
+def legacy_extract_structured_content(element):
+    """The pre-walker implementation, for comparison"""
+    content_parts = []
+
+    def process_element(elem):
+        parts = []
+        if elem.name == 'table':
+            table_text = "\n[TABLE]\n"
+            for row in elem.find_all('tr'):
+                cells = row.find_all(['th', 'td'])
+                row_text = ' | '.join([cell.get_text(strip=True) for cell in cells if cell.get_text(strip=True)])
+                if row_text.strip():
+                    table_text += row_text + "\n"
+            table_text += "[/TABLE]\n"
+            parts.append(table_text)
+        elif elem.name in ['ol', 'ul']:
+            list_items = elem.find_all('li')
+            if list_items:
+                list_text = "\n[LIST]\n"
+                for i, item in enumerate(list_items):
+                    item_text = item.get_text(strip=True)
+                    if item_text:
+                        prefix = f"{i+1}. " if elem.name == 'ol' else "• "
+                        list_text += f"{prefix}{item_text}\n"
+                list_text += "[/LIST]\n"
+                parts.append(list_text)
+        elif elem.name in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
+            heading_text = elem.get_text(strip=True)
+            if heading_text:
+                parts.append(f"\n[HEADING] {heading_text} [/HEADING]\n")
+        elif elem.name in ['p', 'div']:
+            text_content = elem.get_text(strip=True)
+            if text_content and len(text_content) > 15:
+                if not elem.find_all(['table', 'ol', 'ul']):
+                    parts.append(text_content + "\n")
+        return parts
+
+    for elem in element.find_all(['table', 'ol', 'ul', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'div']):
+        if elem.parent and elem.parent.name in ['table', 'ol', 'ul']:
+            continue
+        content_parts.extend(process_element(elem))
+
+    return '\n'.join(content_parts)
+
+def section(i):
+    return (
+        f"<h2>Section {i}</h2><p>Paragraph {i} with enough words to be kept as real content.</p>"
+        f"<ul><li>Point {i}.1</li><li>Point {i}.2</li></ul>"
+        f"<table><tr><th>Key</th><th>Value</th></tr><tr><td>k{i}</td><td>{i}</td></tr></table>"
+    )
+
+def nested_page(depth, width):
+    """`depth` wrapper divs, each with its own text, around `width` sections"""
+    opening = "".join(f"<div class='wrap-{d}'><span>Wrapper text at level {d}.</span>" for d in range(depth))
+    return f"<html><body>{opening}{''.join(section(i) for i in range(width))}{'</div>' * depth}</body></html>"
+
+def time_fn(fn, soup, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = fn(soup.body)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), output
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--depths", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--widths", type=int, nargs="+", default=[50, 200, 800])
+    parser.add_argument("--parser", default="html.parser", help="html.parser handles deep nesting; lxml caps depth at 256")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-legacy", action="store_true", help="only time the walker (legacy is slow on big inputs)")
+    args = parser.parse_args()
+
+    print(f"{'depth':>6} {'width':>6} {'nodes':>8} {'walker':>10} {'us/node':>8} {'legacy':>10} {'speedup':>8} {'blocks':>7}")
+    for depth in args.depths:
+        for width in args.widths:
+            soup = BeautifulSoup(nested_page(depth, width), args.parser)
+            nodes = sum(1 for _ in soup.descendants)
+            walker_s, output = time_fn(server.extract_structured_content, soup, args.repeat)
+            blocks = output.count("[/TABLE]") + output.count("[/LIST]") + output.count("[/HEADING]")
+            row = f"{depth:>6} {width:>6} {nodes:>8} {walker_s * 1000:8.1f}ms {walker_s / nodes * 1e6:8.2f}"
+            if args.skip_legacy:
+                print(f"{row} {'-':>10} {'-':>8} {blocks:>7}")
+                continue
+            legacy_s, _ = time_fn(legacy_extract_structured_content, soup, args.repeat)
+            print(f"{row} {legacy_s * 1000:8.1f}ms {legacy_s / walker_s:7.1f}x {blocks:>7}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""Accuracy and latency of the local theme classifier vs the gpt-4o theme detection.
+
+--calibrate picks THEME_CONFIDENCE_THRESHOLD on theme_calibration.json, a labelled
+set kept apart from both the training data and theme_eval.json: the lowest
+threshold at which the answers given locally are at least as accurate as the
+target (gpt-4o's accuracy on that set with --llm, otherwise --target). The eval
+set is then scored at that threshold.
+
+    python benchmarks/bench_theme_classifier.py              # local model only
+    python benchmarks/bench_theme_classifier.py --calibrate  # fit the threshold on the held-out set first
+    python benchmarks/bench_theme_classifier.py --llm        # also call gpt-4o (needs OPENAI_API_KEY)
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from theme_classifier import get_classifier
+
+EVAL_PATH = os.path.join(os.path.dirname(__file__), "theme_eval.json")
+CALIBRATION_PATH = os.path.join(os.path.dirname(__file__), "theme_calibration.json")
+
+def timed(fn, *args, repeat=1):
+    """Median wall time in seconds, plus the last result"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+def load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def detect_with_llm(examples):
+    """[(theme, seconds)] from the gpt-4o theme detection"""
+    import server
+
+    results = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for example in examples:
+            seconds, theme = timed(server.detect_theme_with_llm, example["text"])
+            results.append((theme, seconds))
+    return results
+
+def calibrate(confidences, correct, target):
+    """Lowest threshold whose locally answered examples reach the target accuracy (None if none does)"""
+    ranked = sorted(zip(confidences, correct), reverse=True)
+    best = None
+    right = 0
+    for answered, (confidence, ok) in enumerate(ranked, 1):
+        right += ok
+        if right / answered >= target and (answered == len(ranked) or ranked[answered][0] < confidence):
+            best = confidence
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--llm", action="store_true", help="also benchmark the gpt-4o path")
+    parser.add_argument("--threshold", type=float, default=None, help="confidence threshold (default: config)")
+    parser.add_argument("--calibrate", action="store_true", help="choose the threshold on the held-out calibration set")
+    parser.add_argument("--target", type=float, default=1.0,
+                        help="accuracy local answers must reach when calibrating without --llm (default 1.0)")
+    args = parser.parse_args()
+
+    examples = load(EVAL_PATH)
+
+    start = time.perf_counter()
+    classifier = get_classifier()
+    print(f"Training: {(time.perf_counter() - start) * 1000:.1f} ms, vocabulary {len(classifier.index)} terms")
+
+    if args.calibrate:
+        held_out = load(CALIBRATION_PATH)
+        predictions = [classifier.classify(example["text"]) for example in held_out]
+        correct = [theme == example["theme"] for (theme, _), example in zip(predictions, held_out)]
+        target = args.target
+        if args.llm:
+            llm_themes = [theme for theme, _ in detect_with_llm(held_out)]
+            target = sum(theme == example["theme"] for theme, example in zip(llm_themes, held_out)) / len(held_out)
+        threshold = calibrate([confidence for _, confidence in predictions], correct, target)
+        print(f"\nCalibration ({len(held_out)} held-out examples, target accuracy {target:.1%}"
+              f"{' = gpt-4o' if args.llm else ''})")
+        if threshold is None:
+            print("  no threshold reaches the target: every text should go to the LLM")
+            return
+        answered = sum(confidence >= threshold for _, confidence in predictions)
+        print(f"  threshold:         {threshold:.3f} (answers {answered}/{len(held_out)} locally)")
+        args.threshold = threshold
+    elif args.threshold is None:
+        from config import get_config
+        args.threshold = get_config().THEME_CONFIDENCE_THRESHOLD
+
+    local = []
+    for example in examples:
+        seconds, (theme, confidence) = timed(classifier.classify, example["text"], repeat=200)
+        local.append((theme, confidence, seconds))
+
+    correct = sum(theme == ex["theme"] for (theme, _, _), ex in zip(local, examples))
+    confident = [(theme, ex["theme"]) for (theme, confidence, _), ex in zip(local, examples) if confidence >= args.threshold]
+    print(f"\nLocal classifier ({len(examples)} examples)")
+    print(f"  accuracy:          {correct / len(examples):.1%}")
+    print(f"  answered locally:  {len(confident)}/{len(examples)} at threshold {args.threshold:g}")
+    if confident:
+        print(f"  accuracy (local):  {sum(p == g for p, g in confident) / len(confident):.1%}")
+    print(f"  median latency:    {statistics.median(s for _, _, s in local) * 1e6:.0f} µs")
+
+    if not args.llm:
+        return
+
+    llm = detect_with_llm(examples)
+
+    llm_correct = sum(theme == ex["theme"] for (theme, _), ex in zip(llm, examples))
+    hybrid = [lt if lc >= args.threshold else ht for (lt, lc, _), (ht, _) in zip(local, llm)]
+    hybrid_correct = sum(theme == ex["theme"] for theme, ex in zip(hybrid, examples))
+    escalated = [s for (_, lc, _), (_, s) in zip(local, llm) if lc < args.threshold]
+    agree = [lt == ht for (lt, _, _), (ht, _) in zip(local, llm)]
+    agree_local = [same for same, (_, lc, _) in zip(agree, local) if lc >= args.threshold]
+
+    print("\ngpt-4o theme detection")
+    print(f"  accuracy:          {llm_correct / len(examples):.1%}")
+    print(f"  median latency:    {statistics.median(s for _, s in llm) * 1000:.0f} ms")
+    print("\nLocal vs gpt-4o agreement")
+    print(f"  all examples:      {sum(agree)}/{len(agree)} ({sum(agree) / len(agree):.1%})")
+    if agree_local:
+        print(f"  answered locally:  {sum(agree_local)}/{len(agree_local)} ({sum(agree_local) / len(agree_local):.1%})")
+    print("\nHybrid (local, LLM below threshold)")
+    print(f"  accuracy:          {hybrid_correct / len(examples):.1%}")
+    print(f"  mean latency:      {sum(escalated) / len(examples) * 1000:.0f} ms (LLM calls: {len(escalated)}/{len(examples)})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Check that extract_article_content downloads each URL exactly once.
+
+Serves pages from a local HTTP server that counts requests per path. The thin
+page fails the BeautifulSoup method, so every extraction strategy (BeautifulSoup,
+newspaper3k, WPRM container fallback) runs against the same download.
+
+    python benchmarks/check_fetch_count.py
+"""
+
+import contextlib
+import io
+import os
+import sys
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark-placeholder")
+
+import server
+
+PAGES = {
+    "/recipe": b"<html><head><title>Noodles</title></head><body><article>"
+               + b"<h2>Ingredients</h2><ul>" + b"<li>200g ramen noodles, cooked and drained</li>" * 10 + b"</ul>"
+               + b"<p>Toss the noodles in the peanut sauce and serve while hot with chilli oil.</p>" * 5
+               + b"</article></body></html>",
+    "/thin": b"<html><head><title>Thin</title></head><body><p>Too short to extract.</p></body></html>",
+}
+
+hits = Counter()
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        hits[self.path] += 1
+        body = PAGES.get(self.path)
+        self.send_response(200 if body else 404)
+        body = body or b"not found"
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def main():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{httpd.server_address[1]}"
+
+    failures = 0
+    try:
+        for path in PAGES:
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = server.extract_article_content(base + path)
+            method = result["method"] if result else "no content"
+            status = "OK" if hits[path] == 1 else "FAIL"
+            failures += hits[path] != 1
+            print(f"{status:4} {path:8} requests={hits[path]} ({method})")
+    finally:
+        httpd.shutdown()
+
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""
+Caching primitives shared by the pipeline.
+
+TTLCache is a thread-safe in-memory LRU with per-entry expiry, DiskCache keeps
+JSON values in a directory so they survive restarts and are shared between
+worker processes, and TieredCache puts the memory tier in front of the disk tier.
+SingleFlight collapses concurrent identical lookups into one upstream call, for
+threads (do) and for coroutines on one event loop (do_async).
+NegativeCache remembers recent failures per key and per domain.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+def cache_key(*parts):
+    """Stable sha256 key for a tuple of JSON-serializable parts"""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def is_cache_key(key):
+    """True for a key cache_key() could have produced (64 lowercase hex characters)"""
+    return isinstance(key, str) and len(key) == 64 and all(c in "0123456789abcdef" for c in key)
+
+class TTLCache:
+    """In-memory LRU cache with a time-to-live per entry"""
+
+    def __init__(self, maxsize=256, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires, value = entry
+                if expires > time.time():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            return self._data.pop(key, _MISSING) is not _MISSING
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+class DiskCache:
+    """JSON files in a directory, one per key, with expiry and an entry cap"""
+
+    PRUNE_EVERY = 64
+
+    def __init__(self, directory, ttl=7 * 86400, max_entries=5000):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        # Keys become file names, so anything but a cache_key() digest could escape the directory
+        if not is_cache_key(key):
+            raise ValueError(f"invalid cache key: {key!r}")
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key, default=None):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return default
+
+        if entry.get("expires", 0) <= time.time():
+            self.delete(key)
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        return entry["value"]
+
+    def set(self, key, value, ttl=None):
+        entry = {"expires": time.time() + (self.ttl if ttl is None else ttl), "value": value}
+        # Write to a temp file and rename so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def prune(self):
+        """Drop the oldest files once the directory holds more than max_entries"""
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                path = os.path.join(self.directory, name)
+                try:
+                    files.append((os.path.getmtime(path), path))
+                except OSError:
+                    pass
+        files.sort()
+        for _, path in files[:max(0, len(files) - self.max_entries)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        entries = sum(1 for name in os.listdir(self.directory) if name.endswith(".json"))
+        return {"size": entries, "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+class TieredCache:
+    """Memory tier in front of an optional disk tier; disk hits are promoted to memory"""
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key, default=None):
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key, _MISSING)
+            if value is not _MISSING:
+                self.memory.set(key, value)
+                return value
+        return default
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value)
+            except OSError as e:
+                print(f"DEBUG: Disk cache write failed: {e}")
+
+    def delete(self, key):
+        removed = self.memory.delete(key)
+        if self.disk is not None:
+            removed = self.disk.delete(key) or removed
+        return removed
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        return {
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None
+        }
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class _LeaderCancelled(Exception):
+    """Set on an async flight whose leader was cancelled, so its followers run the call themselves"""
+
+class SingleFlight:
+    """Run fn once per key at a time; concurrent callers for the same key wait and share the result"""
+
+    def __init__(self):
+        self._flights = {}
+        self._async_flights = {}  # key -> asyncio.Future of the leading coroutine
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def do_async(self, key, fn):
+        """do() for coroutines: fn is an async callable, concurrent awaiters of the key share its result"""
+        while True:
+            with self._lock:
+                future = self._async_flights.get(key)
+                leader = future is None
+                if leader:
+                    future = self._async_flights[key] = asyncio.get_running_loop().create_future()
+                    self.calls += 1
+                else:
+                    self.shared += 1
+
+            if leader:
+                break
+            try:
+                # shield: a follower being cancelled must not cancel the shared call
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                continue  # The leader's caller went away, not ours: take over (or join whoever did)
+
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            # Not cancel(): followers would get a CancelledError they never asked for
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Retrieved here so a flight without followers doesn't log "never retrieved"
+            raise
+        finally:
+            with self._lock:
+                del self._async_flights[key]
+
+    def stats(self):
+        return {"upstream_calls": self.calls, "collapsed": self.shared}
+
+class NegativeCache:
+    """Short-lived memory of failures, per key and per domain.
+
+    add() stores a failure for one key, or for the whole domain when
+    `domain_wide` is set. Failures of the `strike` kind also count against
+    their domain, and `strikes` of them within the strike window block the
+    domain too. check() returns the entry that applies, and each hit credits
+    the time the original failure took to `seconds_saved`.
+    """
+
+    def __init__(self, maxsize=2048, strikes=3, strike_window=120):
+        self.keys = TTLCache(maxsize=maxsize, ttl=60)
+        self.domains = TTLCache(maxsize=maxsize, ttl=60)
+        self._strikes = TTLCache(maxsize=maxsize, ttl=strike_window)
+        self.strikes = strikes
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.key_hits = 0
+        self.domain_hits = 0
+        self.seconds_saved = 0.0
+
+    def check(self, key, domain):
+        """The failure entry blocking this key (or its domain), or None"""
+        entry = self.keys.get(key)
+        scope = "key"
+        if entry is None and domain:
+            entry = self.domains.get(domain)
+            scope = "domain"
+        if entry is None:
+            return None
+        with self._lock:
+            if scope == "key":
+                self.key_hits += 1
+            else:
+                self.domain_hits += 1
+            self.seconds_saved += entry["elapsed"]
+        return entry
+
+    def peek(self, key, domain):
+        """Like check() without counting a hit"""
+        entry = self.keys.get(key)
+        if entry is None and domain:
+            entry = self.domains.get(domain)
+        return entry
+
+    def add(self, key, domain, kind, ttl, elapsed=0.0, message="", domain_wide=False, strike=False):
+        entry = {"kind": kind, "message": message, "elapsed": elapsed, "expires": time.time() + ttl}
+        with self._lock:
+            self.stored += 1
+            if strike and domain and not domain_wide:
+                count = self._strikes.get(domain, 0) + 1
+                self._strikes.set(domain, count)
+                domain_wide = count >= self.strikes
+        if domain_wide and domain:
+            self.domains.set(domain, entry, ttl=ttl)
+        else:
+            self.keys.set(key, entry, ttl=ttl)
+
+    def clear(self):
+        self.keys.clear()
+        self.domains.clear()
+        self._strikes.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "keys": len(self.keys),
+                "domains": len(self.domains),
+                "stored": self.stored,
+                "key_hits": self.key_hits,
+                "domain_hits": self.domain_hits,
+                "seconds_saved": round(self.seconds_saved, 2)
+            }
@@ -0,0 +1,168 @@
+"""
+URL canonicalization in front of article extraction.
+
+One article reaches us under many URLs (utm_* and click-id parameters, AMP
+variants, trailing slashes, http vs https, redirect chains). clean_url strips
+tracking parameters and fragments and is safe to fetch; url_identity further
+folds scheme, AMP markers and trailing slashes into the key that the article,
+negative and result caches share. Canonicalizer memoizes what fetches taught
+us (final URL after redirects, <link rel="canonical">) so later requests for
+any alias go straight to the known identity, and counts how often distinct
+URLs collapsed onto one. find_light_variant picks an advertised AMP or print
+version of a page out of its <head>.
+"""
+import re
+import threading
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+from cache import TTLCache
+
+TRACKING_PARAMS = frozenset("""
+fbclid gclid dclid gbraid wbraid msclkid yclid twclid igshid mc_cid mc_eid _ga _gl _hsenc _hsmi mkt_tok
+ref_src s_cid cmpid ncid ocid sr_share guccounter guce_referrer guce_referrer_sig
+""".split())
+TRACKING_PREFIXES = ("utm_", "pk_", "hsa_")
+AMP_PARAMS = frozenset(("amp", "outputtype", "usqp"))
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+CANONICAL_LINK_RE = re.compile(rb"<link\b[^>]*\brel\s*=\s*[\"']?canonical\b[^>]*>", re.IGNORECASE)
+HREF_RE = re.compile(rb"\bhref\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s>]+))", re.IGNORECASE)
+HEAD_BYTES = 128 * 1024  # <link rel=canonical> lives in <head>
+
+def is_tracking_param(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+def clean_url(url):
+    """Fetchable URL without tracking parameters or fragment; host lowercased, default port dropped"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and str(parts.port) != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not is_tracking_param(k)]
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+def url_identity(url):
+    """Cache/dedup key: clean_url with https, no AMP markers, no trailing slash, sorted query"""
+    parts = urlsplit(clean_url(url))
+    # Only a trailing /amp segment or .amp suffix on a real path is a marker; /amp itself is a page
+    path = re.sub(r"(?<=[^/])(?:/amp/?$|\.amp(?=\.html?$|$))", "", parts.path, flags=re.IGNORECASE).rstrip("/") or "/"
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in AMP_PARAMS)
+    host = parts.netloc[4:] if parts.netloc.startswith("amp.") else parts.netloc
+    return urlunsplit(("https", host, path, urlencode(query), ""))
+
+def same_site(a, b):
+    """Same host, ignoring a leading www./amp. (canonical links across sites are not trusted)"""
+    def site(url):
+        host = (urlsplit(url).hostname or "").lower()
+        return re.sub(r"^(www|amp|m)\.", "", host)
+    return site(a) == site(b)
+
+def path_depth(url):
+    """Number of path segments in the URL's identity (0 for the site root)"""
+    return len([segment for segment in urlsplit(url_identity(url)).path.split("/") if segment])
+
+def find_canonical_link(content, base_url):
+    """Absolute <link rel="canonical"> href from the page head, or None (only trusted on the same site,
+    for a non-root page at the same path depth)"""
+    if isinstance(content, str):
+        content = content.encode("utf-8", errors="replace")
+    match = CANONICAL_LINK_RE.search(content, 0, HEAD_BYTES)
+    if not match:
+        return None
+    href = HREF_RE.search(match.group(0))
+    if not href:
+        return None
+    value = next(group for group in href.groups() if group is not None).decode("utf-8", errors="replace").strip()
+    canonical = urljoin(base_url, value)
+    if not canonical.startswith(("http://", "https://")) or not same_site(canonical, base_url):
+        return None
+    # Site-wide canonicals to the homepage and page-2 -> page-1 canonicals name a different document
+    depth = path_depth(canonical)
+    if depth == 0 or depth != path_depth(base_url):
+        return None
+    return canonical
+
+LINK_TAG_RE = re.compile(rb"<link\b[^>]*>", re.IGNORECASE)
+ATTR_RE = re.compile(rb"([a-zA-Z][\w:-]*)\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s>]+))")
+
+def link_tags(head):
+    """Attributes (lowercased names) of each <link> tag in the page head"""
+    for match in LINK_TAG_RE.finditer(head, 0, HEAD_BYTES):
+        attrs = {}
+        for attr in ATTR_RE.finditer(match.group(0)):
+            value = next(group for group in attr.groups()[1:] if group is not None)
+            attrs[attr.group(1).decode("ascii", errors="replace").lower()] = value.decode("utf-8", errors="replace").strip()
+        yield attrs
+
+def find_light_variant(head, base_url):
+    """(kind, absolute URL) of an advertised lighter version of the page: rel=amphtml first,
+    then rel=alternate media=print; same site only. None when the page advertises neither."""
+    if isinstance(head, str):
+        head = head.encode("utf-8", errors="replace")
+    found = {}
+    for attrs in link_tags(head):
+        rel = attrs.get("rel", "").lower().split()
+        href = attrs.get("href")
+        if not href:
+            continue
+        if "amphtml" in rel:
+            found.setdefault("amp", href)
+        elif "alternate" in rel and "print" in attrs.get("media", "").lower():
+            found.setdefault("print", href)
+
+    for kind in ("amp", "print"):
+        if kind in found:
+            variant = urljoin(base_url, found[kind])
+            # AMP variants share the page's identity by design; only the fetched URL has to differ
+            if variant.startswith(("http://", "https://")) and same_site(variant, base_url) and \
+                    clean_url(variant) != clean_url(base_url):
+                return kind, variant
+    return None
+
+class Canonicalizer:
+    """Memo of learned aliases (redirects, rel=canonical) plus collision accounting"""
+
+    def __init__(self, maxsize=4096, ttl=86400):
+        self.aliases = TTLCache(maxsize=maxsize, ttl=ttl)  # identity -> clean URL to fetch
+        self._first_seen = TTLCache(maxsize=maxsize, ttl=ttl)  # identity -> first clean URL that produced it
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "rewritten": 0, "collisions": 0, "aliases_learned": 0}
+
+    def resolve(self, url):
+        """(url to fetch, identity key) for a requested URL"""
+        cleaned = clean_url(url)
+        fetch_url = self.aliases.get(url_identity(cleaned)) or cleaned
+        key = url_identity(fetch_url)
+        self._count(cleaned, key, rewritten=fetch_url != url)
+        return fetch_url, key
+
+    def learn(self, requested_url, final_url, canonical_url=None):
+        """Record where a fetch ended up; returns the identity key the article should be stored under"""
+        target = clean_url(canonical_url or final_url)
+        key = url_identity(target)
+        with self._lock:
+            for alias in {url_identity(requested_url), url_identity(final_url)}:
+                if alias != key and self.aliases.get(alias) != target:
+                    self.aliases.set(alias, target)
+                    self._stats["aliases_learned"] += 1
+        if key != url_identity(requested_url):
+            self._count(clean_url(requested_url), key, new_request=False)
+        return key
+
+    def _count(self, cleaned, key, rewritten=False, new_request=True):
+        with self._lock:
+            self._stats["requests"] += new_request
+            self._stats["rewritten"] += rewritten
+            first = self._first_seen.get(key)
+            if first is None:
+                self._first_seen.set(key, cleaned)
+            elif first != cleaned:
+                self._stats["collisions"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, aliases=len(self.aliases))
+        stats["collision_rate"] = round(stats["collisions"] / stats["requests"], 3) if stats["requests"] else 0.0
+        return stats
@@ -0,0 +1,149 @@
+"""
+Cheap character-encoding resolution for fetched HTML.
+
+Handing BeautifulSoup raw bytes makes it run UnicodeDammit, which sniffs the
+whole document (and runs a statistical detector when one is installed).
+decode_html instead settles the encoding the way browsers do from cheap
+signals: a byte-order mark, the charset in the Content-Type header, or the
+first <meta charset> in the opening bytes. It also accepts bytes that decode
+cleanly as UTF-8. Only documents with none of these are left to full
+detection. resolve_encoding settles the same encoding without keeping a
+decoded copy, so the page can go to the parser as bytes with the encoding
+named (lxml decodes natively, and parsing bytes beats parsing a wide str).
+"""
+import codecs
+import functools
+import re
+
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+PRESCAN_BYTES = 4096  # HTML requires the <meta charset> within the first 1024 bytes; real pages stray a bit further
+
+HEADER_CHARSET_RE = re.compile(r"charset\s*=\s*[\"']?([\w.:-]+)", re.IGNORECASE)
+META_CHARSET_RE = re.compile(
+    rb"<meta\b[^>]*?\bcharset\s*=\s*[\"']?\s*([\w.:-]+)",  # <meta charset=..> and content="text/html; charset=.."
+    re.IGNORECASE
+)
+
+# WHATWG encoding aliases: labels that browsers decode with a superset codec
+ENCODING_OVERRIDES = {
+    "iso-8859-1": "windows-1252",
+    "latin-1": "windows-1252",
+    "latin1": "windows-1252",
+    "ascii": "windows-1252",
+    "us-ascii": "windows-1252",
+    "iso-8859-9": "windows-1254",
+    "tis-620": "windows-874",
+    "gb2312": "gb18030",
+    "gbk": "gb18030",
+    "x-sjis": "shift_jis",
+}
+
+def normalize_encoding(label):
+    """Python codec name for an encoding label, or None if unknown"""
+    if not label:
+        return None
+    label = label.strip().strip("\"'").lower()
+    label = ENCODING_OVERRIDES.get(label, label)
+    try:
+        return codecs.lookup(label).name
+    except LookupError:
+        return None
+
+def declared_encoding(content, content_type=None):
+    """(encoding, source) from the BOM, the Content-Type header or a <meta> in the first PRESCAN_BYTES"""
+    for bom, encoding in BOMS:
+        if content.startswith(bom):
+            return encoding, "bom"
+
+    if content_type:
+        match = HEADER_CHARSET_RE.search(content_type)
+        encoding = normalize_encoding(match.group(1)) if match else None
+        if encoding:
+            return encoding, "header"
+
+    match = META_CHARSET_RE.search(content, 0, PRESCAN_BYTES)
+    if match:
+        encoding = normalize_encoding(match.group(1).decode("ascii", errors="ignore"))
+        # A UTF-16 <meta> in bytes we could read as ASCII is a lie; browsers treat it as UTF-8
+        if encoding and encoding.startswith("utf-16"):
+            encoding = "utf-8"
+        if encoding:
+            return encoding, "meta"
+    return None, None
+
+def decode_html(content, content_type=None):
+    """(text, encoding, source) for an HTML body. text is None when the encoding is
+    genuinely ambiguous, and the caller should let the parser run full detection."""
+    if isinstance(content, str):
+        return content, None, "text"
+
+    encoding, source = declared_encoding(content, content_type)
+    if encoding:
+        if source == "bom":
+            content = content[next(len(bom) for bom, name in BOMS if content.startswith(bom)):]
+        try:
+            return content.decode(encoding), encoding, source
+        except UnicodeDecodeError:
+            pass
+        # Mislabelled pages are nearly always really UTF-8; otherwise decode as declared, like a browser
+        try:
+            return content.decode("utf-8"), "utf-8", "utf-8"
+        except UnicodeDecodeError:
+            return content.decode(encoding, errors="replace"), encoding, source
+
+    try:
+        return content.decode("utf-8"), "utf-8", "utf-8"  # Valid UTF-8 (incl. pure ASCII) is unambiguous in practice
+    except UnicodeDecodeError:
+        return None, None, "fallback"
+
+@functools.lru_cache(maxsize=64)
+def undefined_bytes(encoding):
+    """Byte values a single-byte codec cannot decode (5 for windows-1252); None for multi-byte codecs
+    and for codecs with so many holes that a full decode is the cheaper check"""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    undefined = []
+    for value in range(256):
+        try:
+            if len(decoder.decode(bytes([value]))) != 1:
+                return None  # Lead byte of a sequence
+        except UnicodeDecodeError:
+            undefined.append(bytes([value]))
+            decoder.reset()
+    return tuple(undefined) if len(undefined) <= 8 else None
+
+def decodes(content, encoding):
+    """True if the whole body decodes with encoding (single-byte codecs: a scan for undefined bytes)"""
+    undefined = undefined_bytes(encoding)
+    if undefined is not None:
+        return not any(value in content for value in undefined)
+    try:
+        content.decode(encoding)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+def resolve_encoding(content, content_type=None):
+    """(encoding, source) like decode_html, without keeping a decoded copy. A declared UTF-8 is taken
+    as is (parsers substitute U+FFFD for bad bytes); any other encoding must decode the whole body,
+    because lxml returns an empty tree on one undecodable legacy byte. (None, "fallback") when no
+    encoding fits and (None, "text") for content that is already str."""
+    if isinstance(content, str):
+        return None, "text"
+
+    encoding, source = declared_encoding(content, content_type)
+    if encoding and (encoding == "utf-8" or decodes(content, encoding)):
+        return encoding, source
+    if decodes(content, "utf-8"):
+        return "utf-8", "utf-8"
+    return None, "fallback"
+
+def ascii_compatible(encoding):
+    """False for the UTF-16/32 family, where byte-level tag regexes cannot see the markup"""
+    return not encoding.startswith(("utf-16", "utf-32"))
@@ -0,0 +1,93 @@
+"""
+Pre-prompt compaction for extracted article text.
+
+Extraction output repeats itself: WPRM recipe blocks are concatenated with the
+article selector output that contains the same lists, merged sources overlap,
+and pages carry share/newsletter/cookie lines. compact_text drops repeated
+blocks and paragraph lines by hash, removes short boilerplate lines and
+collapses whitespace, so fewer prompt tokens are paid for and the first token
+comes back sooner. [LIST]/[TABLE]/[HEADING] markers are kept intact, and
+heading-only blocks are never deduplicated.
+"""
+import hashlib
+import re
+
+BLOCK_SPLIT_RE = re.compile(r"\n\s*\n")
+
+BOILERPLATE_RE = re.compile(
+    r"^(?:"
+    r"advertisement|sponsored( content)?|skip to (main )?content|jump to recipe|print recipe|pin (it|this|recipe)"
+    r"|share (this|on \w+)|(click|tap) here\b.*|read more\b.*|continue reading\b.*|related (posts|articles|stories)"
+    r"|(sign up|subscribe)\b.*(newsletter|inbox|updates)\b.*|follow us\b.*|leave a (comment|reply)\b.*"
+    r"|this post may contain affiliate links\b.*|we use cookies\b.*|accept (all )?cookies|cookie (policy|settings)"
+    r"|all rights reserved\.?|©.*|copyright \d{4}.*|loading\.*|(facebook|twitter|pinterest|email|whatsapp)(\s*\|\s*\w+)*"
+    r")$",
+    re.IGNORECASE
+)
+
+BOILERPLATE_MAX_CHARS = 120  # Longer lines are content even if they mention "subscribe" or "cookies"
+DEDUP_LINE_MIN_CHARS = 40  # Shorter paragraph lines ("Serves 4", "Notes") may legitimately repeat
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token for English prose)"""
+    return (len(text) + 3) // 4
+
+def fingerprint(text):
+    return hashlib.sha1(" ".join(text.lower().split()).encode("utf-8")).hexdigest()
+
+def is_boilerplate(line):
+    return len(line) <= BOILERPLATE_MAX_CHARS and BOILERPLATE_RE.match(line) is not None
+
+def compact_text(text):
+    """Returns (compacted_text, stats): blocks and paragraph lines seen before are dropped,
+    boilerplate lines removed, whitespace collapsed"""
+    seen_blocks = set()
+    seen_lines = set()
+    blocks = []
+    removed = {"duplicate_blocks": 0, "duplicate_lines": 0, "boilerplate_lines": 0}
+
+    for raw_block in BLOCK_SPLIT_RE.split(text):
+        lines = [" ".join(line.split()) for line in raw_block.splitlines()]
+        lines = [line for line in lines if line]
+        if not lines:
+            continue
+
+        structured = lines[0] in ("[LIST]", "[TABLE]") or lines[0].startswith("[HEADING]")
+        kept = []
+        for line in lines:
+            if not structured:
+                if is_boilerplate(line):
+                    removed["boilerplate_lines"] += 1
+                    continue
+                if len(line) >= DEDUP_LINE_MIN_CHARS:
+                    key = fingerprint(line)
+                    if key in seen_lines:
+                        removed["duplicate_lines"] += 1
+                        continue
+                    seen_lines.add(key)
+            kept.append(line)
+
+        if not kept or (structured and len(kept) == 2 and kept[0] in ("[LIST]", "[TABLE]")):
+            continue  # Nothing left, or an empty [LIST]...[/LIST] shell
+
+        block = "\n".join(kept)
+        if all(line.startswith("[HEADING]") for line in kept):
+            # "Ingredients" or "Notes" heads a section in every merged source; dropping the
+            # repeat would run the second source's section into the one before it
+            blocks.append(block)
+            continue
+        key = fingerprint(block)
+        if key in seen_blocks:
+            removed["duplicate_blocks"] += 1
+            continue
+        seen_blocks.add(key)
+        blocks.append(block)
+
+    compacted = "\n\n".join(blocks)
+    stats = dict(
+        removed,
+        chars_before=len(text),
+        chars_after=len(compacted),
+        tokens_saved=max(0, estimate_tokens(text) - estimate_tokens(compacted))
+    )
+    return compacted, stats
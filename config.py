@@ -28,6 +28,109 @@ class Config:
         "Comprehensive": int(os.getenv("MAX_TOKENS_COMPREHENSIVE", "12000"))
     }
 
+    # Outbound HTTP connection pools (Brave search, article fetches)
+    HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "20"))  # hosts kept pooled
+    HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "10"))  # keep-alive connections per host
+    HTTP_POOL_BLOCK = os.getenv("HTTP_POOL_BLOCK", "false").lower() == "true"
+
+    # Brave search result cache
+    SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+    SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "1800"))
+
+    # Article extraction parser: "html.parser" (default), "lxml" or "html5lib".
+    # lxml is faster but re-nests malformed markup the way browsers do (a <div> inside an
+    # unclosed <p> ends the paragraph), so extracted text can differ on such pages
+    HTML_PARSER = os.getenv("HTML_PARSER", "html.parser")
+    HTML_PRESTRIP = os.getenv("HTML_PRESTRIP", "true").lower() == "true"  # strip <script>/<style> before parsing
+
+    # Article parsing in spawned worker processes (PARSE_WORKERS=0 parses in the request thread)
+    PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "2"))
+    PARSE_CPU_SECONDS = int(os.getenv("PARSE_CPU_SECONDS", "10"))  # CPU time per page
+    PARSE_MEMORY_MB = int(os.getenv("PARSE_MEMORY_MB", "2048"))  # address space per worker
+    PARSE_TASKS_PER_CHILD = int(os.getenv("PARSE_TASKS_PER_CHILD", "200"))  # pages before a worker is replaced
+    PARSE_TIMEOUT = float(os.getenv("PARSE_TIMEOUT", "30"))  # wall-clock seconds the request waits for a page
+
+    # Article downloads: streamed, capped, and one deadline for the whole redirect chain
+    FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(5 * 1024 * 1024)))
+    FETCH_DEADLINE = float(os.getenv("FETCH_DEADLINE", "10"))
+    FETCH_CONNECT_TIMEOUT = float(os.getenv("FETCH_CONNECT_TIMEOUT", "3.05"))
+    FETCH_MAX_REDIRECTS = int(os.getenv("FETCH_MAX_REDIRECTS", "5"))
+
+    # Per-host outbound scheduling: concurrency cap, token-bucket pacing, latency-based timeouts
+    HOST_MAX_CONCURRENCY = int(os.getenv("HOST_MAX_CONCURRENCY", "4"))
+    HOST_RATE = float(os.getenv("HOST_RATE", "2"))  # requests per second per host (0 = no pacing)
+    HOST_BURST = int(os.getenv("HOST_BURST", "4"))
+    HOST_TIMEOUT_PERCENTILE = float(os.getenv("HOST_TIMEOUT_PERCENTILE", "95"))
+    HOST_TIMEOUT_FACTOR = float(os.getenv("HOST_TIMEOUT_FACTOR", "3"))  # timeout = factor x latency percentile
+    HOST_TIMEOUT_MIN = float(os.getenv("HOST_TIMEOUT_MIN", "2"))
+    HOST_TIMEOUT_MAX = float(os.getenv("HOST_TIMEOUT_MAX", "20"))
+    HOST_MAX_TRACKED = int(os.getenv("HOST_MAX_TRACKED", "1024"))  # idle hosts beyond this are forgotten, LRU first
+
+    # Several article URLs in one request: fetched concurrently, merged into one document
+    MULTI_URL_MAX = int(os.getenv("MULTI_URL_MAX", "10"))
+    MULTI_URL_WORKERS = int(os.getenv("MULTI_URL_WORKERS", "8"))
+    MULTI_URL_PER_HOST = int(os.getenv("MULTI_URL_PER_HOST", "2"))
+    MULTI_URL_BUDGET = float(os.getenv("MULTI_URL_BUDGET", "20"))  # seconds for the whole set
+
+    # Dedupe blocks, drop boilerplate lines and collapse whitespace in extracted text before prompting
+    PROMPT_COMPACTION = os.getenv("PROMPT_COMPACTION", "true").lower() == "true"
+
+    # Per-domain extraction strategy memory (empty path = fixed order)
+    STRATEGY_DB_PATH = os.getenv("STRATEGY_DB_PATH", "strategies.db")
+    STRATEGY_HALF_LIFE = int(os.getenv("STRATEGY_HALF_LIFE", str(7 * 86400)))  # seconds for scores to halve
+    STRATEGY_SKIP_AFTER = float(os.getenv("STRATEGY_SKIP_AFTER", "5"))  # recent failures before a strategy is skipped
+
+    # Negative cache for failing article URLs/domains (NEGATIVE_CACHE_TTL=0 disables)
+    NEGATIVE_CACHE_SIZE = int(os.getenv("NEGATIVE_CACHE_SIZE", "2048"))
+    NEGATIVE_CACHE_TTL = int(os.getenv("NEGATIVE_CACHE_TTL", "60"))  # timeouts, 5xx, unreachable, 429
+    NEGATIVE_CACHE_TTL_PERMANENT = int(os.getenv("NEGATIVE_CACHE_TTL_PERMANENT", "600"))  # 404/403, not HTML, no content
+    NEGATIVE_DOMAIN_STRIKES = int(os.getenv("NEGATIVE_DOMAIN_STRIKES", "3"))  # timeouts/5xx before the domain is blocked
+
+    # Learned URL aliases (redirect targets, rel=canonical) so every variant shares one cache identity
+    CANONICAL_CACHE_SIZE = int(os.getenv("CANONICAL_CACHE_SIZE", "8192"))
+    CANONICAL_CACHE_TTL = int(os.getenv("CANONICAL_CACHE_TTL", "86400"))
+
+    # Prefer advertised lightweight variants (rel=amphtml, print) when they pass a size/content sanity check
+    PREFER_LIGHT_VARIANTS = os.getenv("PREFER_LIGHT_VARIANTS", "true").lower() == "true"
+    VARIANT_MIN_BYTES = int(os.getenv("VARIANT_MIN_BYTES", "2048"))
+    VARIANT_MIN_CHARS = int(os.getenv("VARIANT_MIN_CHARS", "800"))
+
+    # Extracted article cache; stale entries are kept for revalidation with conditional GETs
+    ARTICLE_CACHE_SIZE = int(os.getenv("ARTICLE_CACHE_SIZE", "512"))
+    ARTICLE_CACHE_TTL = int(os.getenv("ARTICLE_CACHE_TTL", "900"))  # served without any request
+    ARTICLE_CACHE_RETAIN = int(os.getenv("ARTICLE_CACHE_RETAIN", "86400"))  # kept for If-None-Match/If-Modified-Since
+    ARTICLE_CACHE_MAX_CHARS = int(os.getenv("ARTICLE_CACHE_MAX_CHARS", "200000"))
+
+    # Local theme classifier answers on its own at or above this confidence; below it, gpt-4o decides.
+    # Calibrated on benchmarks/theme_calibration.json (bench_theme_classifier.py --calibrate)
+    THEME_CONFIDENCE_THRESHOLD = float(os.getenv("THEME_CONFIDENCE_THRESHOLD", "0.91"))
+
+    # Generated document cache (in-memory LRU in front of an on-disk tier)
+    RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "256"))
+    RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", "3600"))
+    RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "cache/results")  # empty = memory only
+    RESULT_CACHE_DISK_TTL = int(os.getenv("RESULT_CACHE_DISK_TTL", str(7 * 86400)))
+    RESULT_CACHE_DISK_ENTRIES = int(os.getenv("RESULT_CACHE_DISK_ENTRIES", "5000"))
+
+    # Batch processing (POST /api/process/batch)
+    BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "50"))
+    BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "8"))
+    BATCH_STAGE_LIMITS = {
+        "extract": int(os.getenv("BATCH_LIMIT_EXTRACT", "8")),
+        "theme": int(os.getenv("BATCH_LIMIT_THEME", "4")),
+        "search": int(os.getenv("BATCH_LIMIT_SEARCH", "4")),
+        "generate": int(os.getenv("BATCH_LIMIT_GENERATE", "4"))
+    }
+
+    # Background job queue (POST /api/jobs)
+    JOB_DB_PATH = os.getenv("JOB_DB_PATH", "jobs.db")
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # per web process; 0 = run `python jobs.py` separately
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "900"))
+
+    # ASGI entry point: threads running the Flask routes it delegates (per worker process)
+    ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "32"))
+
 def get_config():
     """Get the configuration instance"""
     return Config()
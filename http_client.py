@@ -0,0 +1,512 @@
+"""
+Pooled, keep-alive HTTP layer for every outbound requests call.
+
+All threads share one HTTPAdapter, so connections (and their DNS/TCP/TLS setup)
+are reused per host across requests. Each thread gets its own Session on top of
+that adapter, keeping cookie and header state thread-local while the urllib3
+pools underneath stay shared.
+
+fetch_html streams a page with a byte cap, rejects non-HTML responses from
+their headers, and enforces one deadline across the whole redirect chain.
+Every fetch goes through a HostScheduler: a concurrency cap and token bucket
+per host, with the deadline adapted to that host's observed latency.
+"""
+import collections
+import contextlib
+import math
+import threading
+import time
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import DecodeError, ProtocolError, ReadTimeoutError
+
+class MeteredAdapter(HTTPAdapter):
+    """HTTPAdapter that counts requests and time per host"""
+
+    def __init__(self, *args, **kwargs):
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        host = urlparse(request.url).netloc
+        start = time.perf_counter()
+        try:
+            return super().send(request, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._stats_lock:
+                stats = self._stats.setdefault(host, {"requests": 0, "seconds": 0.0})
+                stats["requests"] += 1
+                stats["seconds"] += elapsed
+
+    def metrics(self):
+        """Per-host request counts, latency and connection reuse from the live pools"""
+        with self._stats_lock:
+            hosts = {
+                host: {
+                    "requests": stats["requests"],
+                    "avg_ms": round(stats["seconds"] / stats["requests"] * 1000, 1) if stats["requests"] else 0.0
+                }
+                for host, stats in self._stats.items()
+            }
+
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            default_port = {"http": 80, "https": 443}.get(key.key_scheme)
+            host = key.key_host if key.key_port in (None, default_port) else f"{key.key_host}:{key.key_port}"
+            entry = hosts.setdefault(host, {"requests": 0, "avg_ms": 0.0})
+            entry["connections_opened"] = pool.num_connections
+            entry["idle_connections"] = pool.pool.qsize() if pool.pool is not None else 0
+            if entry["requests"]:
+                entry["reuse_ratio"] = round(1 - pool.num_connections / entry["requests"], 3)
+        return hosts
+
+_adapter = None
+_adapter_lock = threading.Lock()
+_local = threading.local()
+_pool_config = {"pool_connections": 20, "pool_maxsize": 10, "pool_block": False}
+
+def configure(pool_connections=20, pool_maxsize=10, pool_block=False):
+    """Set pool sizes (before the first request): hosts kept, connections per host, block when full"""
+    global _adapter
+    with _adapter_lock:
+        _pool_config.update(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block)
+        _adapter = None
+
+def get_adapter():
+    global _adapter
+    if _adapter is None:
+        with _adapter_lock:
+            if _adapter is None:
+                _adapter = MeteredAdapter(**_pool_config)
+    return _adapter
+
+def get_session():
+    """Thread-local Session sharing the process-wide connection pools"""
+    adapter = get_adapter()
+    session = getattr(_local, "session", None)
+    if session is None or getattr(_local, "adapter", None) is not adapter:
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _local.session = session
+        _local.adapter = adapter
+    return session
+
+def get(url, **kwargs):
+    """requests.get over the pooled session"""
+    return get_session().get(url, **kwargs)
+
+class HostState:
+    __slots__ = ("semaphore", "tokens", "refilled_at", "blocked_until", "latencies", "in_flight", "users", "throttled",
+                 "back_offs")
+
+    def __init__(self, max_concurrency, burst):
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.tokens = float(burst)
+        self.refilled_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.latencies = collections.deque(maxlen=200)
+        self.in_flight = 0
+        self.users = 0  # slot() callers holding or waiting for the semaphore
+        self.throttled = 0
+        self.back_offs = 0
+
+class HostScheduler:
+    """Per-host concurrency cap, token-bucket pacing and latency-based timeouts.
+
+    A host gets at most `max_concurrency` requests at once and `rate` new requests
+    per second (bursts up to `burst`). Once `min_samples` fetches have succeeded,
+    its timeout becomes `factor` x the `percentile` latency, clamped to
+    [min_timeout, max_timeout]: a host that normally answers in 300 ms is given
+    up on after min_timeout, a legitimately slow one keeps its longer budget.
+
+    State is kept for the `max_hosts` most recently used hosts. Beyond that the
+    least recently used idle hosts are forgotten (no request in or waiting for a
+    slot, no Retry-After hold, a full token bucket), so forgetting one changes
+    nothing but its latency samples.
+    """
+
+    def __init__(self, max_concurrency=4, rate=2.0, burst=4, percentile=95, factor=3.0,
+                 min_timeout=2.0, max_timeout=20.0, min_samples=5, max_hosts=1024):
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = burst
+        self.percentile = percentile
+        self.factor = factor
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.min_samples = min_samples
+        self.max_hosts = max_hosts
+        self._hosts = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def _host(self, host, claim=False):
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = self._hosts[host] = HostState(self.max_concurrency, self.burst)
+                if len(self._hosts) > self.max_hosts:
+                    self._evict_idle(time.monotonic(), keep=host)
+            else:
+                self._hosts.move_to_end(host)
+            if claim:
+                state.users += 1  # Under the same lock, so the state can't be evicted before slot() holds it
+            return state
+
+    def _idle(self, state, now):
+        refilled = self.rate <= 0 or state.tokens + (now - state.refilled_at) * self.rate >= self.burst
+        return state.users == 0 and state.blocked_until <= now and refilled
+
+    def _evict_idle(self, now, keep):
+        """Drop least recently used idle hosts down to max_hosts (busy ones stay even past the cap)"""
+        for host in [host for host, state in self._hosts.items() if host != keep and self._idle(state, now)]:
+            if len(self._hosts) <= self.max_hosts:
+                break
+            del self._hosts[host]
+            self.evicted += 1
+
+    def reserve(self, host):
+        """Take a token for one request; returns the seconds to wait before sending it"""
+        state = self._host(host)
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, state.blocked_until - now)
+            if self.rate > 0:
+                state.tokens = min(self.burst, state.tokens + (now - state.refilled_at) * self.rate)
+                state.refilled_at = now
+                state.tokens -= 1
+                if state.tokens < 0:
+                    wait = max(wait, -state.tokens / self.rate)
+            if wait > 0:
+                state.throttled += 1
+            return wait
+
+    def refund(self, host):
+        """Give back a token reserved for a request that was not sent"""
+        state = self._host(host)
+        with self._lock:
+            state.tokens = min(self.burst, state.tokens + 1)
+
+    def back_off(self, host, seconds):
+        """Hold new requests to a host that answered 429/503 (Retry-After)"""
+        state = self._host(host)
+        with self._lock:
+            state.blocked_until = max(state.blocked_until, time.monotonic() + seconds)
+            state.back_offs += 1
+
+    @contextlib.contextmanager
+    def slot(self, host, timeout):
+        """Concurrency slot plus pacing for one request; HostBusy if neither is available within timeout"""
+        state = self._host(host, claim=True)
+        start = time.monotonic()
+        try:
+            if not state.semaphore.acquire(timeout=max(0.0, timeout)):
+                raise HostBusy(f"{host}: {self.max_concurrency} requests already in flight")
+            try:
+                wait = self.reserve(host)
+                if wait > timeout - (time.monotonic() - start):
+                    self.refund(host)
+                    raise HostBusy(f"{host}: rate limited for another {wait:.1f}s")
+                if wait > 0:
+                    time.sleep(wait)
+                with self._lock:
+                    state.in_flight += 1
+                try:
+                    yield
+                finally:
+                    with self._lock:
+                        state.in_flight -= 1
+            finally:
+                state.semaphore.release()
+        finally:
+            with self._lock:
+                state.users -= 1
+
+    def observe(self, host, seconds):
+        """Record the duration of a successful fetch"""
+        state = self._host(host)
+        with self._lock:
+            state.latencies.append(seconds)
+
+    def _percentile(self, latencies, percentile):
+        ordered = sorted(latencies)
+        return ordered[max(0, math.ceil(percentile / 100 * len(ordered)) - 1)]
+
+    def timeout(self, host, default):
+        """Deadline for the next fetch from this host: default until enough samples are in, and
+        never longer than default afterwards (adaptation only shortens the caller's budget).
+        default=None gives the unclamped adaptive value."""
+        state = self._host(host)
+        with self._lock:
+            if len(state.latencies) < self.min_samples:
+                return default
+            latency = self._percentile(state.latencies, self.percentile)
+        ceiling = self.max_timeout if default is None else min(default, self.max_timeout)
+        return min(ceiling, max(self.min_timeout, latency * self.factor))
+
+    def metrics(self):
+        with self._lock:
+            hosts = {host: (list(state.latencies), state.in_flight, state.throttled, state.back_offs)
+                     for host, state in self._hosts.items()}
+        report = {}
+        for host, (latencies, in_flight, throttled, back_offs) in hosts.items():
+            entry = {"in_flight": in_flight, "throttled": throttled, "back_offs": back_offs, "samples": len(latencies)}
+            if latencies:
+                entry["p50_ms"] = round(self._percentile(latencies, 50) * 1000, 1)
+                entry[f"p{self.percentile}_ms"] = round(self._percentile(latencies, self.percentile) * 1000, 1)
+            if len(latencies) >= self.min_samples:
+                entry["timeout_s"] = round(self.timeout(host, None), 2)
+            report[host] = entry
+        return report
+
+_scheduler = HostScheduler()
+
+def configure_hosts(**settings):
+    """Replace the per-host scheduler (HostScheduler keyword arguments)"""
+    global _scheduler
+    _scheduler = HostScheduler(**settings)
+
+def get_scheduler():
+    return _scheduler
+
+def retry_after(headers, default=5.0, cap=60.0):
+    """Seconds from a Retry-After header (delta form); default when absent or an HTTP date"""
+    value = headers.get("Retry-After", "")
+    return min(cap, float(value)) if value.strip().isdigit() else default
+
+class FetchError(Exception):
+    """A page was refused before or while downloading it"""
+
+class ContentTypeRejected(FetchError):
+    pass
+
+class BodyTooLarge(FetchError):
+    pass
+
+class DeadlineExceeded(FetchError):
+    pass
+
+class TooManyRedirects(FetchError):
+    pass
+
+class HostBusy(FetchError):
+    """The host's concurrency or rate limit did not free up within the deadline"""
+
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+_fetch_stats = {"fetched": 0, "bytes": 0, "rejected_content_type": 0, "too_large": 0, "deadline": 0, "redirects": 0,
+                "host_busy": 0, "diverted": 0}
+_fetch_stats_lock = threading.Lock()
+
+def count_fetch(**increments):
+    with _fetch_stats_lock:
+        for name, amount in increments.items():
+            _fetch_stats[name] += amount
+
+def check_html_headers(url, headers, max_bytes, content_types=HTML_CONTENT_TYPES):
+    """Reject a response from its headers alone: wrong Content-Type or a declared body over max_bytes"""
+    content_type = headers.get("Content-Type", "").split(";")[0].strip().lower()
+    if content_type and content_type not in content_types:
+        count_fetch(rejected_content_type=1)
+        raise ContentTypeRejected(f"{url}: not HTML ({content_type})")
+
+    length = headers.get("Content-Length", "")
+    if length.isdigit() and int(length) > max_bytes:
+        count_fetch(too_large=1)
+        raise BodyTooLarge(f"{url}: Content-Length {length} exceeds {max_bytes} bytes")
+
+def redirect_target(url, status_code, headers):
+    """Absolute redirect target, or None if the response is not a redirect"""
+    if status_code in REDIRECT_STATUSES and headers.get("Location"):
+        return urljoin(url, headers["Location"])
+    return None
+
+class FetchedPage:
+    """A fully read (and size-capped) response, or the head of one that was diverted"""
+
+    def __init__(self, url, status_code, headers, content, elapsed, alternate=None):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content  # Only the head when `alternate` is set
+        self.elapsed = elapsed
+        self.alternate = alternate  # URL the head sniffer diverted to; the body was not downloaded
+
+SNIFF_BYTES = 32 * 1024
+
+def sniff_due(body, chunk_size, limit=SNIFF_BYTES):
+    """True once the head is complete (</head> seen in the latest chunk) or `limit` bytes are in"""
+    return len(body) >= limit or body.find(b"</head", max(0, len(body) - chunk_size - 6)) != -1
+
+BODY_CHUNK_BYTES = 16 * 1024
+
+def read_body(response, url, expires, deadline):
+    """Body chunks as they arrive. Each socket read is given only the time left before
+    `expires`, and returns whatever has arrived, so a server dripping bytes cannot
+    stretch the download past the deadline."""
+    raw = response.raw
+    sock = getattr(getattr(raw, "connection", None), "sock", None)
+    if not hasattr(raw, "read1") or sock is None:
+        # urllib3 < 2.3: no partial reads, the deadline is checked between chunks only
+        yield from response.iter_content(chunk_size=BODY_CHUNK_BYTES)
+        return
+
+    while True:
+        remaining = expires - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"{url}: body not read within {deadline:.1f}s")
+        sock.settimeout(remaining)
+        try:
+            chunk = raw.read1(BODY_CHUNK_BYTES, decode_content=True)
+        except ReadTimeoutError:
+            raise DeadlineExceeded(f"{url}: body not read within {deadline:.1f}s") from None
+        except ProtocolError as e:
+            raise requests.exceptions.ChunkedEncodingError(e) from e
+        except DecodeError as e:
+            raise requests.exceptions.ContentDecodingError(e) from e
+        if not chunk:
+            return
+        yield chunk
+
+def fetch_html(url, headers=None, max_bytes=5_000_000, deadline=10.0, connect_timeout=3.05, max_redirects=5,
+               content_types=HTML_CONTENT_TYPES, head_sniffer=None):
+    """Stream an HTML page: headers are checked before the body is read, the body
+    stops at max_bytes, and one deadline bounds the whole redirect chain. The
+    deadline is `deadline` for an unknown host and adapts to the host's observed
+    latency after that; requests wait for the host's concurrency slot and pacing.
+
+    head_sniffer(head_bytes, url) is called once the <head> has arrived; if it
+    returns a URL the download stops there and the FetchedPage carries it as
+    `alternate` (used to switch to a lighter AMP/print variant).
+
+    Returns a FetchedPage (a 304 comes back with an empty body); raises a
+    FetchError subclass when the page is refused and requests.HTTPError for 4xx/5xx.
+    """
+    session = get_session()
+    scheduler = get_scheduler()
+    deadline = scheduler.timeout(urlparse(url).netloc, deadline)
+    start = time.monotonic()
+    expires = start + deadline
+
+    try:
+        for _ in range(max_redirects + 1):
+            host = urlparse(url).netloc
+            with scheduler.slot(host, expires - time.monotonic()):
+                page = fetch_hop(session, scheduler, host, url, headers, start, expires, deadline, connect_timeout,
+                                 max_bytes, content_types, head_sniffer)
+            if isinstance(page, FetchedPage):
+                return page
+            url = page
+    except HostBusy:
+        count_fetch(host_busy=1)
+        raise
+
+    raise TooManyRedirects(f"{url}: more than {max_redirects} redirects")
+
+def fetch_hop(session, scheduler, host, url, headers, start, expires, deadline, connect_timeout, max_bytes,
+              content_types, head_sniffer=None):
+    """One request of the redirect chain: the FetchedPage, or the URL to follow next"""
+    remaining = expires - time.monotonic()
+    if remaining <= 0:
+        count_fetch(deadline=1)
+        raise DeadlineExceeded(f"{url}: no response within {deadline:.1f}s")
+
+    sent = time.monotonic()
+    response = session.get(url, headers=headers, stream=True, allow_redirects=False,
+                           timeout=(min(connect_timeout, remaining), remaining))
+    try:
+        target = redirect_target(response.url, response.status_code, response.headers)
+        if target:
+            count_fetch(redirects=1)
+            return target
+
+        if response.status_code == 304:
+            scheduler.observe(host, time.monotonic() - sent)
+            return FetchedPage(response.url, 304, response.headers, b"", time.monotonic() - start)
+        if response.status_code in (429, 503):
+            scheduler.back_off(host, retry_after(response.headers))
+        response.raise_for_status()
+        check_html_headers(response.url, response.headers, max_bytes, content_types)
+
+        body = bytearray()
+        sniffing = head_sniffer is not None
+        for chunk in read_body(response, url, expires, deadline):
+            body += chunk
+            if sniffing and sniff_due(body, len(chunk)):
+                sniffing = False
+                alternate = head_sniffer(bytes(body), response.url)
+                if alternate:
+                    count_fetch(diverted=1, bytes=len(body))
+                    return FetchedPage(response.url, response.status_code, response.headers, bytes(body),
+                                       time.monotonic() - start, alternate=alternate)
+            if len(body) > max_bytes:
+                count_fetch(too_large=1)
+                raise BodyTooLarge(f"{url}: body exceeds {max_bytes} bytes")
+            if time.monotonic() > expires:
+                raise DeadlineExceeded(f"{url}: body not read within {deadline:.1f}s")
+
+        scheduler.observe(host, time.monotonic() - sent)
+        count_fetch(fetched=1, bytes=len(body))
+        return FetchedPage(response.url, response.status_code, response.headers, bytes(body), time.monotonic() - start)
+    except DeadlineExceeded:
+        count_fetch(deadline=1)
+        raise
+    finally:
+        response.close()
+
+def read_timed_out(exc):
+    """True for a read timeout wrapped in another exception; requests' iter_content reports a
+    body read that timed out as ConnectionError(ReadTimeoutError)"""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if isinstance(exc, (ReadTimeoutError, TimeoutError)):
+            return True
+        wrapped = exc.args[0] if exc.args and isinstance(exc.args[0], BaseException) else None
+        exc = wrapped or exc.__cause__ or exc.__context__
+    return False
+
+def error_kind(exc):
+    """Classify a fetch failure for negative caching; None for failures that say nothing about the URL"""
+    status = getattr(getattr(exc, "response", None), "status_code", None)
+    if isinstance(status, int) and status >= 400:
+        if status in (404, 410):
+            return "not_found"
+        if status in (401, 403):
+            return "forbidden"
+        if status == 429:
+            return "rate_limited"
+        return "server_error" if status >= 500 else "client_error"
+    if isinstance(exc, HostBusy):
+        return None  # Our own pacing, not the host's fault
+    if isinstance(exc, (requests.Timeout, DeadlineExceeded, TimeoutError)):
+        return "timeout"
+    if isinstance(exc, requests.ConnectionError):
+        # Only a failure to connect says the host is down; a stalled body is a slow page
+        return "timeout" if read_timed_out(exc) else "unreachable"
+    if isinstance(exc, ContentTypeRejected):
+        return "not_html"
+    if isinstance(exc, BodyTooLarge):
+        return "too_large"
+    if isinstance(exc, TooManyRedirects):
+        return "redirect_loop"
+    return "error"
+
+def fetch_metrics():
+    with _fetch_stats_lock:
+        return dict(_fetch_stats)
+
+def pool_metrics():
+    return {
+        "config": dict(_pool_config),
+        "hosts": get_adapter().metrics()
+    }
@@ -0,0 +1,222 @@
+"""
+Durable background job queue for document generation.
+
+Jobs are rows in a SQLite database, so they survive web worker restarts: a job
+that was running when its worker died is picked up again once its lease
+expires. Workers are plain threads claiming jobs with BEGIN IMMEDIATE, which
+also makes it safe for several gunicorn processes (or a dedicated
+`python jobs.py` process) to share one queue file.
+"""
+import contextlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    available_at REAL NOT NULL,
+    lease_expires REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, available_at);
+"""
+
+class JobQueue:
+    """SQLite-backed queue with a local worker pool and retry accounting"""
+
+    def __init__(self, db_path, handler, concurrency=2, max_attempts=3, lease_seconds=900, poll_interval=0.5):
+        self.db_path = db_path
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._workers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @contextlib.contextmanager
+    def _connection(self):
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def submit(self, payload):
+        """Queue a job and return its id (a single INSERT, so it returns in milliseconds)"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, payload, max_attempts, created_at, updated_at, available_at) "
+                "VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, json.dumps(payload), self.max_attempts, now, now, now)
+            )
+        return job_id
+
+    def get(self, job_id):
+        """Job status as a dict, or None if the id is unknown"""
+        with self._connection() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        job = {
+            "id": row["id"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "max_attempts": row["max_attempts"],
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"]
+        }
+        if row["result"] is not None:
+            job["result"] = json.loads(row["result"])
+        return job
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        with self._lock:
+            if self._workers or self.concurrency <= 0:
+                return
+            for i in range(self.concurrency):
+                worker = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+        print(f"INFO: Job queue started with {self.concurrency} workers ({self.db_path})")
+
+    def stop(self):
+        self._stop.set()
+
+    def _claim(self):
+        """Atomically claim the next queued job, or a running job whose worker lost its lease"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # A job whose worker keeps dying (OOM, segfault) never reaches _fail; stop reclaiming it
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'lease expired on the last attempt (worker died or hung)', "
+                "finished_at = ?, updated_at = ?, lease_expires = NULL "
+                "WHERE status = 'running' AND lease_expires < ? AND attempts >= max_attempts",
+                (now, now, now)
+            )
+            row = conn.execute(
+                "SELECT id, payload, attempts FROM jobs "
+                "WHERE (status = 'queued' AND available_at <= ?) OR (status = 'running' AND lease_expires < ?) "
+                "ORDER BY created_at LIMIT 1",
+                (now, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, updated_at = ?, "
+                "lease_expires = ? WHERE id = ?",
+                (now, now, now + self.lease_seconds, row["id"])
+            )
+            conn.execute("COMMIT")
+            return row["id"], json.loads(row["payload"]), row["attempts"] + 1
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    # Each claim bumps `attempts`, so (id, attempts, running) identifies the current lease holder:
+    # a slow worker whose job was reclaimed cannot overwrite the newer attempt's outcome.
+    OWNED = "id = ? AND attempts = ? AND status = 'running'"
+
+    def _finish(self, job_id, attempts, result):
+        """Store the result; False if this worker no longer holds the job's lease"""
+        now = time.time()
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'succeeded', result = ?, error = NULL, finished_at = ?, updated_at = ?, "
+                f"lease_expires = NULL WHERE {self.OWNED}",
+                (json.dumps(result), now, now, job_id, attempts)
+            )
+        return cursor.rowcount == 1
+
+    def _fail(self, job_id, attempts, error):
+        """Requeue with exponential backoff, or mark failed once attempts are exhausted;
+        False if this worker no longer holds the job's lease"""
+        now = time.time()
+        with self._connection() as conn:
+            if attempts < self.max_attempts:
+                cursor = conn.execute(
+                    "UPDATE jobs SET status = 'queued', error = ?, updated_at = ?, available_at = ?, "
+                    f"lease_expires = NULL WHERE {self.OWNED}",
+                    (error, now, now + min(2 ** attempts, 60), job_id, attempts)
+                )
+            else:
+                cursor = conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, updated_at = ?, "
+                    f"lease_expires = NULL WHERE {self.OWNED}",
+                    (error, now, now, job_id, attempts)
+                )
+        return cursor.rowcount == 1
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                claimed = self._claim()
+            except sqlite3.Error as e:
+                print(f"DEBUG: Job claim failed: {e}")
+                claimed = None
+
+            if claimed is None:
+                self._stop.wait(self.poll_interval)
+                continue
+
+            job_id, payload, attempts = claimed
+            print(f"DEBUG: Job {job_id} started (attempt {attempts}/{self.max_attempts})")
+            try:
+                finished = self._finish(job_id, attempts, self.handler(payload))
+            except Exception as e:
+                print(f"DEBUG: Job {job_id} attempt {attempts} failed: {e}")
+                if not self._fail(job_id, attempts, str(e)):
+                    print(f"DEBUG: Job {job_id} attempt {attempts} lost its lease, failure discarded")
+                continue
+            if finished:
+                print(f"DEBUG: Job {job_id} succeeded")
+            else:
+                print(f"DEBUG: Job {job_id} attempt {attempts} lost its lease, result discarded")
+
+if __name__ == "__main__":
+    # Dedicated worker process: `python jobs.py` (set JOB_WORKERS=0 on the web workers)
+    from config import get_config
+    from server import run_job
+
+    cfg = get_config()
+    queue = JobQueue(cfg.JOB_DB_PATH, run_job, concurrency=max(cfg.JOB_WORKERS, 1),
+                     max_attempts=cfg.JOB_MAX_ATTEMPTS, lease_seconds=cfg.JOB_LEASE_SECONDS)
+    queue.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        queue.stop()
@@ -0,0 +1,203 @@
+"""
+Process pool for CPU-bound article parsing.
+
+BeautifulSoup parsing and the structured-content walk hold the GIL for the
+whole page, so one large page stalls every other request in a threaded Flask
+worker or in the async pipeline's event loop threads. ParsePool runs
+server.extract_article_html in spawned worker processes instead, and the
+request thread only waits on a future. Each page gets a CPU-time budget
+(RLIMIT_CPU, re-armed per task), each worker an address-space cap
+(RLIMIT_AS), and workers are replaced after a fixed number of pages so that
+fragmented or leaked memory is handed back to the OS (one by one on Python
+3.11+, the whole pool at once before that). Only the compact article
+dict and a few counters travel back to the parent.
+"""
+import contextlib
+import io
+import math
+import multiprocessing
+import signal
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits, pages are still bounded by the wall-clock timeout
+    resource = None
+
+# ProcessPoolExecutor(max_tasks_per_child=...) only exists from Python 3.11
+PER_WORKER_RECYCLING = sys.version_info >= (3, 11)
+
+class ParseLimitExceeded(Exception):
+    """The page ran out of CPU time, memory or wall-clock time, or took its worker down"""
+
+class ParsePoolUnavailable(Exception):
+    """No worker process could be used; the caller should parse in its own thread"""
+
+class _CpuTimeUp(BaseException):
+    # BaseException so the per-strategy `except Exception` in extract_article_html cannot swallow it
+    pass
+
+_cpu_seconds = 0
+_armed = False
+
+def _on_sigxcpu(signum, frame):
+    if _armed:
+        raise _CpuTimeUp()
+
+def _cpu_used():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def _set_cpu_soft_limit(seconds):
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if hard != resource.RLIM_INFINITY and (seconds == resource.RLIM_INFINITY or seconds > hard):
+        seconds = hard
+    resource.setrlimit(resource.RLIMIT_CPU, (seconds, hard))
+
+def _init_worker(cpu_seconds, memory_bytes):
+    """Worker initializer: install the limits, then load the extraction code before the first page arrives"""
+    global _cpu_seconds
+    if resource is not None:
+        if memory_bytes:
+            _, hard = resource.getrlimit(resource.RLIMIT_AS)
+            if hard != resource.RLIM_INFINITY:
+                memory_bytes = min(memory_bytes, hard)
+            resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, hard))
+        if cpu_seconds:
+            _cpu_seconds = cpu_seconds
+            signal.signal(signal.SIGXCPU, _on_sigxcpu)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import server  # noqa: F401  (startup banner is the parent's business)
+
+def _extract(url, content, content_type):
+    """Task body: (article_data, counter increments) for one page"""
+    global _armed
+    import server
+
+    before = server.extraction_counters()
+    if _cpu_seconds:
+        # RLIMIT_CPU counts the whole process lifetime, so the budget is set relative to what is used so far
+        _set_cpu_soft_limit(math.ceil(_cpu_used()) + _cpu_seconds)
+        _armed = True
+    try:
+        article_data = server.extract_article_html(url, content, content_type)
+    except _CpuTimeUp:
+        raise ParseLimitExceeded(f"CPU time limit ({_cpu_seconds}s) exceeded") from None
+    except MemoryError:
+        raise ParseLimitExceeded("memory limit exceeded") from None
+    finally:
+        _armed = False
+        if _cpu_seconds:
+            _set_cpu_soft_limit(resource.RLIM_INFINITY)
+
+    after = server.extraction_counters()
+    increments = {
+        group: {name: value - before[group].get(name, 0) for name, value in counters.items()}
+        for group, counters in after.items()
+    }
+    return article_data, increments
+
+class ParsePool:
+    """Bounded pool of spawned parse workers with per-page limits and worker recycling"""
+
+    def __init__(self, workers=2, cpu_seconds=10, memory_mb=2048, tasks_per_child=200, timeout=30.0):
+        self.workers = workers
+        self.cpu_seconds = cpu_seconds if resource is not None else 0
+        self.memory_bytes = memory_mb * 1024 * 1024 if resource is not None else 0
+        self.tasks_per_child = tasks_per_child
+        self.timeout = timeout
+        self._executor = None
+        self._served = 0  # pages returned by the current executor
+        self._proven = False  # some executor has returned a page, so workers can start here
+        self.disabled = False  # workers could not start; everything parses in-thread from then on
+        self._lock = threading.Lock()
+        self._stats = {"pages": 0, "limit_exceeded": 0, "timeouts": 0, "worker_crashes": 0, "fallbacks": 0}
+
+    def _pool(self):
+        # Created on first use, so importing the app (or forking gunicorn workers) starts no processes
+        with self._lock:
+            if self._executor is None:
+                recycling = {"max_tasks_per_child": self.tasks_per_child or None} if PER_WORKER_RECYCLING else {}
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.cpu_seconds, self.memory_bytes),
+                    **recycling
+                )
+                self._served = 0
+            return self._executor
+
+    def _discard(self, executor, cancel=True):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=cancel)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def extract(self, url, content, content_type=None):
+        """(article_data, counter increments) from a worker. Raises ParseLimitExceeded when this page
+        hit a limit, ParsePoolUnavailable when the pool itself cannot be used."""
+        if self.disabled:
+            self._count("fallbacks")
+            raise ParsePoolUnavailable("parse workers failed to start")
+        try:
+            executor = self._pool()
+            future = executor.submit(_extract, url, content, content_type)
+        except (OSError, RuntimeError, TypeError) as e:
+            # TypeError: an executor option this Python doesn't know; parsing in-thread beats failing every URL
+            self._count("fallbacks")
+            raise ParsePoolUnavailable(str(e)) from e
+
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # The worker keeps its CPU budget and gives up on its own; its late result is dropped
+            future.cancel()
+            self._count("timeouts")
+            raise ParseLimitExceeded(f"not parsed within {self.timeout:.0f}s") from None
+        except ParseLimitExceeded:
+            self._count("limit_exceeded")
+            raise
+        except BrokenProcessPool as e:
+            self._discard(executor)
+            if not self._proven:
+                # No worker has ever returned a page: they cannot start here (failed import, rlimits too tight)
+                self.disabled = True
+                self._count("fallbacks")
+                raise ParsePoolUnavailable(f"parse workers failed to start: {e}") from e
+            # A worker died on this page (OOM killer, crash in C code)
+            self._count("worker_crashes")
+            raise ParseLimitExceeded(f"parse worker died: {e}") from e
+
+        with self._lock:
+            self._proven = True
+            self._stats["pages"] += 1
+            if executor is self._executor:
+                self._served += 1
+            # Without max_tasks_per_child the whole pool is replaced after the same number of pages per worker;
+            # pages already queued on it still finish
+            recycle = not PER_WORKER_RECYCLING and self.tasks_per_child and \
+                self._served >= self.tasks_per_child * self.workers
+        if recycle:
+            self._discard(executor, cancel=False)
+        return result
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, workers=self.workers, running=self._executor is not None, disabled=self.disabled,
+                        cpu_seconds=self.cpu_seconds, memory_mb=self.memory_bytes // (1024 * 1024),
+                        tasks_per_child=self.tasks_per_child)
@@ -1,13 +1,28 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
 import openai
 import google.generativeai as genai
 import os
-import requests
+import contextlib
+import html
 import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from openai import OpenAIError
 from config import get_config
+import http_client
+from jobs import JobQueue
+from cache import TTLCache, DiskCache, TieredCache, SingleFlight, NegativeCache, cache_key, is_cache_key
+from theme_classifier import classify_theme
+from compaction import compact_text
+from strategy_memory import StrategyMemory
+from canonical import Canonicalizer, clean_url, url_identity, find_canonical_link, find_light_variant
+from charset import decode_html, resolve_encoding, ascii_compatible
+from parse_pool import ParsePool, ParseLimitExceeded, ParsePoolUnavailable
 from newspaper import Article
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, CData, NavigableString, Tag
+from bs4.builder import builder_registry
 from urllib.parse import urljoin, urlparse
 
 app = Flask(__name__)
@@ -32,6 +47,20 @@ MAX_RETRIES = config.MAX_RETRIES
 MAX_TOKENS_CONFIG = config.MAX_TOKENS
 BRAVE_API_KEY = config.BRAVE_API_KEY
 
+# Shared keep-alive connection pools for all outbound HTTP
+http_client.configure(pool_connections=config.HTTP_POOL_CONNECTIONS, pool_maxsize=config.HTTP_POOL_MAXSIZE,
+                      pool_block=config.HTTP_POOL_BLOCK)
+http_client.configure_hosts(
+    max_concurrency=config.HOST_MAX_CONCURRENCY,
+    rate=config.HOST_RATE,
+    burst=config.HOST_BURST,
+    percentile=config.HOST_TIMEOUT_PERCENTILE,
+    factor=config.HOST_TIMEOUT_FACTOR,
+    min_timeout=config.HOST_TIMEOUT_MIN,
+    max_timeout=config.HOST_TIMEOUT_MAX,
+    max_hosts=config.HOST_MAX_TRACKED
+)
+
 # Log configuration on startup
 print(f"INFO: RENDER env var = {os.getenv('RENDER', 'NOT_SET')}")
 print(f"INFO: ENVIRONMENT env var = {os.getenv('ENVIRONMENT', 'NOT_SET')}")
@@ -39,260 +68,845 @@ print(f"INFO: Running in {config.ENVIRONMENT} mode")
 print(f"INFO: API timeout set to {API_TIMEOUT}s, max retries: {MAX_RETRIES}")
 print(f"INFO: Token limits - Concise: {MAX_TOKENS_CONFIG['Concise']}, Detailed: {MAX_TOKENS_CONFIG['Detailed']}, Comprehensive: {MAX_TOKENS_CONFIG['Comprehensive']}")
 
+BRAVE_SEARCH_URL = "https://api.search.brave.com/res/v1/web/search"
+
+def brave_search_request(query, num_results):
+    """Build the headers and params for a Brave Search API call"""
+    headers = {
+        "Accept": "application/json",
+        "Accept-Encoding": "gzip",
+        "X-Subscription-Token": BRAVE_API_KEY
+    }
+
+    params = {
+        "q": query,
+        "count": num_results,
+        "country": "US",
+        "search_lang": "en",
+        "ui_lang": "en-US"
+    }
+    return headers, params
+
+def parse_brave_results(payload, num_results):
+    """Reduce a Brave Search API response to title/snippet/url dicts"""
+    results = payload.get('web', {}).get('results', [])
+    return [{'title': r.get('title', ''), 'snippet': r.get('description', ''), 'url': r.get('url', '')}
+           for r in results[:num_results]]
+
+search_cache = TTLCache(maxsize=config.SEARCH_CACHE_SIZE, ttl=config.SEARCH_CACHE_TTL)
+search_flight = SingleFlight()
+
+def search_cache_key(query, num_results):
+    """Fold case, whitespace and token order so equivalent queries share one entry"""
+    return f"{num_results}:{' '.join(sorted(query.lower().split()))}"
+
+def fetch_brave_results(query, num_results):
+    """One upstream Brave Search call; raises on failure so errors are never cached"""
+    headers, params = brave_search_request(query, num_results)
+    response = http_client.get(BRAVE_SEARCH_URL, headers=headers, params=params, timeout=5)
+    if response.status_code != 200:
+        raise RuntimeError(f"Brave search returned HTTP {response.status_code}")
+    return parse_brave_results(response.json(), num_results)
+
 def web_search(query, num_results=3):
-    """Search the web using Brave Search API"""
+    """Search the web using Brave Search API (cached, concurrent identical queries share one call)"""
     if not BRAVE_API_KEY:
         return []
-    
+
+    key = search_cache_key(query, num_results)
+    results = search_cache.get(key)
+    if results is not None:
+        print(f"DEBUG: Search cache hit for '{query}'")
+        return results
+
     try:
-        headers = {
-            "Accept": "application/json",
-            "Accept-Encoding": "gzip",
-            "X-Subscription-Token": BRAVE_API_KEY
-        }
-        
-        params = {
-            "q": query,
-            "count": num_results,
-            "country": "US",
-            "search_lang": "en",
-            "ui_lang": "en-US"
-        }
-        
-        response = requests.get("https://api.search.brave.com/res/v1/web/search", 
-                              headers=headers, params=params, timeout=5)
-        
-        if response.status_code == 200:
-            results = response.json().get('web', {}).get('results', [])
-            return [{'title': r.get('title', ''), 'snippet': r.get('description', ''), 'url': r.get('url', '')}
-                   for r in results[:num_results]]
+        results = search_flight.do(key, lambda: fetch_brave_results(query, num_results))
     except Exception as e:
         print(f"Web search error: {e}")
-    
-    return []
+        return []
 
-def extract_structured_content(element):
-    """Extract content while preserving important structure like tables, lists, headings"""
-    content_parts = []
-
-    # Process direct children and their descendants more carefully
-    def process_element(elem, processed_ids):
-        if id(elem) in processed_ids:
-            return []
-
-        parts = []
-        processed_ids.add(id(elem))
-
-        if elem.name == 'table':
-            table_text = "\n[TABLE]\n"
-            rows = elem.find_all('tr')
-            for row in rows:
-                cells = row.find_all(['th', 'td'])
-                row_text = ' | '.join([cell.get_text(strip=True) for cell in cells if cell.get_text(strip=True)])
-                if row_text.strip():
-                    table_text += row_text + "\n"
-            table_text += "[/TABLE]\n"
-            parts.append(table_text)
-
-        elif elem.name in ['ol', 'ul']:
-            list_items = elem.find_all('li')
-            if list_items:
-                list_text = "\n[LIST]\n"
-                for i, item in enumerate(list_items):
-                    item_text = item.get_text(strip=True)
-                    if item_text:
-                        prefix = f"{i+1}. " if elem.name == 'ol' else "• "
-                        list_text += f"{prefix}{item_text}\n"
-                list_text += "[/LIST]\n"
-                parts.append(list_text)
-
-        elif elem.name in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-            heading_text = elem.get_text(strip=True)
+    search_cache.set(key, results)
+    return results
+
+STRUCTURED_TAGS = ('table', 'ol', 'ul')
+HEADING_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+TEXT_BLOCK_TAGS = ('p', 'div')
+TEXT_STRING_TYPES = (NavigableString, CData)  # what get_text() counts (no comments/doctype)
+
+def table_block(elem):
+    table_text = "\n[TABLE]\n"
+    for row in elem.find_all('tr'):
+        cells = [cell.get_text(strip=True) for cell in row.find_all(['th', 'td'])]
+        row_text = ' | '.join([cell for cell in cells if cell])
+        if row_text.strip():
+            table_text += row_text + "\n"
+    table_text += "[/TABLE]\n"
+    return table_text
+
+def items_block(items, ordered=False):
+    """[LIST] block; numbering counts empty items, which are skipped"""
+    list_text = "\n[LIST]\n"
+    for i, item_text in enumerate(items):
+        if item_text:
+            prefix = f"{i+1}. " if ordered else "• "
+            list_text += f"{prefix}{item_text}\n"
+    list_text += "[/LIST]\n"
+    return list_text
+
+def heading_block(text):
+    return f"\n[HEADING] {text} [/HEADING]\n"
+
+def list_block(elem):
+    list_items = elem.find_all('li')
+    if not list_items:
+        return None
+    return items_block([item.get_text(strip=True) for item in list_items], ordered=elem.name == 'ol')
+
+class TextBlock:
+    """Text owned by one <p>/<div>: its own strings plus any short child blocks folded in"""
+    __slots__ = ('parent', 'pieces', 'structured', 'text', 'emitted')
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.pieces = []
+        self.structured = False  # contains a table/list, so (like before) the text is not emitted
+        self.text = ""
+        self.emitted = False
+
+def extract_structured_blocks(element):
+    """Single pass over the DOM producing [TABLE]/[LIST]/[HEADING] and text blocks in document order.
+
+    Every string belongs to its nearest <p>/<div>, so text is materialized once
+    instead of once per enclosing div. A block shorter than 16 characters is
+    folded into its parent's text rather than emitted on its own; tables and
+    lists are emitted whole and not descended into.
+    """
+    blocks = []
+    text_blocks = []
+    stack = [(child, None) for child in reversed(element.contents)]
+
+    while stack:
+        node, owner = stack.pop()
+
+        if not isinstance(node, Tag):
+            if type(node) in TEXT_STRING_TYPES and owner is not None:
+                text = node.strip()
+                if text:
+                    owner.pieces.append(text)
+            continue
+
+        name = node.name
+        if node.parent is not None and node.parent.name in STRUCTURED_TAGS:
+            # Part of structured content: only walked when the root itself is a table/list
+            name = None
+
+        if name in STRUCTURED_TAGS:
+            block = table_block(node) if name == 'table' else list_block(node)
+            if block:
+                blocks.append(block)
+            # Enclosing text blocks hold structure now and are not emitted (same as before)
+            while owner is not None and not owner.structured:
+                owner.structured = True
+                owner = owner.parent
+            continue
+
+        if name in HEADING_TAGS:
+            heading_text = node.get_text(strip=True)
             if heading_text:
-                parts.append(f"\n[HEADING] {heading_text} [/HEADING]\n")
+                blocks.append(heading_block(heading_text))
+            continue
+
+        if name in TEXT_BLOCK_TAGS:
+            block = TextBlock(owner)
+            if owner is not None:
+                owner.pieces.append(block)
+            blocks.append(block)
+            text_blocks.append(block)
+            owner = block
+
+        stack.extend((child, owner) for child in reversed(node.contents))
+
+    # Children were created after their parents, so resolving in reverse sees children first
+    for block in reversed(text_blocks):
+        if block.structured:
+            continue
+        block.text = ''.join(
+            piece if isinstance(piece, str) else ('' if piece.emitted else piece.text)
+            for piece in block.pieces
+        )
+        block.emitted = len(block.text) > 15
 
-        elif elem.name in ['p', 'div']:
-            text_content = elem.get_text(strip=True)
-            if text_content and len(text_content) > 15:
-                # Only add if it doesn't contain nested structured elements we've already processed
-                has_nested_structure = elem.find_all(['table', 'ol', 'ul'])
-                if not has_nested_structure:
-                    parts.append(text_content + "\n")
+    return [
+        block if isinstance(block, str) else block.text + "\n"
+        for block in blocks
+        if isinstance(block, str) or block.emitted
+    ]
 
-        return parts
+def extract_structured_content(element):
+    """Extract content while preserving important structure like tables, lists, headings"""
+    return '\n'.join(extract_structured_blocks(element))
 
-    # Process all elements
-    seen_ids = set()
-    all_elements = element.find_all(['table', 'ol', 'ul', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'div'])
+ARTICLE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
 
-    for elem in all_elements:
-        if elem.parent and elem.parent.name in ['table', 'ol', 'ul']:
-            continue  # Skip elements that are part of structured content
+# Parser backend for article extraction: "html.parser" (default), "lxml" (C, opt-in) or "html5lib"
+HTML_PARSER = config.HTML_PARSER
+if builder_registry.lookup(HTML_PARSER) is None:
+    print(f"INFO: HTML parser '{HTML_PARSER}' not available, using html.parser")
+    HTML_PARSER = "html.parser"
+
+# <script>/<style> blocks end at the first matching close tag, exactly as an HTML parser sees them.
+# Only tag boundaries are searched for (no lazy match over the block body), which is much cheaper
+# than the parse it saves.
+SCRIPT_STYLE_OPEN_RE = re.compile(r"<(script|style)[\s/>]", re.IGNORECASE)
+SCRIPT_STYLE_CLOSE_RE = {tag: re.compile(f"</{tag}", re.IGNORECASE) for tag in ("script", "style")}
+SCRIPT_STYLE_OPEN_BYTES_RE = re.compile(rb"<(script|style)[\s/>]", re.IGNORECASE)
+SCRIPT_STYLE_CLOSE_BYTES_RE = {tag.encode(): re.compile(f"</{tag}".encode(), re.IGNORECASE) for tag in ("script", "style")}
+
+def strip_script_style(content):
+    """Drop script/style blocks before parsing so the parser never builds nodes for them"""
+    if not config.HTML_PRESTRIP:
+        return content
+    if isinstance(content, bytes):
+        opening, closing, gt = SCRIPT_STYLE_OPEN_BYTES_RE, SCRIPT_STYLE_CLOSE_BYTES_RE, b">"
+    else:
+        opening, closing, gt = SCRIPT_STYLE_OPEN_RE, SCRIPT_STYLE_CLOSE_RE, ">"
+
+    parts = []
+    pos = 0
+    while True:
+        match = opening.search(content, pos)
+        if match is None:
+            break
+        end = closing[match.group(1).lower()].search(content, match.end())
+        close = content.find(gt, end.end()) if end else -1
+        if close == -1:
+            break  # Unclosed block: leave it (and the rest of the page) to the parser
+        parts.append(content[pos:match.start()])
+        pos = close + 1
+    if not parts:
+        return content
+    parts.append(content[pos:])
+    return content[:0].join(parts)
+
+def make_soup(content, parser=None, from_encoding=None):
+    """BeautifulSoup tree from the configured parser backend (bytes with from_encoding skip charset sniffing)"""
+    if isinstance(content, str):
+        from_encoding = None
+    return BeautifulSoup(strip_script_style(content), parser or HTML_PARSER, from_encoding=from_encoding)
+
+def prepare_soup(content, parser=None, from_encoding=None):
+    """Parse a page once and drop the elements no extraction method uses"""
+    soup = make_soup(content, parser, from_encoding)
+
+    # Remove script and style elements
+    for script in soup(["script", "style", "nav", "footer", "header", "aside"]):
+        script.decompose()
+    return soup
+
+JSON_LD_RE = re.compile(
+    rb"<script\b[^>]*type\s*=\s*[\"']?application/ld\+json[\"']?[^>]*>(.*?)</script\s*>",
+    re.IGNORECASE | re.DOTALL
+)
+JSON_LD_TEXT_RE = re.compile(JSON_LD_RE.pattern.decode("ascii"), JSON_LD_RE.flags)
+TAG_RE = re.compile(r"<[^>]+>")
+DURATION_RE = re.compile(r"^P(?:(\d+)D)?T?(?:(\d+)H)?(?:(\d+)M)?(?:[\d.]+S)?$")
+ARTICLE_TYPES = {"Article", "NewsArticle", "BlogPosting", "ReportageNewsArticle", "AnalysisNewsArticle", "TechArticle"}
+
+def json_ld_objects(content, encoding=None):
+    """Every JSON-LD object on the page (top-level lists and @graph flattened); unparseable blocks are skipped.
+    Byte content is decoded block by block, with the page encoding when known."""
+    pattern = JSON_LD_TEXT_RE if isinstance(content, str) else JSON_LD_RE
+    pending = []
+    for match in pattern.finditer(content):
+        block = match.group(1)
+        if isinstance(block, bytes):
+            block = block.decode(encoding or "utf-8", errors="replace")
+        try:
+            pending.append(json.loads(block, strict=False))
+        except ValueError:
+            continue
+
+    objects = []
+    while pending:
+        item = pending.pop(0)
+        if isinstance(item, list):
+            pending.extend(item)
+        elif isinstance(item, dict):
+            objects.append(item)
+            pending.extend(ld_list(item.get("@graph")))
+    return objects
+
+def ld_list(value):
+    """A property that schema.org allows to hold one value or several, as a list ([] when absent)"""
+    if value is None or value == "":
+        return []
+    return value if isinstance(value, list) else [value]
+
+def json_ld_types(obj):
+    return {t for t in ld_list(obj.get("@type")) if isinstance(t, str)}
+
+def ld_text(value):
+    """Plain text from a JSON-LD string value (entities decoded, inline tags removed)"""
+    if isinstance(value, list):
+        value = " ".join(str(v) for v in value if isinstance(v, (str, int, float)))
+    if not isinstance(value, (str, int, float)):
+        return ""
+    return " ".join(html.unescape(TAG_RE.sub(" ", str(value))).split())
+
+def ld_names(value):
+    """Author/publisher names from a string, a Person/Organization object, or a list of either"""
+    values = value if isinstance(value, list) else [value]
+    names = [ld_text(v.get("name")) if isinstance(v, dict) else ld_text(v) for v in values]
+    return [name for name in names if name]
+
+def ld_duration(value):
+    """ISO 8601 duration (PT1H30M) as '1 hr 30 min'; other strings unchanged"""
+    text = ld_text(value)
+    match = DURATION_RE.match(text)
+    if not match or not any(match.groups()):
+        return text
+    days, hours, minutes = (int(g) if g else 0 for g in match.groups())
+    hours += days * 24
+    return " ".join(part for part in (f"{hours} hr" if hours else "", f"{minutes} min" if minutes else "") if part)
+
+def ld_instructions(value):
+    """recipeInstructions (text, HowToStep/HowToSection objects, or lists) as ordered [LIST] blocks"""
+    blocks, steps = [], []
+
+    def flush():
+        if steps:
+            blocks.append(items_block(list(steps), ordered=True))
+            steps.clear()
+
+    def walk(item):
+        if isinstance(item, list):
+            for child in item:
+                walk(child)
+        elif isinstance(item, dict):
+            if "HowToSection" in json_ld_types(item):
+                flush()
+                if ld_text(item.get("name")):
+                    blocks.append(heading_block(ld_text(item["name"])))
+                walk(ld_list(item.get("itemListElement")))
+                flush()
+            elif "itemListElement" in item:
+                walk(item["itemListElement"])
+            else:
+                steps.append(ld_text(item.get("text") or item.get("name")))
+        else:
+            steps.extend(line for line in (ld_text(line) for line in str(item).splitlines()) if line)
+
+    walk(value)
+    flush()
+    return blocks
+
+def recipe_from_json_ld(recipe):
+    blocks = []
+    if ld_text(recipe.get("description")):
+        blocks.append(ld_text(recipe["description"]) + "\n")
+
+    recipe_yield = ld_list(recipe.get("recipeYield"))
+    if recipe_yield:
+        recipe_yield = max(recipe_yield, key=lambda v: len(ld_text(v)))  # ["4", "4 servings"] -> "4 servings"
+    details = [
+        f"{label}: {ld_duration(value) if label.endswith('time') else ld_text(value)}"
+        for label, value in (("Yield", recipe_yield), ("Prep time", recipe.get("prepTime")),
+                             ("Cook time", recipe.get("cookTime")), ("Total time", recipe.get("totalTime")),
+                             ("Cuisine", recipe.get("recipeCuisine")))
+        if value and ld_text(value)
+    ]
+    if details:
+        blocks.append(items_block(details))
+
+    # A single string is one ingredient per line, not one per character
+    ingredients = [
+        ld_text(line)
+        for item in ld_list(recipe.get("recipeIngredient") or recipe.get("ingredients"))
+        for line in (item.splitlines() if isinstance(item, str) else [item])
+    ]
+    if any(ingredients):
+        blocks.append(heading_block("Ingredients"))
+        blocks.append(items_block(ingredients))
+
+    instructions = ld_instructions(ld_list(recipe.get("recipeInstructions")))
+    if instructions:
+        blocks.append(heading_block("Instructions"))
+        blocks.extend(instructions)
+
+    nutrition = next(iter(ld_list(recipe.get("nutrition"))), None)
+    if isinstance(nutrition, dict):
+        facts = [
+            f"{key[0].upper() + key[1:]}: {ld_text(value)}"
+            for key, value in nutrition.items()
+            if not key.startswith("@") and ld_text(value)
+        ]
+        if facts:
+            blocks.append(heading_block("Nutrition"))
+            blocks.append(items_block(facts))
+
+    return "\n".join(blocks)
+
+def extract_from_json_ld(content, encoding=None):
+    """Fast path: build the article straight from schema.org Recipe/Article JSON-LD, without a DOM parse"""
+    for obj in json_ld_objects(content, encoding):
+        types = json_ld_types(obj)
+        if "Recipe" in types:
+            text = recipe_from_json_ld(obj)
+            title = ld_text(obj.get("name"))
+        elif types & ARTICLE_TYPES and obj.get("articleBody"):
+            text = ld_text(obj.get("description"))
+            text = (text + "\n\n" if text else "") + "\n\n".join(
+                " ".join(html.unescape(TAG_RE.sub(" ", paragraph)).split())
+                for paragraph in str(obj["articleBody"]).split("\n")
+                if paragraph.strip()
+            )
+            title = ld_text(obj.get("headline") or obj.get("name"))
+        else:
+            continue
 
-        parts = process_element(elem, seen_ids)
-        content_parts.extend(parts)
+        if len(text.strip()) > 200:
+            print(f"DEBUG: Using JSON-LD {'Recipe' if 'Recipe' in types else 'article'} data")
+            return {
+                'title': title or 'Web Article',
+                'text': text.strip(),
+                'author': ld_names(obj.get("author")),
+                'publish_date': ld_text(obj.get("datePublished")) or None,
+                'method': 'json-ld'
+            }
+    return None
 
-    return '\n'.join(content_parts)
+WPRM_MARKERS = ('wp-recipe-maker', 'wprm-recipe-container')
+CONTENT_SELECTORS = [
+    'article', 'main', '.content', '.post-content', '.entry-content',
+    '.article-content', '.post-body', '.story-body', '.article-body'
+]
 
-def extract_article_content(url):
-    """Extract article content from URL using multiple methods"""
-    try:
-        # Method 1: Try BeautifulSoup with WPRM detection first (best for recipes and structured content)
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
+class ContainerIndex:
+    """Every candidate content container on the page, collected in one pass over the tree.
 
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
+    Replaces a class-lambda soup.find for the WPRM div plus one soup.select per
+    content selector: elements are bucketed by tag and class as they are seen,
+    in document order, so selection is a dict lookup.
+    """
 
-        soup = BeautifulSoup(response.content, 'html.parser')
+    def __init__(self, soup, wprm_markers=WPRM_MARKERS):
+        self.wprm = dict.fromkeys(wprm_markers)  # marker -> first div whose class contains it
+        self.selectors = {selector: [] for selector in CONTENT_SELECTORS}
+        self.title = None
+        self.body = None
+
+        tag_selectors = {s for s in CONTENT_SELECTORS if not s.startswith('.')}
+        class_selectors = {s[1:]: s for s in CONTENT_SELECTORS if s.startswith('.')}
+        pending_markers = list(wprm_markers)
+
+        for node in soup.descendants:
+            if not isinstance(node, Tag):
+                continue
+            name = node.name
+            if name in tag_selectors:
+                self.selectors[name].append(node)
+            elif name == 'title' and self.title is None:
+                self.title = node
+            elif name == 'body' and self.body is None:
+                self.body = node
+
+            classes = node.get('class')
+            if not classes:
+                continue
+            if isinstance(classes, str):
+                classes = classes.split()
+            for cls in dict.fromkeys(classes):
+                selector = class_selectors.get(cls)
+                if selector:
+                    self.selectors[selector].append(node)
+
+            if name == 'div' and pending_markers:
+                joined = ' '.join(classes)
+                for marker in [m for m in pending_markers if m in joined]:
+                    self.wprm[marker] = node
+                    pending_markers.remove(marker)
+
+    def first_match(self):
+        """Elements of the first selector (in CONTENT_SELECTORS order) that matched anything"""
+        for selector in CONTENT_SELECTORS:
+            if self.selectors[selector]:
+                return self.selectors[selector]
+        return []
 
-        # Remove script and style elements
-        for script in soup(["script", "style", "nav", "footer", "header", "aside"]):
-            script.decompose()
+def extract_from_soup(soup, wprm_marker='wp-recipe-maker', index=None):
+    """BeautifulSoup extraction with WPRM detection (best for recipes and structured content)"""
+    if index is None or wprm_marker not in index.wprm:
+        index = ContainerIndex(soup, wprm_markers=(wprm_marker,))
+
+    # Check for WPRM recipe content first (priority for recipe sites)
+    wprm_recipe = index.wprm[wprm_marker]
+    content_text = ""
+
+    if wprm_recipe:
+        print(f"DEBUG: Found WPRM recipe container ({wprm_marker})")
+        wprm_content = extract_structured_content(wprm_recipe)
+        if len(wprm_content) > 500:  # Substantial recipe content
+            content_text = wprm_content
+
+    # Extract title
+    title = index.title.get_text().strip() if index.title else "Web Article"
+
+    # Main content areas (enhanced for recipe sites), first selector with matches wins
+    article_content = ""
+    for element in index.first_match():
+        structured_text = extract_structured_content(element)
+        if len(structured_text) > len(article_content):
+            article_content = structured_text
+
+    # Combine WPRM recipe content with article content if both exist
+    if content_text and article_content:
+        # WPRM content first (recipe), then article content (context/tips)
+        content_text = content_text + "\n\n" + article_content
+    elif article_content and not content_text:
+        content_text = article_content
+
+    # If no specific content found, extract from body with structure preservation
+    if not content_text and index.body:
+        content_text = extract_structured_content(index.body)
+
+    if content_text and len(content_text.strip()) > 200:
+        return {
+            'title': title or 'Web Article',
+            'text': content_text.strip(),
+            'author': [],
+            'publish_date': None,
+            'method': 'beautifulsoup'
+        }
 
-        # Try to find main content areas (enhanced for recipe sites)
-        content_selectors = [
-            'article', 'main', '.content', '.post-content', '.entry-content',
-            '.article-content', '.post-body', '.story-body', '.article-body'
-        ]
+    return None
 
-        # Check for WPRM recipe content first (priority for recipe sites)
-        wprm_recipe = soup.find('div', class_=lambda x: x and 'wp-recipe-maker' in str(x))
-        content_text = ""
-
-        if wprm_recipe:
-            print("DEBUG: Found WPRM recipe container")
-            wprm_content = extract_structured_content(wprm_recipe)
-            if len(wprm_content) > 500:  # Substantial recipe content
-                content_text = wprm_content
-
-        # Extract title
-        title_tag = soup.find('title')
-        title = title_tag.get_text().strip() if title_tag else "Web Article"
-
-        # Try to find content using selectors with enhanced structured extraction
-        article_content = ""
-        for selector in content_selectors:
-            elements = soup.select(selector)
-            if elements:
-                for element in elements:
-                    structured_text = extract_structured_content(element)
-                    if len(structured_text) > len(article_content):
-                        article_content = structured_text
-                break
-
-        # Combine WPRM recipe content with article content if both exist
-        if content_text and article_content:
-            # WPRM content first (recipe), then article content (context/tips)
-            content_text = content_text + "\n\n" + article_content
-        elif article_content and not content_text:
-            content_text = article_content
-
-        # If no specific content found, extract from body with structure preservation
-        if not content_text:
-            body = soup.find('body')
-            if body:
-                content_text = extract_structured_content(body)
-
-        if content_text and len(content_text.strip()) > 200:
+def extract_with_newspaper(url, html=None):
+    """Fallback to newspaper3k for news articles; reuses already-downloaded HTML when given"""
+    try:
+        article = Article(url)
+        if html is not None:
+            article.download(input_html=html)
+        else:
+            article.download()
+        article.parse()
+
+        if article.text and len(article.text.strip()) > 200:
             return {
-                'title': title or 'Web Article',
-                'text': content_text.strip(),
-                'author': [],
-                'publish_date': None,
-                'method': 'beautifulsoup'
+                'title': article.title or 'Article',
+                'text': article.text.strip(),
+                'author': getattr(article, 'authors', []),
+                'publish_date': str(article.publish_date) if article.publish_date else None,
+                'method': 'newspaper3k'
             }
+    except Exception as e:
+        print(f"Newspaper3k extraction failed: {e}")
+
+    return None
+
+# Default order; per-domain memory moves the usual winner first and drops strategies that keep failing
+EXTRACTION_STRATEGIES = ("json-ld", "soup", "newspaper", "soup-wprm-container")
+
+strategy_memory = StrategyMemory(
+    config.STRATEGY_DB_PATH, half_life=config.STRATEGY_HALF_LIFE, skip_after=config.STRATEGY_SKIP_AFTER
+) if config.STRATEGY_DB_PATH else None
+
+charset_stats = {"bom": 0, "header": 0, "meta": 0, "utf-8": 0, "fallback": 0, "text": 0}
+
+def extract_article_html(url, content, content_type=None):
+    """Run the extraction strategies on one downloaded body (one download, at most one BeautifulSoup parse)"""
+    # Settle the encoding once from the header/BOM/<meta> so the parser skips its own detection;
+    # the page stays bytes, which the parser reads faster than a decoded str
+    encoding, source = resolve_encoding(content, content_type)
+    if source == "fallback" or (encoding and not ascii_compatible(encoding)):
+        # Bytes that don't decode as declared go on as text with U+FFFD (lxml would drop the whole page);
+        # so do UTF-16/32 pages, which the byte-level pre-strip and JSON-LD scan can't read
+        text, _, source = decode_html(content, content_type)
+        if text is not None:
+            content, encoding = text, None
+        else:
+            print(f"DEBUG: No usable charset for {url}, leaving detection to the parser")
+    charset_stats[source] += 1
+    parsed = {}
+
+    def soup_and_index():
+        # Parsed on first use, then shared by both BeautifulSoup strategies
+        if not parsed:
+            parsed["soup"] = prepare_soup(content, from_encoding=encoding)
+            parsed["index"] = ContainerIndex(parsed["soup"])
+        return parsed["soup"], parsed["index"]
+
+    def page_text():
+        # Only newspaper needs the decoded page, so it is decoded only when that strategy runs
+        return content.decode(encoding) if encoding else content
+
+    strategies = {
+        # schema.org JSON-LD, no parse needed when the page ships it
+        "json-ld": lambda: extract_from_json_ld(content, encoding),
+        # BeautifulSoup with WPRM detection first (best for recipes and structured content)
+        "soup": lambda: extract_from_soup(soup_and_index()[0], index=soup_and_index()[1]),
+        # newspaper3k for news articles, fed the same HTML
+        "newspaper": lambda: extract_with_newspaper(url, page_text()),
+        # Same tree with the WPRM container class
+        "soup-wprm-container": lambda: extract_from_soup(
+            soup_and_index()[0], wprm_marker='wprm-recipe-container', index=soup_and_index()[1]
+        )
+    }
 
-        # Method 2: Fallback to newspaper3k for news articles
+    domain = urlparse(url).netloc.lower()
+    order = strategy_memory.order(domain, EXTRACTION_STRATEGIES) if strategy_memory else EXTRACTION_STRATEGIES
+    if order[0] != EXTRACTION_STRATEGIES[0] or len(order) < len(EXTRACTION_STRATEGIES):
+        print(f"DEBUG: Extraction order for {domain}: {', '.join(order)}")
+
+    for name in order:
+        start = time.perf_counter()
         try:
-            article = Article(url)
-            article.download()
-            article.parse()
-
-            if article.text and len(article.text.strip()) > 200:
-                return {
-                    'title': article.title or 'Article',
-                    'text': article.text.strip(),
-                    'author': getattr(article, 'authors', []),
-                    'publish_date': str(article.publish_date) if article.publish_date else None,
-                    'method': 'newspaper3k'
-                }
+            article_data = strategies[name]()
         except Exception as e:
-            print(f"Newspaper3k extraction failed: {e}")
-
-        # Method 3: Final fallback to basic BeautifulSoup
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.content, 'html.parser')
+            print(f"DEBUG: Extraction strategy {name} failed for {url}: {e}")
+            article_data = None
+        if strategy_memory:
+            strategy_memory.record(domain, name, bool(article_data), time.perf_counter() - start)
+        if article_data:
+            return article_data
+    return None
+
+article_cache = TTLCache(maxsize=config.ARTICLE_CACHE_SIZE, ttl=config.ARTICLE_CACHE_RETAIN)
+article_cache_stats = {"hits": 0, "revalidated": 0, "misses": 0}
+
+def fresh_article(entry):
+    """Cached article if the entry is still within ARTICLE_CACHE_TTL"""
+    if entry is not None and time.time() - entry["fetched_at"] < config.ARTICLE_CACHE_TTL:
+        article_cache_stats["hits"] += 1
+        return entry["article"]
+    return None
+
+def conditional_headers(entry):
+    """Request headers, plus validators for a conditional GET when we hold a stale copy"""
+    headers = dict(ARTICLE_HEADERS)
+    if entry is not None:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+def revalidated_article(url, entry):
+    """304 Not Modified: keep the stored extraction and restart its TTL"""
+    article_cache_stats["revalidated"] += 1
+    article_cache.set(url, dict(entry, fetched_at=time.time()))
+    print(f"DEBUG: Article not modified, reusing cached extraction for {url}")
+    return entry["article"]
+
+def remember_article(url, article_data, response_headers):
+    """Store an extraction along with the page's ETag/Last-Modified"""
+    if len(article_data["text"]) > config.ARTICLE_CACHE_MAX_CHARS:
+        return
+    article_cache.set(url, {
+        "article": article_data,
+        "etag": response_headers.get("ETag"),
+        "last_modified": response_headers.get("Last-Modified"),
+        "fetched_at": time.time()
+    })
+
+def fetch_article(url, headers, sniff=False):
+    """Streamed, size-capped HTML download with one deadline across redirects; with `sniff`,
+    stops after the <head> when the page advertises a lighter AMP/print variant"""
+    return http_client.fetch_html(
+        url,
+        headers=headers,
+        max_bytes=config.FETCH_MAX_BYTES,
+        deadline=config.FETCH_DEADLINE,
+        connect_timeout=config.FETCH_CONNECT_TIMEOUT,
+        max_redirects=config.FETCH_MAX_REDIRECTS,
+        head_sniffer=variant_sniffer if sniff and config.PREFER_LIGHT_VARIANTS else None
+    )
+
+variant_stats = {"sniffed": 0, "diverted": 0, "used": 0, "rejected": 0, "pages": 0, "bytes": 0, "parse_ms": 0.0}
+
+def variant_sniffer(head, url):
+    """head_sniffer for fetch_html: URL of an advertised AMP/print variant, if any"""
+    variant_stats["sniffed"] += 1
+    found = find_light_variant(head, url)
+    return found[1] if found else None
+
+def extraction_counters():
+    """Counters extract_article_html bumps; parse workers send back how much they grew"""
+    return {
+        "charset": dict(charset_stats),
+        "strategies": strategy_memory.counters() if strategy_memory else {}
+    }
 
-        # Remove script and style elements
-        for script in soup(["script", "style", "nav", "footer", "header", "aside"]):
-            script.decompose()
+def add_extraction_counters(increments):
+    for source, count in increments["charset"].items():
+        charset_stats[source] += count
+    if strategy_memory:
+        strategy_memory.add_counters(increments["strategies"])
+
+# Parsing runs in worker processes so a big page holds neither this process's GIL nor its memory
+parse_pool = ParsePool(
+    workers=config.PARSE_WORKERS,
+    cpu_seconds=config.PARSE_CPU_SECONDS,
+    memory_mb=config.PARSE_MEMORY_MB,
+    tasks_per_child=config.PARSE_TASKS_PER_CHILD,
+    timeout=config.PARSE_TIMEOUT
+) if config.PARSE_WORKERS > 0 else None
+
+def run_extraction(url, content, content_type=None):
+    """extract_article_html in the parse pool, or in this thread when there is no usable pool"""
+    if parse_pool is None:
+        return extract_article_html(url, content, content_type)
+    try:
+        article_data, increments = parse_pool.extract(url, content, content_type)
+    except ParseLimitExceeded as e:
+        print(f"DEBUG: Gave up parsing {url}: {e}")
+        return None
+    except ParsePoolUnavailable as e:
+        print(f"DEBUG: Parse pool unavailable ({e}), parsing {url} in-thread")
+        return extract_article_html(url, content, content_type)
+    add_extraction_counters(increments)
+    return article_data
+
+def parse_page(url, content, variant=None, content_type=None):
+    """extract_article_html plus per-page download size and parse time (kept on the article as 'fetch')"""
+    start = time.perf_counter()
+    article_data = run_extraction(url, content, content_type)
+    parse_ms = (time.perf_counter() - start) * 1000
+    variant_stats["pages"] += 1
+    variant_stats["bytes"] += len(content)
+    variant_stats["parse_ms"] += parse_ms
+    print(f"DEBUG: Parsed {url}: {len(content)} bytes in {parse_ms:.1f}ms{f' ({variant} variant)' if variant else ''}")
+    if article_data:
+        article_data = dict(article_data, fetch={
+            "fetched": url, "bytes": len(content), "parse_ms": round(parse_ms, 1), "variant": variant
+        })
+    return article_data
 
-        # Try to find main content areas (enhanced for recipe sites)
-        content_selectors = [
-            'article', 'main', '.content', '.post-content', '.entry-content',
-            '.article-content', '.post-body', '.story-body', '.article-body'
-        ]
+def usable_variant(response, article_data):
+    """Sanity check before a variant replaces the full page: real size and a substantial extraction"""
+    return bool(article_data) and len(response.content) >= config.VARIANT_MIN_BYTES and \
+        len(article_data["text"]) >= config.VARIANT_MIN_CHARS
 
-        content_text = ""
-        title = ""
-
-        # Check for WPRM (WP Recipe Maker) recipe containers first
-        wprm_recipe = soup.find('div', class_=lambda x: x and 'wprm-recipe-container' in str(x))
-        if wprm_recipe:
-            wprm_content = extract_structured_content(wprm_recipe)
-            if len(wprm_content) > 500:  # Substantial recipe content
-                content_text = wprm_content
-
-        # Extract title
-        title_tag = soup.find('title')
-        if title_tag:
-            title = title_tag.get_text().strip()
-
-        # Try to find content using selectors with enhanced structured extraction
-        article_content = ""
-        for selector in content_selectors:
-            elements = soup.select(selector)
-            if elements:
-                for element in elements:
-                    structured_text = extract_structured_content(element)
-                    if len(structured_text) > len(article_content):
-                        article_content = structured_text
-                break
-
-        # Combine WPRM recipe content with article content if both exist
-        if content_text and article_content:
-            # WPRM content first (recipe), then article content (context/tips)
-            content_text = content_text + "\n\n" + article_content
-        elif article_content and not content_text:
-            content_text = article_content
-
-        # If no specific content found, extract from body with structure preservation
-        if not content_text:
-            body = soup.find('body')
-            if body:
-                content_text = extract_structured_content(body)
-
-        if content_text and len(content_text.strip()) > 200:
-            return {
-                'title': title or 'Web Article',
-                'text': content_text.strip(),
-                'author': [],
-                'publish_date': None,
-                'method': 'beautifulsoup'
-            }
+def fetch_variant(page):
+    """Fetch and parse the variant the head sniffer diverted to: (response, article_data), or None if unusable"""
+    kind, url = find_light_variant(page.content, page.url)
+    variant_stats["diverted"] += 1
+    try:
+        response = fetch_article(url, ARTICLE_HEADERS)
+        article_data = parse_page(
+            response.url, response.content, variant=kind, content_type=response.headers.get("Content-Type")
+        )
+    except Exception as e:
+        print(f"DEBUG: {kind} variant {url} failed: {e}")
+        response, article_data = None, None
+
+    if response is not None and usable_variant(response, article_data):
+        variant_stats["used"] += 1
+        return response, article_data
+    variant_stats["rejected"] += 1
+    print(f"DEBUG: {kind} variant {url} rejected, fetching the full page")
+    return None
+
+TRANSIENT_FAILURES = {"timeout", "server_error", "unreachable", "rate_limited", "error"}
+DOMAIN_FAILURES = {"unreachable", "rate_limited"}  # Say something about the host, not just the URL
+STRIKE_FAILURES = {"timeout", "server_error"}  # Enough of these and the domain is blocked too
+
+negative_cache = NegativeCache(
+    maxsize=config.NEGATIVE_CACHE_SIZE,
+    strikes=config.NEGATIVE_DOMAIN_STRIKES,
+    strike_window=2 * config.NEGATIVE_CACHE_TTL
+)
+
+def known_failure(url):
+    """Recent failure entry for this URL or its domain, if any"""
+    if not config.NEGATIVE_CACHE_TTL:
+        return None
+    entry = negative_cache.check(url, urlparse(url).netloc.lower())
+    if entry:
+        print(f"DEBUG: Skipping {url}, failed recently ({entry['kind']})")
+    return entry
+
+def remember_failure(url, kind, elapsed, message=""):
+    """Negative-cache a failed extraction; kind None means the failure is not worth remembering"""
+    if kind is None or not config.NEGATIVE_CACHE_TTL:
+        return
+    negative_cache.add(
+        url,
+        urlparse(url).netloc.lower(),
+        kind,
+        ttl=config.NEGATIVE_CACHE_TTL if kind in TRANSIENT_FAILURES else config.NEGATIVE_CACHE_TTL_PERMANENT,
+        elapsed=elapsed,
+        message=message[:200],
+        domain_wide=kind in DOMAIN_FAILURES,
+        strike=kind in STRIKE_FAILURES
+    )
+
+def extraction_error(urls):
+    """/api/process error for URLs that produced no article, with the failure reason when one is known"""
+    reasons = []
+    for url in urls:
+        key = url_identity(url)
+        entry = negative_cache.peek(key, urlparse(key).netloc) if config.NEGATIVE_CACHE_TTL else None
+        if entry:
+            reasons.append(entry["kind"].replace("_", " "))
+    reason = f" ({', '.join(dict.fromkeys(reasons))})" if reasons else ""
+    return {"error": f"Failed to extract content from the provided URL{reason}. Please check the URL and try again."}
+
+canonicalizer = Canonicalizer(maxsize=config.CANONICAL_CACHE_SIZE, ttl=config.CANONICAL_CACHE_TTL)
+
+def canonical_target(key, fetch_url, response):
+    """Identity the fetched page belongs to (after redirects and rel=canonical),
+    plus the cached article when that identity is already known and fresh"""
+    canonical_key = canonicalizer.learn(fetch_url, response.url, find_canonical_link(response.content, response.url))
+    if canonical_key != key:
+        article_data = fresh_article(article_cache.get(canonical_key))
+        if article_data:
+            print(f"DEBUG: {fetch_url} is {canonical_key}, reusing its cached extraction")
+            return canonical_key, article_data
+    return canonical_key, None
 
+def extract_article_content(url):
+    """Extract article content from URL using multiple methods (cached under the canonical URL;
+    stale copies revalidated with conditional GETs)"""
+    fetch_url, key = canonicalizer.resolve(url)
+    entry = article_cache.get(key)
+    article_data = fresh_article(entry)
+    if article_data:
+        return article_data
+    if known_failure(key):
         return None
 
+    start = time.monotonic()
+    try:
+        response = fetch_article(fetch_url, conditional_headers(entry), sniff=entry is None)
+        if response.status_code == 304 and entry is not None:
+            return revalidated_article(key, entry)
+
+        article_data = None
+        if response.alternate:
+            variant = fetch_variant(response)
+            if variant:
+                response, article_data = variant
+            else:
+                response = fetch_article(fetch_url, ARTICLE_HEADERS)
+
+        key, cached = canonical_target(key, fetch_url, response)
+        if cached:
+            return cached
+        article_cache_stats["misses"] += 1
+
+        if article_data is None:
+            article_data = parse_page(response.url, response.content, content_type=response.headers.get("Content-Type"))
+        if article_data:
+            remember_article(key, article_data, response.headers)
+        else:
+            remember_failure(key, "no_content", time.monotonic() - start)
+        return article_data
+
     except Exception as e:
         print(f"Article extraction error for {url}: {e}")
+        remember_failure(key, http_client.error_kind(e), time.monotonic() - start, str(e))
         return None
 
 A4_CSS_TEMPLATE = """.a4 {{
@@ -642,11 +1256,13 @@ THEME_COLORS = {
 def index():
     return render_template("index.html")
 
-def extract_theme(text: str) -> str:
-    """AI-powered theme detection using OpenAI to analyze content and suggest appropriate theme"""
-    try:
-        # Use comprehensive analysis for better accuracy
-        theme_prompt = f"""You are an expert content analyst. Analyze the following text and determine the most appropriate visual theme category based on the primary subject matter and content focus.
+THEME_SYSTEM_PROMPT = "You are a precise content categorization expert. Always respond with exactly one word: the theme category name."
+
+DOCUMENT_SYSTEM_PROMPT = "You are an expert document analyst and professional HTML formatter. Create highly structured, intelligent documents with deep analysis."
+
+def build_theme_prompt(text: str) -> str:
+    """Comprehensive theme analysis prompt for better accuracy"""
+    return f"""You are an expert content analyst. Analyze the following text and determine the most appropriate visual theme category based on the primary subject matter and content focus.
 
 Text to analyze:
 "{text[:800]}"
@@ -668,48 +1284,69 @@ Instructions:
 
 Respond with ONLY the theme category name: finance, health, tech, travel, food, or default"""
 
+def normalize_theme(detected_theme: str, text: str) -> str:
+    """Validate the model's answer is one of our supported themes"""
+    detected_theme = detected_theme.strip().lower()
+    valid_themes = ["finance", "health", "tech", "travel", "food", "default"]
+    if detected_theme in valid_themes:
+        print(f"DEBUG: AI detected theme: {detected_theme} for content: {text[:100]}...")
+        return detected_theme
+    else:
+        print(f"DEBUG: AI returned invalid theme '{detected_theme}', using default for content: {text[:100]}...")
+        return "default"
+
+def local_theme(text: str):
+    """Offline classifier answer, or None when it is below the confidence threshold"""
+    try:
+        theme, confidence = classify_theme(text)
+    except Exception as e:
+        print(f"DEBUG: Local theme classifier unavailable: {e}")
+        return None
+
+    if confidence >= config.THEME_CONFIDENCE_THRESHOLD:
+        print(f"DEBUG: Local classifier theme: {theme} (confidence {confidence:.2f})")
+        return theme
+    print(f"DEBUG: Local classifier unsure ({theme}, confidence {confidence:.2f}), asking the LLM")
+    return None
+
+def extract_theme(text: str) -> str:
+    """Theme detection: local classifier first, LLM only on low confidence"""
+    return local_theme(text) or detect_theme_with_llm(text)
+
+def detect_theme_with_llm(text: str) -> str:
+    """AI-powered theme detection using OpenAI to analyze content and suggest appropriate theme"""
+    try:
         response = openai.chat.completions.create(
             model="gpt-4o",  # Use more powerful model for better accuracy
             messages=[
-                {"role": "system", "content": "You are a precise content categorization expert. Always respond with exactly one word: the theme category name."},
-                {"role": "user", "content": theme_prompt}
+                {"role": "system", "content": THEME_SYSTEM_PROMPT},
+                {"role": "user", "content": build_theme_prompt(text)}
             ],
             max_tokens=20,  # Allow some flexibility for response
             temperature=0,  # Maximum consistency
             timeout=30  # Shorter timeout for theme detection
         )
         
-        detected_theme = response.choices[0].message.content.strip().lower()
-
-        # Validate the response is one of our supported themes
-        valid_themes = ["finance", "health", "tech", "travel", "food", "default"]
-        if detected_theme in valid_themes:
-            print(f"DEBUG: AI detected theme: {detected_theme} for content: {text[:100]}...")
-            return detected_theme
-        else:
-            print(f"DEBUG: AI returned invalid theme '{detected_theme}', using default for content: {text[:100]}...")
-            return "default"
+        return normalize_theme(response.choices[0].message.content, text)
             
     except Exception as e:
         print(f"DEBUG: Theme detection failed: {e}, using default for content: {text[:100]}...")
         return "default"
 
-def generate_search_query(text: str, theme: str) -> str:
-    """AI-powered search query generation with robust fallback"""
-    # Robust fallback function first
-    def create_fallback_query():
-        words = text.lower().split()
-        stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those'}
-        meaningful_words = [w for w in words[:25] if len(w) > 3 and w not in stop_words and w.isalpha()]
-
-        if meaningful_words:
-            return f"{' '.join(meaningful_words[:4])} {theme} guidelines"
-        else:
-            return f"{theme} information guidelines"
+def fallback_search_query(text: str, theme: str) -> str:
+    """Robust keyword-based query used when AI query generation is unavailable"""
+    words = text.lower().split()
+    stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those'}
+    meaningful_words = [w for w in words[:25] if len(w) > 3 and w not in stop_words and w.isalpha()]
 
-    try:
-        # Try AI-powered query generation
-        query_prompt = f"""Create a web search query for background information about this content.
+    if meaningful_words:
+        return f"{' '.join(meaningful_words[:4])} {theme} guidelines"
+    else:
+        return f"{theme} information guidelines"
+
+def build_search_query_prompt(text: str, theme: str) -> str:
+    """Prompt asking the model for a short background-information query"""
+    return f"""Create a web search query for background information about this content.
 
 Content (theme: {theme}):
 "{text[:500]}"
@@ -718,27 +1355,35 @@ Extract 2-4 key concepts and create a search query (max 7 words) that would find
 
 Query:"""
 
+def validate_search_query(raw_query: str, text: str, theme: str) -> str:
+    """Clean the AI query and fall back to keywords when it is unusable"""
+    ai_query = raw_query.strip().replace('"', '').replace("Query:", "").strip()
+
+    # Validate AI response
+    if len(ai_query.split()) > 8 or len(ai_query) < 10:
+        print(f"DEBUG: AI query invalid length, using fallback. AI returned: '{ai_query}'")
+        return fallback_search_query(text, theme)
+
+    print(f"DEBUG: AI generated search query: '{ai_query}' for theme: {theme}")
+    return ai_query
+
+def generate_search_query(text: str, theme: str) -> str:
+    """AI-powered search query generation with robust fallback"""
+    try:
+        # Try AI-powered query generation
         response = openai.chat.completions.create(
             model="gpt-4o-mini",
-            messages=[{"role": "user", "content": query_prompt}],
+            messages=[{"role": "user", "content": build_search_query_prompt(text, theme)}],
             max_tokens=25,
             temperature=0.2,
             timeout=15
         )
 
-        ai_query = response.choices[0].message.content.strip().replace('"', '').replace("Query:", "").strip()
-
-        # Validate AI response
-        if len(ai_query.split()) > 8 or len(ai_query) < 10:
-            print(f"DEBUG: AI query invalid length, using fallback. AI returned: '{ai_query}'")
-            return create_fallback_query()
-
-        print(f"DEBUG: AI generated search query: '{ai_query}' for theme: {theme}")
-        return ai_query
+        return validate_search_query(response.choices[0].message.content, text, theme)
 
     except Exception as e:
         print(f"DEBUG: AI query generation failed ({e}), using fallback")
-        return create_fallback_query()
+        return fallback_search_query(text, theme)
 
 def calculate_cost(model_name, prompt_tokens, completion_tokens):
     """Calculate cost based on model pricing (as of 2025)"""
@@ -757,49 +1402,126 @@ def calculate_cost(model_name, prompt_tokens, completion_tokens):
     
     return input_cost + output_cost
 
-@app.route("/api/process", methods=["POST"])
-def process():
-    data = request.json
-    input_text = data.get("text", "").strip()
-    ai_topic = data.get("aiTopic", "").strip()
-    article_url = data.get("articleUrl", "").strip()
-    selected_model = data.get("model", "GPT-5")
-    verbosity = data.get("verbosity", "Detailed")
+# Verbosity-specific instructions
+VERBOSITY_INSTRUCTIONS = {
+    "Concise": "Keep content brief and focused. Use 1-2 paragraphs per section, 2-3 stat boxes, and 1 small table. Prioritize key information only.",
+    "Detailed": "Provide balanced detail. Use 2-3 paragraphs per section, 3 stat boxes, 1-2 comprehensive tables, and visual timelines when chronological data is present. Include supporting analysis.",
+    "Comprehensive": "Provide EXTENSIVE analysis with maximum detail. REQUIREMENTS: 4-6 paragraphs per section, 6+ stat boxes, 3-4 detailed tables, visual timelines (when applicable), comparison tables, market analysis, trend data, future projections, case studies, and deep contextual insights. Make the document comprehensive like a research report."
+}
 
-    if not input_text and not ai_topic and not article_url:
-        return jsonify({"error": "No input text, AI topic, or URL provided."})
+def article_urls(data):
+    """URLs from articleUrl (a string, possibly whitespace-separated, or a list) and articleUrls, cleaned and deduplicated"""
+    urls = []
+    for value in (data.get("articleUrl"), data.get("articleUrls")):
+        if isinstance(value, str):
+            urls.extend(value.split())
+        elif isinstance(value, (list, tuple)):
+            urls.extend(str(url).strip() for url in value)
+    unique = {}
+    for url in urls:
+        if url:
+            unique.setdefault(url_identity(url), clean_url(url))  # utm/fbclid/AMP variants count once
+    return list(unique.values())[:config.MULTI_URL_MAX]
+
+def prepare_request(data):
+    """Normalize a /api/process payload into the fields the pipeline uses"""
+    return {
+        "input_text": data.get("text", "").strip(),
+        "ai_topic": data.get("aiTopic", "").strip(),
+        "article_urls": article_urls(data),
+        "model": data.get("model", "GPT-5"),
+        "verbosity": data.get("verbosity", "Detailed")
+    }
 
-    # Handle URL extraction first if provided
-    if article_url:
-        print(f"DEBUG: Extracting article from URL: {article_url}")
-        article_data = extract_article_content(article_url)
+def article_to_text(article_data):
+    """Turn an extracted article into pipeline input text"""
+    input_text = f"Article: {article_data['title']}\n\n{article_data['text']}"
+    print(f"DEBUG: Successfully extracted {len(input_text)} characters from URL")
+    print(f"DEBUG: Article title: {article_data['title']}")
+    print(f"DEBUG: Content preview: {input_text[:500]}...")
+    return input_text
+
+compaction_stats = {"requests": 0, "chars_removed": 0, "tokens_saved": 0}
+
+def compact_article_text(input_text):
+    """Prompt token diet for extracted text; returns (text, per-request stats or None when disabled)"""
+    if not config.PROMPT_COMPACTION:
+        return input_text, None
+    compacted, stats = compact_text(input_text)
+    compaction_stats["requests"] += 1
+    compaction_stats["chars_removed"] += stats["chars_before"] - stats["chars_after"]
+    compaction_stats["tokens_saved"] += stats["tokens_saved"]
+    print(f"DEBUG: Compacted article text {stats['chars_before']} -> {stats['chars_after']} chars "
+          f"(~{stats['tokens_saved']} tokens saved)")
+    return compacted, stats
+
+def article_sources(articles):
+    """Per-source report for the response: what was fetched, how big it was, how long parsing took"""
+    return [
+        dict({"url": url, "title": article_data["title"], "method": article_data.get("method")},
+             **article_data.get("fetch", {}))
+        for url, article_data in articles
+    ]
+
+def article_input(articles):
+    """(input_text, response extras) for extracted articles: merged, compacted, with per-source stats"""
+    input_text, compaction = compact_article_text(articles_to_text(articles))
+    extras = {"sources": article_sources(articles)}
+    if compaction:
+        extras["compaction"] = compaction
+    return input_text, extras
+
+def articles_to_text(articles):
+    """Pipeline input text for one or more (url, article_data) pairs; several sources get one heading each"""
+    if len(articles) == 1:
+        return article_to_text(articles[0][1])
+
+    sections = [f"Compiled from {len(articles)} sources."]
+    for i, (url, article_data) in enumerate(articles, 1):
+        sections.append(f"=== Source {i}: {article_data['title']} ===\nURL: {url}\n\n{article_data['text']}")
+    input_text = "\n\n".join(sections)
+    print(f"DEBUG: Merged {len(articles)} articles into {len(input_text)} characters")
+    return input_text
+
+def unique_articles(urls, results):
+    """(url, article_data) in request order, dropping failures and pages whose text we already have"""
+    articles, seen = [], set()
+    for url, article_data in zip(urls, results):
         if not article_data:
-            return jsonify({"error": "Failed to extract content from the provided URL. Please check the URL and try again."})
-
-        input_text = f"Article: {article_data['title']}\n\n{article_data['text']}"
-        print(f"DEBUG: Successfully extracted {len(input_text)} characters from URL")
-        print(f"DEBUG: Article title: {article_data['title']}")
-        print(f"DEBUG: Content preview: {input_text[:500]}...")
-
-    # Determine processing mode (URL extraction is treated as document processing)
-    is_ai_research = bool(ai_topic and not input_text)
-    processing_text = ai_topic if is_ai_research else input_text
-    
-    theme = extract_theme(processing_text)
-    theme_color = THEME_COLORS.get(theme, THEME_COLORS["default"])
-    
-    print(f"DEBUG: Processing mode: {'AI Research' if is_ai_research else 'Document Processing'}")
-    print(f"DEBUG: Detected theme: {theme}, color: {theme_color}")
-    print(f"DEBUG: Selected model: {selected_model}, Verbosity: {verbosity}")
-    print(f"DEBUG: Input text length: {len(processing_text)} characters")
-
-    # Handle AI Research vs Document Processing
+            continue
+        fingerprint = hash(" ".join(article_data["text"].split()))
+        if fingerprint in seen:
+            print(f"DEBUG: Skipping duplicate content from {url}")
+            continue
+        seen.add(fingerprint)
+        articles.append((url, article_data))
+    return articles
+
+def extract_articles(urls):
+    """Fetch and extract several URLs at once: per-host concurrency cap, one time budget for the set"""
+    if len(urls) == 1:
+        return unique_articles(urls, [extract_article_content(urls[0])])
+
+    host_slots = {urlparse(url).netloc: threading.BoundedSemaphore(config.MULTI_URL_PER_HOST) for url in urls}
+
+    def extract(url):
+        with host_slots[urlparse(url).netloc]:
+            return extract_article_content(url)
+
+    executor = ThreadPoolExecutor(max_workers=min(len(urls), config.MULTI_URL_WORKERS))
+    try:
+        futures = [executor.submit(extract, url) for url in urls]
+        done, pending = wait(futures, timeout=config.MULTI_URL_BUDGET)
+        if pending:
+            print(f"DEBUG: {len(pending)} of {len(urls)} URLs missed the {config.MULTI_URL_BUDGET}s budget")
+        results = [future.result() if future in done else None for future in futures]
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return unique_articles(urls, results)
+
+def build_processing_content(input_text, ai_topic, is_ai_research, search_results):
+    """Combine the source text (or research topic) with web search citations"""
     if is_ai_research:
-        # For AI research mode, do extensive web search
-        search_query = ai_topic
-        search_results = web_search(search_query, num_results=5)
-        print(f"DEBUG: AI Research - Found {len(search_results)} web search results")
-        
         # Create research context
         search_context = f"\n\nWeb Research Results for '{ai_topic}' (USE THESE FOR CITATIONS):\n"
         if search_results:
@@ -809,28 +1531,18 @@ def process():
             search_context += "No specific web results found. Use general knowledge.\n"
             
         # Use the topic as the base text for processing
-        processing_content = f"Research Topic: {ai_topic}{search_context}"
-    else:
-        # Standard document processing with AI-powered search query generation
-        search_query = generate_search_query(input_text, theme)
-        search_results = web_search(search_query, num_results=2)
-        print(f"DEBUG: Document Processing - Search query: '{search_query}' - Found {len(search_results)} web search results")
-        
-        search_context = ""
-        if search_results:
-            search_context = f"\n\nAdditional Context from Web Search (USE THESE FOR CITATIONS):\n"
-            for i, result in enumerate(search_results, 1):
-                search_context += f"[{i}] Title: {result['title']}\n    URL: {result['url']}\n    Snippet: {result['snippet']}\n\n"
-        
-        processing_content = f"{input_text}{search_context}"
+        return f"Research Topic: {ai_topic}{search_context}"
 
-    # Create verbosity-specific instructions
-    verbosity_instructions = {
-        "Concise": "Keep content brief and focused. Use 1-2 paragraphs per section, 2-3 stat boxes, and 1 small table. Prioritize key information only.",
-        "Detailed": "Provide balanced detail. Use 2-3 paragraphs per section, 3 stat boxes, 1-2 comprehensive tables, and visual timelines when chronological data is present. Include supporting analysis.",
-        "Comprehensive": "Provide EXTENSIVE analysis with maximum detail. REQUIREMENTS: 4-6 paragraphs per section, 6+ stat boxes, 3-4 detailed tables, visual timelines (when applicable), comparison tables, market analysis, trend data, future projections, case studies, and deep contextual insights. Make the document comprehensive like a research report."
-    }
+    search_context = ""
+    if search_results:
+        search_context = f"\n\nAdditional Context from Web Search (USE THESE FOR CITATIONS):\n"
+        for i, result in enumerate(search_results, 1):
+            search_context += f"[{i}] Title: {result['title']}\n    URL: {result['url']}\n    Snippet: {result['snippet']}\n\n"
     
+    return f"{input_text}{search_context}"
+
+def build_prompt(processing_content, is_ai_research, ai_topic, verbosity):
+    """Build the full document generation prompt"""
     # Determine content type instructions
     if is_ai_research:
         content_instruction = f"""
@@ -839,7 +1551,7 @@ RESEARCH MODE: You are researching and creating a comprehensive document about:
 Use the web search results provided and your knowledge to create an authoritative, well-researched document. 
 Focus on current trends, statistics, and factual information. Create original content based on research.
 
-Verbosity Level: {verbosity} - {verbosity_instructions[verbosity]}
+Verbosity Level: {verbosity} - {VERBOSITY_INSTRUCTIONS[verbosity]}
 """
     else:
         content_instruction = f"""
@@ -864,10 +1576,11 @@ SPECIAL HANDLING for RECIPE CONTENT:
 
 This is DOCUMENT PROCESSING, not summarization - maintain ALL original content
 
-Verbosity Level: {verbosity} - {verbosity_instructions[verbosity]}
+Verbosity Level: {verbosity} - {VERBOSITY_INSTRUCTIONS[verbosity]}
 """
 
-    prompt = f"""
+
+    return f"""
 {content_instruction}
 
 Create a professional document following this EXACT structure (like a medical/scientific paper):
@@ -1039,158 +1752,594 @@ Content to process:
 {processing_content}
     """
 
-    try:
-        # Check for Gemini API key dynamically
-        gemini_api_key = os.getenv('GOOGLE_API_KEY') or os.getenv('GEMINI_API_KEY')
-        print(f"DEBUG: Gemini API key available: {bool(gemini_api_key)}")
-
-        # Map model names to actual model IDs
-        model_map = {
-            "GPT-4o-mini": "gpt-4o-mini",
-            "Gemini Pro 2.5": "gemini-2.5-pro" if gemini_api_key else "gpt-4o",  # Use actual Gemini Pro if available
-            "GPT-5": "gpt-4o"  # Use GPT-4o as GPT-5 proxy (GPT-5 may require special access)
-        }
-        
-        actual_model = model_map.get(selected_model, "gpt-4o")
-        
-        # Retry logic for connection errors
-        max_retries = MAX_RETRIES
-        for attempt in range(max_retries):
-            try:
-                # Set max tokens based on verbosity and environment
-                max_tokens = MAX_TOKENS_CONFIG.get(verbosity, MAX_TOKENS_CONFIG["Detailed"])
-                
-                print(f"DEBUG: Using {max_tokens} tokens for {verbosity} mode with {actual_model} (selected: {selected_model})")
-                print(f"DEBUG: Prompt length: {len(prompt)} characters")
-
-                # Use Gemini API for Gemini models, OpenAI API for others
-                if actual_model.startswith("gemini-"):
-                    print("DEBUG: Using Gemini API...")
-                    try:
-                        model = genai.GenerativeModel(actual_model)
-                        full_prompt = "You are an expert document analyst and professional HTML formatter. Create highly structured, intelligent documents with deep analysis.\n\n" + prompt
-                        gemini_response = model.generate_content(
-                            full_prompt,
-                            generation_config=genai.types.GenerationConfig(
-                                max_output_tokens=max_tokens,
-                            )
-                        )
+def resolve_model(selected_model):
+    """Map UI model names to actual model IDs"""
+    # Check for Gemini API key dynamically
+    gemini_api_key = os.getenv('GOOGLE_API_KEY') or os.getenv('GEMINI_API_KEY')
+    print(f"DEBUG: Gemini API key available: {bool(gemini_api_key)}")
 
-                        # Convert Gemini response to OpenAI-like format
-                        class MockResponse:
-                            def __init__(self, text):
-                                self.choices = [type('obj', (object,), {'message': type('obj', (object,), {'content': text})()})]
-                                self.usage = type('obj', (object,), {'total_tokens': len(text.split()), 'prompt_tokens': len(prompt.split()), 'completion_tokens': len(text.split())})()
-
-                        response = MockResponse(gemini_response.text)
-                        print("DEBUG: Gemini API call successful!")
-                    except Exception as e:
-                        print(f"DEBUG: Gemini API failed ({str(e)}), falling back to OpenAI GPT-4o")
-                        actual_model = "gpt-4o"  # Fallback to GPT-4o
-                        response = openai.chat.completions.create(
-                            model=actual_model,
-                            messages=[
-                                {"role": "system", "content": "You are an expert document analyst and professional HTML formatter. Create highly structured, intelligent documents with deep analysis."},
-                                {"role": "user", "content": prompt}
-                            ],
-                            max_tokens=max_tokens,
-                            temperature=0.7
+    model_map = {
+        "GPT-4o-mini": "gpt-4o-mini",
+        "Gemini Pro 2.5": "gemini-2.5-pro" if gemini_api_key else "gpt-4o",  # Use actual Gemini Pro if available
+        "GPT-5": "gpt-4o"  # Use GPT-4o as GPT-5 proxy (GPT-5 may require special access)
+    }
+    
+    return model_map.get(selected_model, "gpt-4o")
+
+def gemini_usage(prompt, text):
+    """Approximate OpenAI-style token usage for a Gemini response"""
+    return {
+        "prompt": len(prompt.split()),
+        "completion": len(text.split()),
+        "total": len(text.split())
+    }
+
+def openai_usage(response):
+    """Token usage from an OpenAI completion"""
+    token_usage = response.usage
+    return {
+        "prompt": token_usage.prompt_tokens,
+        "completion": token_usage.completion_tokens,
+        "total": token_usage.total_tokens
+    }
+
+def generate_document(prompt, actual_model, max_tokens):
+    """Run the main completion with retries; returns (raw_html, token_usage)"""
+    # Retry logic for connection errors
+    max_retries = MAX_RETRIES
+    for attempt in range(max_retries):
+        try:
+            print(f"DEBUG: Using {max_tokens} tokens with {actual_model}")
+            print(f"DEBUG: Prompt length: {len(prompt)} characters")
+
+            # Use Gemini API for Gemini models, OpenAI API for others
+            if actual_model.startswith("gemini-"):
+                print("DEBUG: Using Gemini API...")
+                try:
+                    model = genai.GenerativeModel(actual_model)
+                    full_prompt = DOCUMENT_SYSTEM_PROMPT + "\n\n" + prompt
+                    gemini_response = model.generate_content(
+                        full_prompt,
+                        generation_config=genai.types.GenerationConfig(
+                            max_output_tokens=max_tokens,
                         )
-                else:
+                    )
+
+                    ai_html = gemini_response.text
+                    usage = gemini_usage(prompt, ai_html)
+                    print("DEBUG: Gemini API call successful!")
+                except Exception as e:
+                    print(f"DEBUG: Gemini API failed ({str(e)}), falling back to OpenAI GPT-4o")
+                    actual_model = "gpt-4o"  # Fallback to GPT-4o
                     response = openai.chat.completions.create(
                         model=actual_model,
                         messages=[
-                            {"role": "system", "content": "You are an expert document analyst and professional HTML formatter. Create highly structured, intelligent documents with deep analysis."},
+                            {"role": "system", "content": DOCUMENT_SYSTEM_PROMPT},
                             {"role": "user", "content": prompt}
                         ],
                         max_tokens=max_tokens,
-                        timeout=API_TIMEOUT
+                        temperature=0.7
+                    )
+                    ai_html = response.choices[0].message.content
+                    usage = openai_usage(response)
+            else:
+                response = openai.chat.completions.create(
+                    model=actual_model,
+                    messages=[
+                        {"role": "system", "content": DOCUMENT_SYSTEM_PROMPT},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=max_tokens,
+                    timeout=API_TIMEOUT
+                )
+                ai_html = response.choices[0].message.content
+                usage = openai_usage(response)
+
+            print(f"DEBUG: Response tokens used: {usage['total']}")
+            print(f"DEBUG: Output length: {len(ai_html)} characters")
+            return ai_html, usage
+        except Exception as e:
+            print(f"DEBUG: Attempt {attempt + 1} failed: {str(e)}")
+            if attempt == max_retries - 1:  # Last attempt
+                raise e
+            else:
+                time.sleep(2)  # Wait 2 seconds before retry
+
+def stream_openai(prompt, actual_model, max_tokens, usage, **kwargs):
+    """Yield completion text deltas; fills usage from the final stream chunk"""
+    stream = openai.chat.completions.create(
+        model=actual_model,
+        messages=[
+            {"role": "system", "content": DOCUMENT_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=max_tokens,
+        stream=True,
+        stream_options={"include_usage": True},
+        **kwargs
+    )
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+        if chunk.usage:
+            usage.update(openai_usage(chunk))
+
+def stream_document(prompt, actual_model, max_tokens, usage):
+    """Streaming generate_document: yields HTML deltas and fills usage when finished.
+
+    Retries only happen before the first delta is sent; once output has reached
+    the client a failure is raised instead of silently restarting the document.
+    """
+    max_retries = MAX_RETRIES
+    for attempt in range(max_retries):
+        emitted = []
+        try:
+            if actual_model.startswith("gemini-"):
+                print("DEBUG: Streaming from Gemini API...")
+                try:
+                    model = genai.GenerativeModel(actual_model)
+                    gemini_stream = model.generate_content(
+                        DOCUMENT_SYSTEM_PROMPT + "\n\n" + prompt,
+                        generation_config=genai.types.GenerationConfig(
+                            max_output_tokens=max_tokens,
+                        ),
+                        stream=True
                     )
+                    for chunk in gemini_stream:
+                        if chunk.text:
+                            emitted.append(chunk.text)
+                            yield chunk.text
+                    usage.update(gemini_usage(prompt, "".join(emitted)))
+                    return
+                except Exception as e:
+                    if emitted:
+                        raise
+                    print(f"DEBUG: Gemini API failed ({str(e)}), falling back to OpenAI GPT-4o")
+                    actual_model = "gpt-4o"  # Fallback to GPT-4o
+                    for delta in stream_openai(prompt, actual_model, max_tokens, usage, temperature=0.7):
+                        emitted.append(delta)
+                        yield delta
+                    return
+
+            for delta in stream_openai(prompt, actual_model, max_tokens, usage, timeout=API_TIMEOUT):
+                emitted.append(delta)
+                yield delta
+            return
+        except Exception as e:
+            print(f"DEBUG: Streaming attempt {attempt + 1} failed: {str(e)}")
+            if emitted or attempt == max_retries - 1:
+                raise e
+            time.sleep(2)  # Wait 2 seconds before retry
 
-                print(f"DEBUG: Response tokens used: {response.usage.total_tokens if response.usage else 'Unknown'}")
-                print(f"DEBUG: Output length: {len(response.choices[0].message.content)} characters")
-                break  # Success, exit retry loop
-            except Exception as e:
-                print(f"DEBUG: Attempt {attempt + 1} failed: {str(e)}")
-                if attempt == max_retries - 1:  # Last attempt
-                    raise e
-                else:
-                    import time
-                    time.sleep(2)  # Wait 2 seconds before retry
-
-        ai_html = response.choices[0].message.content
-        
-        # Extract token usage information
-        token_usage = response.usage
-        prompt_tokens = token_usage.prompt_tokens
-        completion_tokens = token_usage.completion_tokens
-        total_tokens = token_usage.total_tokens
-        
-        # Calculate cost
-        cost = calculate_cost(selected_model, prompt_tokens, completion_tokens)
-        
-        print(f"DEBUG: AI response length: {len(ai_html)}")
-        print(f"DEBUG: AI response starts with: {ai_html[:100]}")
-        print(f"DEBUG: Token usage - Prompt: {prompt_tokens}, Completion: {completion_tokens}, Total: {total_tokens}")
-        print(f"DEBUG: Estimated cost: ${cost:.4f}")
-
-        # Clean up any markdown formatting that might have slipped through
-        if ai_html.startswith("```html"):
-            ai_html = ai_html[7:]
-        if ai_html.endswith("```"):
-            ai_html = ai_html[:-3]
-        ai_html = ai_html.strip()
-
-        # Clean up and validate the AI response
-        def clean_html(html_content):
-            import re
-            # Remove any remaining code block markers
-            html_content = re.sub(r'```html\s*', '', html_content)
-            html_content = re.sub(r'```\s*$', '', html_content)
-            # Ensure proper formatting
-            html_content = html_content.strip()
-            return html_content
-        
-        ai_html = clean_html(ai_html)
-        print(f"DEBUG: Final HTML contains expected classes: {'class=' in ai_html}")
-        print(f"DEBUG: Contains stat-grid: {'stat-grid' in ai_html}")
-        print(f"DEBUG: Contains fact: {'fact' in ai_html}")
-
-        if not ai_html.strip():
-            print("AI returned empty response:", response)
-            return jsonify({"error": "AI returned empty HTML."})
-
-        css_content = A4_CSS_TEMPLATE.format(theme_color=theme_color)
-        print(f"DEBUG: CSS content length: {len(css_content)}")
-        print(f"DEBUG: Theme color in CSS: {theme_color}")
-        
-        # Create styled document content only (no full HTML page)
-        document_content = f"""
+class FenceStripper:
+    """Drop a leading ```html fence from streamed output before it reaches the client.
+
+    Trailing fences are left alone here; the closing 'done' event carries the
+    fully cleaned document from clean_ai_html().
+    """
+
+    def __init__(self):
+        self.pending = ""
+        self.started = False
+
+    def feed(self, chunk):
+        if self.started:
+            return chunk
+        self.pending += chunk
+        stripped = self.pending.lstrip()
+        if len(stripped) < len("```html") and "```html".startswith(stripped):
+            return ""  # Could still be the start of a fence
+        self.started = True
+        if stripped.startswith("```html"):
+            stripped = stripped[len("```html"):].lstrip()
+        self.pending = ""
+        return stripped
+
+def clean_ai_html(ai_html):
+    """Strip markdown code fences that might have slipped through"""
+    if ai_html.startswith("```html"):
+        ai_html = ai_html[7:]
+    if ai_html.endswith("```"):
+        ai_html = ai_html[:-3]
+    ai_html = ai_html.strip()
+
+    # Remove any remaining code block markers
+    ai_html = re.sub(r'```html\s*', '', ai_html)
+    ai_html = re.sub(r'```\s*$', '', ai_html)
+    # Ensure proper formatting
+    return ai_html.strip()
+
+def document_shell(theme_color):
+    """Themed <style> + A4 container, split around where the generated HTML goes"""
+    css_content = A4_CSS_TEMPLATE.format(theme_color=theme_color)
+    shell_open = f"""
 <style>
 {css_content}
 </style>
 <div class="a4">
-{ai_html}
+"""
+    shell_close = """
 </div>
         """
-        
-        return jsonify({
-            "html": document_content,
-            "tokens": {
-                "prompt": prompt_tokens,
-                "completion": completion_tokens,
-                "total": total_tokens
-            },
-            "cost": cost,
-            "model": selected_model,
-            "theme": theme,
-            "theme_color": theme_color
-        })
+    return shell_open, shell_close
+
+def render_document(ai_html, theme_color):
+    """Wrap generated HTML in the themed A4 shell (styled content only, no full HTML page)"""
+    shell_open, shell_close = document_shell(theme_color)
+    return f"{shell_open}{ai_html}{shell_close}"
+
+def finish_document(raw_html, usage, selected_model, theme, theme_color, extras=None):
+    """Clean the model output and build the /api/process response payload"""
+    # Calculate cost
+    cost = calculate_cost(selected_model, usage["prompt"], usage["completion"])
+
+    print(f"DEBUG: AI response length: {len(raw_html)}")
+    print(f"DEBUG: AI response starts with: {raw_html[:100]}")
+    print(f"DEBUG: Token usage - Prompt: {usage['prompt']}, Completion: {usage['completion']}, Total: {usage['total']}")
+    print(f"DEBUG: Estimated cost: ${cost:.4f}")
+
+    ai_html = clean_ai_html(raw_html)
+    print(f"DEBUG: Final HTML contains expected classes: {'class=' in ai_html}")
+    print(f"DEBUG: Contains stat-grid: {'stat-grid' in ai_html}")
+    print(f"DEBUG: Contains fact: {'fact' in ai_html}")
+
+    if not ai_html.strip():
+        print("AI returned empty response:", raw_html)
+        return {"error": "AI returned empty HTML."}
+
+    return {
+        "html": render_document(ai_html, theme_color),
+        "tokens": usage,
+        "cost": cost,
+        "model": selected_model,
+        "theme": theme,
+        "theme_color": theme_color,
+        **(extras or {})
+    }
+
+def stage_slot(stage_limits, stage):
+    """Concurrency slot for one pipeline stage (no limit unless a semaphore is configured)"""
+    if stage_limits and stage in stage_limits:
+        return stage_limits[stage]
+    return contextlib.nullcontext()
+
+def prepare_theme(data, stage_limits=None):
+    """Extract -> theme; returns the job without its prompt (enough for the document shell) or an error"""
+    req = prepare_request(data)
+    input_text = req["input_text"]
+    ai_topic = req["ai_topic"]
+    urls = req["article_urls"]
+    selected_model = req["model"]
+    verbosity = req["verbosity"]
+    extras = {}
+
+    if not input_text and not ai_topic and not urls:
+        return {"error": "No input text, AI topic, or URL provided."}
+
+    # Handle URL extraction first if provided
+    if urls:
+        print(f"DEBUG: Extracting {len(urls)} article(s) from: {', '.join(urls)}")
+        with stage_slot(stage_limits, "extract"):
+            articles = extract_articles(urls)
+        if not articles:
+            return extraction_error(urls)
+
+        input_text, extras = article_input(articles)
+
+    # Determine processing mode (URL extraction is treated as document processing)
+    is_ai_research = bool(ai_topic and not input_text)
+    processing_text = ai_topic if is_ai_research else input_text
+    
+    with stage_slot(stage_limits, "theme"):
+        theme = extract_theme(processing_text)
+    theme_color = THEME_COLORS.get(theme, THEME_COLORS["default"])
+    
+    print(f"DEBUG: Processing mode: {'AI Research' if is_ai_research else 'Document Processing'}")
+    print(f"DEBUG: Detected theme: {theme}, color: {theme_color}")
+    print(f"DEBUG: Selected model: {selected_model}, Verbosity: {verbosity}")
+    print(f"DEBUG: Input text length: {len(processing_text)} characters")
+
+    return {
+        "input_text": input_text,
+        "ai_topic": ai_topic,
+        "is_ai_research": is_ai_research,
+        "model": selected_model,
+        "verbosity": verbosity,
+        "theme": theme,
+        "theme_color": theme_color,
+        "extras": extras
+    }
+
+def prepare_prompt(job, stage_limits=None):
+    """Search for a prepare_theme job and add its generation prompt"""
+    input_text = job["input_text"]
+    ai_topic = job["ai_topic"]
+    is_ai_research = job["is_ai_research"]
+
+    # Handle AI Research vs Document Processing
+    with stage_slot(stage_limits, "search"):
+        if is_ai_research:
+            # For AI research mode, do extensive web search
+            search_results = web_search(ai_topic, num_results=5)
+            print(f"DEBUG: AI Research - Found {len(search_results)} web search results")
+        else:
+            # Standard document processing with AI-powered search query generation
+            search_query = generate_search_query(input_text, job["theme"])
+            search_results = web_search(search_query, num_results=2)
+            print(f"DEBUG: Document Processing - Search query: '{search_query}' - Found {len(search_results)} web search results")
+
+    processing_content = build_processing_content(input_text, ai_topic, is_ai_research, search_results)
+    return dict(job, prompt=build_prompt(processing_content, is_ai_research, ai_topic, job["verbosity"]))
+
+def prepare_document(data, stage_limits=None):
+    """Extract -> theme -> search; returns the generation job (prompt, theme, model) or an error"""
+    job = prepare_theme(data, stage_limits)
+    if "error" in job:
+        return job
+    return prepare_prompt(job, stage_limits)
+
+def run_pipeline(data, stage_limits=None):
+    """Extract -> theme -> search -> generate; returns the /api/process payload"""
+    job = prepare_document(data, stage_limits)
+    if "error" in job:
+        return job
+
+    try:
+        actual_model = resolve_model(job["model"])
+        # Set max tokens based on verbosity and environment
+        max_tokens = MAX_TOKENS_CONFIG.get(job["verbosity"], MAX_TOKENS_CONFIG["Detailed"])
+        print(f"DEBUG: {job['verbosity']} mode with {actual_model} (selected: {job['model']})")
+
+        with stage_slot(stage_limits, "generate"):
+            raw_html, usage = generate_document(job["prompt"], actual_model, max_tokens)
+        return finish_document(raw_html, usage, job["model"], job["theme"], job["theme_color"], job["extras"])
+
+    except OpenAIError as e:
+        return {"error": f"OpenAI API error: {str(e)}"}
+    except Exception as e:
+        return {"error": f"Unexpected server error: {str(e)}"}
+
+result_cache = TieredCache(
+    TTLCache(maxsize=config.RESULT_CACHE_SIZE, ttl=config.RESULT_CACHE_TTL),
+    DiskCache(config.RESULT_CACHE_DIR, ttl=config.RESULT_CACHE_DISK_TTL, max_entries=config.RESULT_CACHE_DISK_ENTRIES)
+    if config.RESULT_CACHE_DIR else None
+)
+
+def result_cache_key(data):
+    """Cache key from normalized input (text/URL/topic) + model + verbosity"""
+    req = prepare_request(data)
+    return cache_key(
+        " ".join(req["input_text"].split()),
+        "\n".join(url_identity(url) for url in req["article_urls"]),
+        " ".join(req["ai_topic"].lower().split()),
+        req["model"],
+        req["verbosity"]
+    )
+
+def run_pipeline_cached(data, stage_limits=None):
+    """run_pipeline behind the result cache; returns (payload, cache_status, cache_key)"""
+    key = result_cache_key(data)
+    bypass = bool(data.get("noCache"))
+    if not bypass:
+        cached = result_cache.get(key)
+        if cached is not None:
+            print(f"DEBUG: Result cache hit {key[:12]}")
+            return cached, "HIT", key
+
+    result = run_pipeline(data, stage_limits)
+    if "error" not in result:
+        result_cache.set(key, result)
+    return result, "BYPASS" if bypass else "MISS", key
+
+def request_payload():
+    """JSON body, with Cache-Control: no-cache mapped onto the noCache flag"""
+    data = dict(request.json or {})
+    if "no-cache" in request.headers.get("Cache-Control", ""):
+        data["noCache"] = True
+    return data
+
+def cached_response(result, cache_status, key):
+    response = jsonify(result)
+    response.headers["X-Cache"] = cache_status
+    response.headers["X-Cache-Key"] = key
+    return response
+
+# Shared across batch requests so concurrent batches still respect the upstream limits
+BATCH_STAGE_LIMITS = {stage: threading.BoundedSemaphore(limit) for stage, limit in config.BATCH_STAGE_LIMITS.items()}
+
+def run_batch_item(index, item, defaults):
+    """Run one batch item through the pipeline, never raising"""
+    data = dict(item)
+    data.setdefault("model", defaults.get("model", "GPT-5"))
+    data.setdefault("verbosity", defaults.get("verbosity", "Detailed"))
+
+    started = time.time()
+    try:
+        result, _, _ = run_pipeline_cached(data, BATCH_STAGE_LIMITS)
+    except Exception as e:
+        result = {"error": f"Unexpected server error: {str(e)}"}
+    elapsed = round(time.time() - started, 3)
+
+    if "error" in result:
+        return {"index": index, "status": "error", "error": result["error"], "elapsed": elapsed}
+    return {
+        "index": index,
+        "status": "ok",
+        "html": result["html"],
+        "tokens": result["tokens"],
+        "cost": result["cost"],
+        "model": result["model"],
+        "theme": result["theme"],
+        "theme_color": result["theme_color"],
+        "elapsed": elapsed
+    }
+
+def run_batch(items, defaults):
+    """Fan items out across BATCH_WORKERS threads; stages are bounded by BATCH_STAGE_LIMITS"""
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=min(config.BATCH_WORKERS, len(items))) as pool:
+        results = list(pool.map(lambda pair: run_batch_item(pair[0], pair[1], defaults), enumerate(items)))
+
+    succeeded = [r for r in results if r["status"] == "ok"]
+    return {
+        "results": results,
+        "summary": {
+            "items": len(results),
+            "succeeded": len(succeeded),
+            "failed": len(results) - len(succeeded),
+            "tokens": sum(r["tokens"]["total"] for r in succeeded),
+            "cost": sum(r["cost"] for r in succeeded),
+            "elapsed": round(time.time() - started, 3)
+        }
+    }
+
+def sse_event(event, payload):
+    """Format one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+def stream_pipeline(data):
+    """SSE variant of run_pipeline: shell first, then HTML deltas, then a closing 'done' event"""
+    key = result_cache_key(data)
+    if not data.get("noCache"):
+        cached = result_cache.get(key)
+        if cached is not None:
+            shell_open, shell_close = document_shell(cached["theme_color"])
+            yield sse_event("shell", {"open": shell_open, "close": shell_close, "theme": cached["theme"],
+                                      "theme_color": cached["theme_color"], "model": cached["model"]})
+            yield sse_event("done", dict(cached, cache="HIT"))
+            return
+
+    job = prepare_theme(data)
+    if "error" in job:
+        yield sse_event("error", job)
+        return
+
+    # The shell only needs the theme, so it goes out before the search query and Brave round trips
+    shell_open, shell_close = document_shell(job["theme_color"])
+    yield sse_event("shell", {
+        "open": shell_open,
+        "close": shell_close,
+        "theme": job["theme"],
+        "theme_color": job["theme_color"],
+        "model": job["model"]
+    })
+
+    try:
+        job = prepare_prompt(job)
+        actual_model = resolve_model(job["model"])
+        max_tokens = MAX_TOKENS_CONFIG.get(job["verbosity"], MAX_TOKENS_CONFIG["Detailed"])
+        print(f"DEBUG: Streaming {job['verbosity']} mode with {actual_model} (selected: {job['model']})")
+
+        usage = {}
+        chunks = []
+        fence = FenceStripper()
+        for chunk in stream_document(job["prompt"], actual_model, max_tokens, usage):
+            chunks.append(chunk)
+            delta = fence.feed(chunk)
+            if delta:
+                yield sse_event("delta", {"html": delta})
+
+        # The final event carries the fully cleaned document, same payload as /api/process
+        result = finish_document("".join(chunks), usage, job["model"], job["theme"], job["theme_color"], job["extras"])
+        if "error" not in result:
+            result_cache.set(key, result)
+        yield sse_event("done", result)
 
     except OpenAIError as e:
-        return jsonify({"error": f"OpenAI API error: {str(e)}"})
+        yield sse_event("error", {"error": f"OpenAI API error: {str(e)}"})
     except Exception as e:
-        return jsonify({"error": f"Unexpected server error: {str(e)}"})
+        yield sse_event("error", {"error": f"Unexpected server error: {str(e)}"})
+
+@app.route("/api/process", methods=["POST"])
+def process():
+    return cached_response(*run_pipeline_cached(request_payload()))
+
+@app.route("/api/process/batch", methods=["POST"])
+def process_batch():
+    data = request.json or {}
+    items = data.get("items")
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Provide a non-empty 'items' list."}), 400
+    if len(items) > config.BATCH_MAX_ITEMS:
+        return jsonify({"error": f"Batch too large: {len(items)} items (max {config.BATCH_MAX_ITEMS})."}), 400
+    if not all(isinstance(item, dict) for item in items):
+        return jsonify({"error": "Each batch item must be an object."}), 400
+
+    return jsonify(run_batch(items, data))
+
+@app.route("/api/process/stream", methods=["POST"])
+def process_stream():
+    return Response(
+        stream_with_context(stream_pipeline(request_payload())),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def run_job(payload):
+    """Job queue handler: raise on pipeline errors so the queue retries them"""
+    result, _, _ = run_pipeline_cached(payload)
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    return result
+
+job_queue = JobQueue(config.JOB_DB_PATH, run_job, concurrency=config.JOB_WORKERS,
+                     max_attempts=config.JOB_MAX_ATTEMPTS, lease_seconds=config.JOB_LEASE_SECONDS)
+
+@app.route("/api/cache", methods=["DELETE"])
+def clear_cache():
+    result_cache.clear()
+    return jsonify({"cleared": True})
+
+@app.route("/api/cache/<key>", methods=["DELETE"])
+def invalidate_cache(key):
+    if not is_cache_key(key):
+        return jsonify({"error": "Cache key must be 64 lowercase hex characters."}), 400
+    return jsonify({"key": key, "invalidated": result_cache.delete(key)})
+
+@app.route("/api/cache/invalidate", methods=["POST"])
+def invalidate_cached_request():
+    key = result_cache_key(request.json or {})
+    return jsonify({"key": key, "invalidated": result_cache.delete(key)})
+
+@app.route("/api/cache/stats", methods=["GET"])
+def cache_stats():
+    return jsonify(result_cache.stats())
+
+@app.route("/api/metrics", methods=["GET"])
+def metrics():
+    return jsonify({
+        "http_pool": http_client.pool_metrics(),
+        "fetch": http_client.fetch_metrics(),
+        "hosts": http_client.get_scheduler().metrics(),
+        "negative_cache": negative_cache.stats(),
+        "canonical_urls": canonicalizer.stats(),
+        "variants": dict(variant_stats, parse_ms=round(variant_stats["parse_ms"], 1)),
+        "charset": dict(charset_stats),
+        "parse_pool": parse_pool.stats() if parse_pool else None,
+        "compaction": dict(compaction_stats),
+        "strategies": strategy_memory.stats() if strategy_memory else None,
+        "search_cache": dict(search_cache.stats(), **search_flight.stats()),
+        "article_cache": dict(article_cache_stats, size=len(article_cache), maxsize=article_cache.maxsize)
+    })
+
+@app.route("/api/jobs", methods=["POST"])
+def submit_job():
+    data = request.json or {}
+    req = prepare_request(data)
+    if not req["input_text"] and not req["ai_topic"] and not req["article_urls"]:
+        return jsonify({"error": "No input text, AI topic, or URL provided."}), 400
+
+    job_queue.start()
+    job_id = job_queue.submit(data)
+    return jsonify({"id": job_id, "status": "queued"}), 202
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found."}), 404
+    return jsonify(job)
 
 if __name__ == "__main__":
+    job_queue.start()
     app.run(host="0.0.0.0", port=5000, debug=True)
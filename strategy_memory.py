@@ -0,0 +1,141 @@
+"""
+Per-domain memory of which article extraction strategy works.
+
+A site keeps winning with the same method (JSON-LD, the BeautifulSoup pass,
+newspaper3k, ...), so every attempt is recorded per domain in SQLite: decayed
+success/failure counts and a moving average of the time taken. order() puts
+the strategy that has been winning first and leaves out strategies that keep
+failing. Counts halve every `half_life` seconds, so a skipped strategy is
+probed again after a while and a site redesign gets re-learned.
+"""
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS strategies (
+    domain TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    successes REAL NOT NULL DEFAULT 0,
+    failures REAL NOT NULL DEFAULT 0,
+    avg_ms REAL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (domain, strategy)
+);
+"""
+
+class StrategyMemory:
+    """SQLite-backed per-domain strategy scores with exponential decay"""
+
+    def __init__(self, db_path, half_life=7 * 86400, skip_after=5):
+        self.db_path = db_path
+        self.half_life = half_life
+        self.skip_after = skip_after  # decayed failures (with no recent success) before a strategy is skipped
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "reordered": 0, "skipped": 0}
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @contextlib.contextmanager
+    def _connection(self):
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _decay(self, updated_at, now):
+        return 0.5 ** (max(0.0, now - updated_at) / self.half_life)
+
+    def scores(self, domain):
+        """strategy -> {successes, failures, avg_ms} with decay applied up to now"""
+        now = time.time()
+        with self._connection() as conn:
+            rows = conn.execute(
+                "SELECT strategy, successes, failures, avg_ms, updated_at FROM strategies WHERE domain = ?", (domain,)
+            ).fetchall()
+        scores = {}
+        for row in rows:
+            decay = self._decay(row["updated_at"], now)
+            scores[row["strategy"]] = {
+                "successes": row["successes"] * decay,
+                "failures": row["failures"] * decay,
+                "avg_ms": row["avg_ms"]
+            }
+        return scores
+
+    def order(self, domain, strategies):
+        """Strategies to try for this domain: best success rate first, always-failing ones left out
+        (unless that would leave nothing to try)"""
+        scores = self.scores(domain)
+
+        def rate(name):
+            score = scores.get(name)
+            if score is None:
+                return 0.5  # Unknown: between a winner and a loser
+            return (score["successes"] + 0.5) / (score["successes"] + score["failures"] + 1)
+
+        def failing(name):
+            score = scores.get(name)
+            return score is not None and score["failures"] >= self.skip_after and score["successes"] < 0.5
+
+        ordered = sorted(strategies, key=lambda name: -rate(name))  # Stable: ties keep the default order
+        kept = [name for name in ordered if not failing(name)] or ordered
+
+        with self._lock:
+            self._stats["lookups"] += 1
+            self._stats["reordered"] += kept[0] != strategies[0]
+            self._stats["skipped"] += len(ordered) - len(kept)
+        return kept
+
+    def record(self, domain, strategy, success, elapsed):
+        """Count one attempt (elapsed in seconds)"""
+        now = time.time()
+        elapsed_ms = elapsed * 1000
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT successes, failures, avg_ms, updated_at FROM strategies WHERE domain = ? AND strategy = ?",
+                (domain, strategy)
+            ).fetchone()
+            if row is None:
+                successes, failures, avg_ms = 0.0, 0.0, elapsed_ms
+            else:
+                decay = self._decay(row["updated_at"], now)
+                successes, failures = row["successes"] * decay, row["failures"] * decay
+                avg_ms = elapsed_ms if row["avg_ms"] is None else 0.7 * row["avg_ms"] + 0.3 * elapsed_ms
+            conn.execute(
+                "INSERT OR REPLACE INTO strategies (domain, strategy, successes, failures, avg_ms, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (domain, strategy, successes + (1 if success else 0), failures + (0 if success else 1), avg_ms, now)
+            )
+            conn.execute("COMMIT")
+
+    def counters(self):
+        """In-memory lookup counters (without the database count)"""
+        with self._lock:
+            return dict(self._stats)
+
+    def add_counters(self, increments):
+        """Fold in counters from a copy of this memory in another process (see parse_pool)"""
+        with self._lock:
+            for name, count in increments.items():
+                self._stats[name] += count
+
+    def stats(self):
+        with self._connection() as conn:
+            domains = conn.execute("SELECT COUNT(DISTINCT domain) FROM strategies").fetchone()[0]
+        with self._lock:
+            return dict(self._stats, domains=domains)
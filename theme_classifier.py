@@ -0,0 +1,120 @@
+"""
+Offline theme classifier used in front of the LLM theme detection.
+
+A NumPy TF-IDF model (unigrams + bigrams) over the category descriptions from
+the LLM theme prompt plus the examples in theme_training.json. Each theme
+is a centroid of L2-normalized training vectors; a text is scored by cosine
+similarity and the scores are turned into a confidence with a softmax, so the
+caller can escalate to the LLM only when the local answer is uncertain.
+"""
+import json
+import os
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+TRAINING_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "theme_training.json")
+
+# Category descriptions from the LLM theme prompt (build_theme_prompt in server.py)
+THEME_DESCRIPTIONS = {
+    "finance": "Banking, money, investments, economics, business finance, financial markets, accounting, budgets, costs, revenue, profits, loans, taxes",
+    "health": "Medical topics, healthcare, wellness, pharmaceuticals, clinical research, diseases, treatments, hospitals, doctors, patients, therapy",
+    "tech": "Technology, software, AI, digital systems, computing, programming, apps, platforms, internet, web development, data science",
+    "travel": "Transportation, travel, tourism, cars, flights, trains, buses, public transit, airlines, hotels, destinations, trip planning, vehicle rental, road trips, airports, travel guides, vacation planning, automotive reviews, vehicle comparisons",
+    "food": "Cooking, recipes, restaurants, cuisine, nutrition, ingredients, food preparation, culinary arts, dining, beverages, meal planning, kitchen tools",
+    "default": "General topics, lifestyle, education, or content that doesn't clearly fit the specialized categories"
+}
+
+STOP_WORDS = frozenset("""
+a an and are as at be been being but by can could did do does for from had has have he her his i if in into is it
+its me my no not of on or our she so than that the their them then there these they this those to too us was we
+were what when which who will with would you your about after all also any just more most much other over some such
+up very
+""".split())
+
+TOKEN_RE = re.compile(r"[a-z][a-z0-9+#'-]*")
+
+MAX_CHARS = 2000  # Enough signal for a topic decision; keeps classification in microseconds
+
+def tokenize(text):
+    """Lowercased word unigrams and bigrams, stop words removed"""
+    words = [w.strip("'-") for w in TOKEN_RE.findall(text[:MAX_CHARS].lower())]
+    words = [w for w in words if len(w) > 1 and w not in STOP_WORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+class ThemeClassifier:
+    """TF-IDF nearest-centroid classifier with softmax confidence"""
+
+    def __init__(self, examples, temperature=0.03, min_similarity=0.02):
+        self.temperature = temperature
+        self.min_similarity = min_similarity
+
+        docs = [(tokenize(text), theme) for text, theme in examples]
+        self.themes = sorted({theme for _, theme in docs})
+
+        vocab = sorted({token for tokens, _ in docs for token in tokens})
+        self.index = {token: i for i, token in enumerate(vocab)}
+
+        # Smoothed inverse document frequency
+        df = np.zeros(len(vocab))
+        for tokens, _ in docs:
+            for token in set(tokens):
+                df[self.index[token]] += 1
+        self.idf = np.log((1 + len(docs)) / (1 + df)) + 1.0
+
+        centroids = np.zeros((len(self.themes), len(vocab)))
+        for tokens, theme in docs:
+            centroids[self.themes.index(theme)] += self._vectorize(tokens)
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        self.centroids = centroids / np.where(norms == 0, 1, norms)
+
+    @classmethod
+    def from_training_file(cls, path=TRAINING_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            examples = [(item["text"], item["theme"]) for item in json.load(f)]
+        examples += [(description, theme) for theme, description in THEME_DESCRIPTIONS.items()]
+        return cls(examples)
+
+    def _vectorize(self, tokens):
+        vector = np.zeros(len(self.index))
+        for token, count in Counter(tokens).items():
+            i = self.index.get(token)
+            if i is not None:
+                vector[i] = 1.0 + np.log(count)  # Sublinear term frequency
+        vector *= self.idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def scores(self, text):
+        """Theme -> probability"""
+        similarities = self.centroids @ self._vectorize(tokenize(text))
+        if similarities.max() < self.min_similarity:
+            # Nothing we recognise: no confidence in any theme
+            return {theme: 0.0 for theme in self.themes}
+        logits = (similarities - similarities.max()) / self.temperature
+        probabilities = np.exp(logits) / np.exp(logits).sum()
+        return dict(zip(self.themes, probabilities.tolist()))
+
+    def classify(self, text):
+        """Returns (theme, confidence)"""
+        scores = self.scores(text)
+        theme = max(scores, key=scores.get)
+        return theme, scores[theme]
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+def get_classifier():
+    """Lazily trained module-level classifier"""
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = ThemeClassifier.from_training_file()
+    return _classifier
+
+def classify_theme(text):
+    """Returns (theme, confidence) from the local model"""
+    return get_classifier().classify(text)
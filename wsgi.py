@@ -5,11 +5,14 @@ This file serves as the production WSGI application entry point.
 It imports the Flask app from server.py and configures it for production use.
 """
 
-from server import app
+from server import app, job_queue
 
 # The application object that WSGI servers will use
 application = app
 
+# Resume queued/interrupted background jobs as soon as the worker boots
+job_queue.start()
+
 if __name__ == "__main__":
     # This block won't be executed when run via WSGI
     # but can be used for local testing of the WSGI setup
@@ -0,0 +1,100 @@
+"""
+ASGI -> WSGI adapter that runs each request on a thread pool.
+
+asgiref's WsgiToAsgi runs every WSGI call through a thread-sensitive
+sync_to_async, so all delegated Flask requests in a worker share one thread
+and queue behind each other. ThreadedWsgi gives each request its own pool
+thread instead: the request body is read on the event loop, the Flask app
+runs in the pool, and response chunks are handed back to the loop as the
+app yields them (so streamed responses still stream).
+"""
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+def wsgi_environ(scope, body):
+    """PEP 3333 environ for an ASGI HTTP scope and its complete body"""
+    root_path = scope.get("root_path", "")
+    path = scope["path"]
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root_path.encode("utf-8").decode("latin-1"),
+        "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[name] = value
+            continue
+        key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+class ThreadedWsgi:
+    """ASGI application serving a WSGI app from a pool of max_workers threads"""
+
+    def __init__(self, wsgi_app, max_workers):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="wsgi")
+
+    async def __call__(self, scope, receive, send):
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.run, wsgi_environ(scope, body), send, loop)
+
+    def run(self, environ, send, loop):
+        """Call the WSGI app on a pool thread and forward its response to the event loop"""
+        response = {}
+
+        def forward(message):
+            # Wait for each send so a slow client applies back-pressure to the app
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def write(data):
+            if "sent" not in response:
+                response["sent"] = True
+                forward({"type": "http.response.start", "status": response["status"], "headers": response["headers"]})
+            if data:
+                forward({"type": "http.response.body", "body": data, "more_body": True})
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and "sent" in response:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+            return write
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in result:
+                write(chunk)
+            write(b"")
+            forward({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)